@@ -0,0 +1,2 @@
+# Heroku 启动 dyno 时执行：使用构建阶段（bin/post_compile）建好的 matplotlib 字体缓存
+export MPLCONFIGDIR="$HOME/.matplotlib"
@@ -0,0 +1,242 @@
+"""
+santa1.py 风格的动画
+每一帧的状态（雪花、五角星旋转和脉动、闪烁、视角）只由帧号和种子决定，
+所以任意帧都可以单独渲染或跳转，多进程分段渲染的结果和顺序播放完全一致。
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+
+
+def rotation_matrix_z(deg):
+    th = np.deg2rad(deg)
+    c, s = np.cos(th), np.sin(th)
+    return np.array([[c, -s, 0],
+                     [s,  c, 0],
+                     [0,  0, 1]])
+
+
+class SnowFall:
+    """
+    雪花飘落的解析模型：每帧下落 0.07，落到 -2 以下回到 12 的高度并重新随机 x, y
+
+    第 f 帧时每片雪花一共下落了 d = phase + 0.07 * (f + 1)，phase 是它初始位置距
+    顶部的距离。高度和回到顶部的次数 cycle 都由 d 对场景高度取模得到；x, y 在
+    cycle == 0 时是初始位置，之后由 (雪花种子, cycle) 的哈希决定。任意一帧都是
+    O(N_snow) 的直接计算，不需要重放之前的帧；临时数组全部预分配。
+    """
+
+    TOP = 12
+    BOTTOM = -2
+    SPEED = 0.07
+    SPAN = 11
+
+    def __init__(self, positions, seed=0):
+        n = positions.shape[1]
+        self.positions = positions
+        self.x0 = positions[0].copy()
+        self.y0 = positions[1].copy()
+        self.phase = self.TOP - positions[2].astype(np.float64)
+        self.flake_seed = np.random.default_rng(seed).integers(0, 2**63, n, dtype=np.uint64)
+
+        self._fallen = np.empty(n)
+        self._cycle = np.empty(n)
+        self._first = np.empty(n, dtype=bool)
+        self._hash = np.empty(n, dtype=np.uint64)
+        self._tmp = np.empty(n, dtype=np.uint64)
+        self._unit = np.empty(n)
+
+    def at(self, frame, out=None):
+        """第 frame 帧（已经执行过该帧的下落）的 (3, n) 坐标，写入 out（默认写回场景）"""
+        if out is None:
+            out = self.positions
+        height = self.TOP - self.BOTTOM
+
+        # 下落总距离 → 回到顶部的次数 + 当前周期内的下落距离
+        fallen, cycle = self._fallen, self._cycle
+        np.add(self.phase, self.SPEED * (frame + 1), out=fallen)
+        np.floor_divide(fallen, height, out=cycle)
+        np.equal(cycle, 0, out=self._first)
+        np.multiply(cycle, height, out=self._unit)
+        np.subtract(fallen, self._unit, out=fallen)
+        np.subtract(self.TOP, fallen, out=out[2], casting="unsafe")
+
+        # 每个周期的新位置：splitmix64(雪花种子 + cycle * 黄金比例常数)
+        h, tmp = self._hash, self._tmp
+        np.copyto(h, cycle, casting="unsafe")
+        np.multiply(h, np.uint64(0x9E3779B97F4A7C15), out=h)
+        np.add(h, self.flake_seed, out=h)
+        for shift, mult in ((30, 0xBF58476D1CE4E5B9), (27, 0x94D049BB133111EB)):
+            np.right_shift(h, np.uint64(shift), out=tmp)
+            np.bitwise_xor(h, tmp, out=h)
+            np.multiply(h, np.uint64(mult), out=h)
+        np.right_shift(h, np.uint64(31), out=tmp)
+        np.bitwise_xor(h, tmp, out=h)
+
+        # 高 32 位给 x，低 32 位给 y，映射到 [-SPAN, SPAN)
+        for row, bits, initial in ((0, None, self.x0), (1, 0xFFFFFFFF, self.y0)):
+            if bits is None:
+                np.right_shift(h, np.uint64(32), out=tmp)
+            else:
+                np.bitwise_and(h, np.uint64(bits), out=tmp)
+            np.multiply(tmp, 2 * self.SPAN / 2**32, out=self._unit)
+            np.subtract(self._unit, self.SPAN, out=out[row], casting="unsafe")
+            np.copyto(out[row], initial, where=self._first)
+
+        return out
+
+
+class FrameTimer:
+    """最近若干帧的平均帧间隔，用于显示 FPS"""
+
+    def __init__(self, window=25):
+        self.times = deque(maxlen=window + 1)
+
+    def tick(self):
+        self.times.append(time.perf_counter())
+
+    @property
+    def frame_time(self):
+        if len(self.times) < 2:
+            return 0.0
+        return (self.times[-1] - self.times[0]) / (len(self.times) - 1)
+
+    @property
+    def fps(self):
+        dt = self.frame_time
+        return 1 / dt if dt > 0 else 0.0
+
+
+class TreeAnimation:
+    """
+    驱动 draw_scene 画出的各个 artist，update(frame) 可直接交给 FuncAnimation
+
+    五角星的坐标、颜色和大小都写进预分配的缓冲区；透明度按 8 位量化，没有
+    变化的 artist 不再重新设置。rotate=False 时视角固定，动态图层标记为
+    animated，地面、星空和文字只画一次作为背景缓存：交互窗口里交给
+    FuncAnimation(blit=True)，无界面渲染用 draw()。show_fps=True 时在左上角显示
+    帧率和帧耗时。
+
+    背景缓存省下的只是地面、星空和文字：1200x1400、树 6000 个粒子时单核上每帧从
+    完整绘制的约 180 ms 降到约 90 ms（约 11 fps）。剩下的是每帧都要重画的树（闪烁
+    改变整层透明度）、装饰球、五角星和雪花，Agg 逐个画这些各自颜色、带描边的点，
+    缓存帮不上忙；25 fps 只能靠 --budget-ms 40 减少粒子数（树会减到几百个）。
+    背景里的地面和星空总是在动态图层下面，而完整绘制时它们按深度排在树后面画，
+    树根附近约 0.06% 的像素和完整绘制不同。
+    """
+
+    def __init__(self, ax, scene, artists, seed=0, rotate=True, show_fps=False):
+        self.ax = ax
+        self.artists = artists
+        self.rotate = rotate
+
+        topper, topper_colors, topper_sizes = scene.layer("topper")
+        # 存储原始坐标、颜色和大小
+        self.heart_original = topper.copy()
+        self.heart_colors = topper_colors.copy()
+        self.heart_sizes = topper_sizes.copy()
+
+        # 每帧复用的缓冲区
+        self._heart_rotated = np.empty_like(self.heart_original)
+        self._heart_colors_now = self.heart_colors.copy()
+        self._heart_sizes_now = np.empty_like(self.heart_sizes)
+        self._last = {}
+        self._background = None
+
+        self.snow = SnowFall(scene.layer("snow")[0], seed)
+
+        self.timer = FrameTimer()
+        self.fps_text = None
+        if show_fps:
+            self.fps_text = ax.text2D(0.02, 0.97, "", transform=ax.transAxes, color="white", fontsize=12)
+
+        self.dynamic = [artists[name] for name in ("tree", "decorations", "topper", "snow")]
+        if self.fps_text is not None:
+            self.dynamic.append(self.fps_text)
+        if not rotate:
+            for artist in self.dynamic:
+                artist.set_animated(True)
+            # 先完整画一次：得到投影矩阵和各图层按深度排好的 zorder，同时缓存不含动态图层的背景
+            canvas = ax.figure.canvas
+            canvas.draw()
+            self._background = canvas.copy_from_bbox(ax.figure.bbox)
+            self.dynamic.sort(key=lambda artist: artist.get_zorder())
+
+    def _changed(self, key, value):
+        if self._last.get(key) == value:
+            return False
+        self._last[key] = value
+        return True
+
+    def update(self, frame):
+        artists = self.artists
+        moved = []
+
+        # 雪花飘落
+        if self._changed("snow", frame):
+            snow = self.snow.at(frame)
+            artists["snow"]._offsets3d = (snow[0], snow[1], snow[2])
+            moved.append(artists["snow"])
+
+        # 树闪烁效果
+        tree_alpha = round((0.85 + 0.1 * np.sin(frame * 0.2)) * 255) / 255
+        if self._changed("tree_alpha", tree_alpha):
+            artists["tree"].set_alpha(tree_alpha)
+
+        # 五角星旋转
+        heart_angle = frame * 0.1
+        if self._changed("heart_angle", heart_angle):
+            R = rotation_matrix_z(heart_angle).astype(np.float32)
+            heart_rotated = np.matmul(R, self.heart_original, out=self._heart_rotated)
+            artists["topper"]._offsets3d = (heart_rotated[0], heart_rotated[1], heart_rotated[2])
+            moved.append(artists["topper"])
+
+        # 五角星脉动效果
+        pulse = 0.9 + 0.1 * np.sin(frame * 0.15)
+        if self._changed("pulse", pulse):
+            np.multiply(self.heart_sizes, pulse, out=self._heart_sizes_now)
+            artists["topper"].set_sizes(self._heart_sizes_now)
+
+        # 五角星颜色闪烁
+        heart_alpha_dynamic = round((0.7 + 0.3 * np.sin(frame * 0.12)) * 255) / 255
+        if self._changed("heart_alpha", heart_alpha_dynamic):
+            alpha = self._heart_colors_now[:, 3]
+            np.multiply(self.heart_colors[:, 3], heart_alpha_dynamic, out=alpha)
+            np.clip(alpha, 0.2, 0.95, out=alpha)
+            artists["topper"].set_color(self._heart_colors_now)
+
+        # 装饰球闪烁
+        deco_alpha = round((0.8 + 0.2 * np.sin(frame * 0.25)) * 255) / 255
+        if self._changed("deco_alpha", deco_alpha):
+            artists["decorations"].set_alpha(deco_alpha)
+
+        # 缓慢旋转视角
+        if self.rotate:
+            elev = 25 + 1.5 * np.sin(frame * 0.04)
+            azim = -30 + frame * 0.08
+            self.ax.view_init(elev, azim)
+
+        # 帧率
+        self.timer.tick()
+        if self.fps_text is not None:
+            self.fps_text.set_text(f"{self.timer.fps:5.1f} fps  {self.timer.frame_time * 1e3:5.1f} ms")
+
+        if self.rotate:
+            return []
+
+        # 视角固定时只重画动态图层：blit 不经过 Axes3D.draw，移动过的要自己重新投影
+        for artist in moved:
+            artist.do_3d_projection()
+        return self.dynamic
+
+    def draw(self):
+        """无界面渲染时画出 update() 之后的这一帧；视角固定时只恢复背景、重画动态图层"""
+        canvas = self.ax.figure.canvas
+        if self.rotate:
+            canvas.draw()
+            return
+        canvas.restore_region(self._background)
+        for artist in self.dynamic:
+            self.ax.draw_artist(artist)
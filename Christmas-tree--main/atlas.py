@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+预渲染图集：每个主题 × 固定视角 × 默认参数的静态图只渲染一次，存成磁盘上的 PNG 和一个索引文件
+
+应用启动时在后台补齐缺少的图，也可以部署前用命令行生成。预览区和默认参数的
+"生成圣诞树图像" 直接读图集里的文件，请求路径上没有 matplotlib 工作。
+索引里记录一个版本号：生成和绘制代码、默认参数、主题颜色或 matplotlib 版本
+任何一个变了，版本号就变，旧图全部作废重新渲染。
+
+用法: python atlas.py [--dir .atlas] [--force]
+      python atlas.py --bundle          # 重新生成随代码发布的首屏默认图
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from importlib.metadata import version
+
+import numpy as np
+
+from scene import DEFAULT_VIEW, get_theme_colors
+
+logger = logging.getLogger("christmas_tree.atlas")
+
+THEMES = ("经典绿色", "冬季蓝", "温暖橙", "神秘紫")
+
+# 固定视角 (elev, azim)；第一个是默认视角
+VIEWS = {
+    "经典视角": DEFAULT_VIEW,
+    "侧面": (25, 60),
+    "俯视": (60, -30),
+}
+
+# 和 streamlit_app.py 侧边栏的默认值一致
+DEFAULT_PARAMS = dict(n_tree=3000, n_snow=800, n_topper=500, seed=2024, backend="matplotlib", dpi=100)
+
+# 这些文件的内容决定了图集里的画面：生成（scenegraph、按视角生成用的 cull）、
+# 子采样（lod）、剔除（cull、raster.Camera）和绘制
+SOURCES = ("scene.py", "scenegraph.py", "cull.py", "lod.py", "raster.py", "instancing.py", "render.py",
+           "render_service.py", "atlas.py")
+
+INDEX_NAME = "index.json"
+DEFAULT_DIR = os.environ.get("CHRISTMAS_TREE_ATLAS",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), ".atlas"))
+
+# 随代码发布的默认主题、默认视角的图：冷启动时图集还没生成，首屏先显示它。
+# 不跟着版本号自动更新，画面改了以后用 python atlas.py --bundle 重新生成
+BUNDLED_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "default.jpg")
+
+
+def atlas_version(source_dir=os.path.dirname(os.path.abspath(__file__))):
+    """source_dir 里 SOURCES 的源代码、默认参数、视角、主题颜色和库版本的摘要"""
+    digest = hashlib.sha256()
+    for name in SOURCES:
+        with open(os.path.join(source_dir, name), "rb") as f:
+            digest.update(f.read())
+    params = dict(params=DEFAULT_PARAMS, views=VIEWS, themes={t: get_theme_colors(t) for t in THEMES},
+                  matplotlib=version("matplotlib"), numpy=np.__version__)
+    digest.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode())
+    return digest.hexdigest()[:16]
+
+
+def job_params(theme, view):
+    """渲染服务的任务参数"""
+    return dict(DEFAULT_PARAMS, theme=theme, view=VIEWS[view], counts=None)
+
+
+def _write_atomic(path, data):
+    # 先写临时文件再改名，别的进程读到的要么是旧文件要么是完整的新文件
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class Atlas:
+    """
+    atlas = Atlas(); png = atlas.get("冬季蓝", "侧面")  # 还没渲染时返回 None
+
+    build(render) 用 render(任务参数) -> PNG 字节 补齐缺少的图，可以在后台线程里运行。
+    """
+
+    def __init__(self, directory=DEFAULT_DIR):
+        self.directory = directory
+        self.version = atlas_version()
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_NAME)
+
+    def _load(self):
+        try:
+            with open(self._index_path(), encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        entries = index.get("entries", {})
+        if index.get("version") != self.version:
+            # 代码或参数变了：删掉旧图
+            logger.info("图集版本 %s 已过期（当前 %s），重新渲染", index.get("version"), self.version)
+            for entry in entries.values():
+                try:
+                    os.remove(os.path.join(self.directory, entry["file"]))
+                except OSError:
+                    pass
+            return
+        self.entries = {key: entry for key, entry in entries.items()
+                        if os.path.exists(os.path.join(self.directory, entry["file"]))}
+
+    def _save_index(self):
+        index = dict(version=self.version, params=DEFAULT_PARAMS, views=VIEWS, entries=self.entries)
+        _write_atomic(self._index_path(), json.dumps(index, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    @staticmethod
+    def key(theme, view):
+        return f"{theme}/{view}"
+
+    def get(self, theme, view=next(iter(VIEWS))):
+        """图集里的 PNG 字节，没有时返回 None"""
+        entry = self.entries.get(self.key(theme, view))
+        if entry is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, entry["file"]), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def missing(self):
+        return [(theme, view) for theme in THEMES for view in VIEWS if self.key(theme, view) not in self.entries]
+
+    def put(self, theme, view, png, render_ms=0.0):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{self.version}-{THEMES.index(theme)}-{list(VIEWS).index(view)}.png"
+        _write_atomic(os.path.join(self.directory, name), png)
+        with self._lock:
+            self.entries[self.key(theme, view)] = dict(file=name, bytes=len(png), render_ms=round(render_ms, 1))
+            self._save_index()
+
+    def build(self, render, force=False):
+        """渲染缺少的图（force=True 时全部重画），返回新渲染的张数；单张失败只记日志"""
+        todo = [(theme, view) for theme in THEMES for view in VIEWS] if force else self.missing()
+        done = 0
+        for theme, view in todo:
+            start = time.perf_counter()
+            try:
+                png = render(job_params(theme, view))
+            except Exception as e:
+                logger.warning("图集 %s 渲染失败: %s", self.key(theme, view), e)
+                continue
+            self.put(theme, view, png, (time.perf_counter() - start) * 1e3)
+            done += 1
+        return done
+
+    def start_warmup(self, render):
+        """有缺少的图时在后台线程里补齐"""
+        if not self.missing():
+            return None
+        thread = threading.Thread(target=self.build, args=(render,), name="atlas-warmup", daemon=True)
+        thread.start()
+        return thread
+
+
+def bundled_image():
+    """随代码发布的默认图（JPEG 字节），文件不存在时返回 None"""
+    try:
+        with open(BUNDLED_IMAGE, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_bundled_image(path=BUNDLED_IMAGE, quality=85):
+    """用本进程渲染默认主题、默认视角，存成 JPEG（比 PNG 小一半，首屏下载更快）"""
+    import io
+    from PIL import Image
+
+    png = render_local(job_params(THEMES[0], next(iter(VIEWS))))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    output = io.BytesIO()
+    Image.open(io.BytesIO(png)).convert("RGB").save(output, format="JPEG", quality=quality, optimize=True)
+    _write_atomic(path, output.getvalue())
+    return len(output.getvalue())
+
+
+def render_local(params):
+    """命令行在本进程里渲染，不启动进程池"""
+    from render_service import render_image, scene_for
+    return render_image(params["backend"], scene_for(params), get_theme_colors(params["theme"]),
+                        params["dpi"], params["view"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预渲染主题 × 视角图集")
+    parser.add_argument("--dir", default=DEFAULT_DIR, help="图集目录")
+    parser.add_argument("--force", action="store_true", help="全部重新渲染")
+    parser.add_argument("--bundle", action="store_true", help=f"重新生成随代码发布的默认图 {BUNDLED_IMAGE}")
+    args = parser.parse_args()
+
+    if args.bundle:
+        size = write_bundled_image()
+        print(f"🎄 默认图 → {BUNDLED_IMAGE}（{size / 1024:.0f} KB）")
+        return
+
+    atlas = Atlas(args.dir)
+    start = time.perf_counter()
+    done = atlas.build(render_local, force=args.force)
+    total = sum(entry["bytes"] for entry in atlas.entries.values())
+    print(f"🎄 图集 {atlas.version}：新渲染 {done} 张，共 {len(atlas.entries)} 张 {total / 2**20:.1f} MB，"
+          f"用时 {time.perf_counter() - start:.1f} 秒 → {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
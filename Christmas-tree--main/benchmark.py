@@ -0,0 +1,686 @@
+#!/usr/bin/env python3
+"""
+粒子生成和渲染基准测试
+用法: python benchmark.py [--max-n 1000000] [--repeat 5]
+      python benchmark.py stages --json results.json               # 分阶段计时，结果写成 JSON
+      python benchmark.py stages --baseline results.json           # 和保存的基线对比，变慢时退出码为 1
+      python benchmark.py service --requests 32                    # 渲染进程池吞吐量（1 到 CPU 核数个进程）
+      python benchmark.py decorations --n-tree 1000000             # 装饰球采样：全排列 vs 按间距逐个抽
+      python benchmark.py build --max-n 2000000                    # 并行生成场景：1 到 CPU 核数个线程
+      python benchmark.py occlusion --max-n 400000                 # 遮挡剔除：去掉的粒子、渲染耗时和像素差
+      python benchmark.py forest --trees 12 24 48                  # 森林：实例化 vs 每棵树单独存一份
+      python benchmark.py http --requests 2000                     # HTTP 接口：keep-alive、缓存和 304 的吞吐量
+      python benchmark.py startup                                  # 冷启动：首字节、首屏脚本、第一次渲染
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import matplotlib
+from PIL import Image
+
+from scene import (generate_tree, generate_decorations, generate_3d_heart, generate_ground, generate_snow,
+                   generate_stars, get_theme_colors, create_tree_colors, build_scene, sample_spaced,
+                   DECORATION_SPACING, DEFAULT_VIEW)
+from animation import SnowFall
+from render import new_figure, setup_axes, draw_scene, render_rgba, render_png
+import raster
+from render_service import RenderService
+from scenegraph import SceneGraph
+from cull import OCCLUSION_COVERAGE, cull_scene, occlude_scene, view_camera
+from forest import build_forest
+from server import ImageServer, PooledHTTPServer
+
+
+def measure(fn, repeat=5):
+    """运行 fn 若干次，返回耗时中位数（秒）"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def particle_counts(max_n):
+    """1k, 10k, 100k ... 直到 max_n"""
+    n = 1000
+    while n <= max_n:
+        yield n
+        n *= 10
+
+
+def bench_heart(max_n, repeat):
+    """树顶五角星采样：每个粒子的耗时应基本不随 n 变化（线性扩展）"""
+    print("generate_3d_heart")
+    print(f"{'n':>10} {'总耗时(ms)':>12} {'每粒子(ns)':>12}")
+    for n in particle_counts(max_n):
+        rng = np.random.default_rng(0)
+        t = measure(lambda: generate_3d_heart(n=n, scale=0.7, z_top=9.6, rng=rng), repeat)
+        print(f"{n:>10} {t * 1e3:>12.2f} {t / n * 1e9:>12.1f}")
+
+
+def bench_tree_colors(max_n, repeat):
+    """树颜色插值：分配新数组 vs 写入预分配缓冲区"""
+    print("create_tree_colors")
+    print(f"{'n':>10} {'新数组(ms)':>12} {'预分配(ms)':>12}")
+    theme_colors = get_theme_colors("经典绿色")
+    for n in particle_counts(max_n):
+        z = np.random.default_rng(0).uniform(-0.5, 9.5, n)
+        out = np.empty((n, 4), dtype=np.float32)
+        t_new = measure(lambda: create_tree_colors(z, theme_colors), repeat)
+        t_out = measure(lambda: create_tree_colors(z, theme_colors, out=out, alpha=0.9), repeat)
+        print(f"{n:>10} {t_new * 1e3:>12.2f} {t_out * 1e3:>12.2f}")
+
+
+def bench_snow(max_n, repeat):
+    """解析雪花模型：任意帧的耗时只和雪花数有关，和帧号无关"""
+    print("SnowFall.at")
+    print(f"{'n':>10} {'第10帧(ms)':>12} {'第10万帧(ms)':>14}")
+    for n in particle_counts(max_n):
+        snow = SnowFall(generate_snow(n, rng=np.random.default_rng(0)), seed=0)
+        out = np.empty((3, n), dtype=np.float32)
+        t_near = measure(lambda: snow.at(10, out), repeat)
+        t_far = measure(lambda: snow.at(100_000, out), repeat)
+        print(f"{n:>10} {t_near * 1e3:>12.2f} {t_far * 1e3:>14.2f}")
+
+
+def bench_scene_memory():
+    """每个树粒子占用的字节数：ParticleScene vs 旧版 float64 坐标 + Python 颜色列表"""
+    print("ParticleScene 内存")
+    n = 10000
+    scene = build_scene(n_tree=n, n_snow=0, n_decorations=0, n_topper=0, n_ground=0, n_stars=0)
+    new_bytes = scene.nbytes / n
+
+    # 旧版：x, y, z 三个 float64 数组，颜色是每个粒子一个 [r, g, b] 列表
+    color = [0.1, 0.5, 0.1]
+    old_bytes = 3 * 8 + sys.getsizeof(color) + sum(sys.getsizeof(c) for c in color) + 8
+    print(f"旧版 {old_bytes:.0f} B/粒子，ParticleScene {new_bytes:.0f} B/粒子")
+
+
+def bench_backends(max_n, repeat):
+    """
+    每帧渲染耗时：mplot3d 散点图 vs NumPy 光栅化，画面都是 1200x1400
+    "帧" 只算画进帧缓冲，"PNG" 包括编码；matplotlib 在 10 万粒子以上每帧要好几秒，只测到 10 万。
+    单核上光栅化约快 3～5 倍，没有达到 10 倍（见 raster.py 的说明）
+    """
+    print("渲染后端（每帧）")
+    print(f"{'粒子数':>10} {'mpl帧(ms)':>11} {'光栅帧(ms)':>11} {'加速':>6} {'mpl PNG(ms)':>12} {'光栅PNG(ms)':>12}")
+    theme_colors = get_theme_colors("经典绿色")
+    camera = raster.Camera()
+    frame = np.empty((camera.height, camera.width, 3), dtype=np.uint8)
+    for n in particle_counts(min(max_n, 100_000)):
+        scene = build_scene(n_tree=n, n_snow=n // 4, theme_colors=theme_colors, rng=np.random.default_rng(0))
+        fig = new_figure(figsize=(12, 14), dpi=100)
+        ax = fig.add_subplot(111, projection='3d')
+        setup_axes(fig, ax, theme_colors)
+        draw_scene(ax, scene, theme_colors)
+        fig.tight_layout()
+
+        def mpl_png():
+            fig.savefig(io.BytesIO(), format="png", facecolor=theme_colors["background"])
+
+        render_rgba(fig)
+        raster.rasterize(scene, theme_colors, camera, out=frame)
+        t_mpl = measure(lambda: render_rgba(fig), repeat)
+        t_raster = measure(lambda: raster.rasterize(scene, theme_colors, camera, out=frame), repeat)
+        t_mpl_png = measure(mpl_png, repeat)
+        t_raster_png = measure(lambda: raster.render_png(scene, theme_colors, camera), repeat)
+        print(f"{len(scene):>10} {t_mpl * 1e3:>11.1f} {t_raster * 1e3:>11.1f} {t_mpl / t_raster:>5.1f}x"
+              f" {t_mpl_png * 1e3:>12.1f} {t_raster_png * 1e3:>12.1f}")
+
+
+# ==============================
+# 分阶段基准：每个生成函数和渲染步骤单独计时
+# ==============================
+# 每个阶段是 setup(n) -> 无参函数，setup 的准备工作不计时。
+# matplotlib 在 10 万粒子以上每帧要好几秒，渲染阶段只测到 max_n 为止。
+
+def _stage_scene(n):
+    """渲染阶段用的场景：n 个树粒子，地面和雪花按 santa1.py 的比例"""
+    return build_scene(n_tree=n, n_snow=n // 4, n_decorations=min(400, n), n_ground=n // 2,
+                       rng=np.random.default_rng(0))
+
+
+def _stage_axes(theme_colors):
+    fig = new_figure(figsize=(12, 14), dpi=100)
+    ax = fig.add_subplot(111, projection='3d')
+    setup_axes(fig, ax, theme_colors)
+    return fig, ax
+
+
+def _stage_figure(n, theme_colors):
+    fig, ax = _stage_axes(theme_colors)
+    draw_scene(ax, _stage_scene(n), theme_colors)
+    fig.tight_layout()
+    return fig
+
+
+def _generator_stage(generate):
+    def setup(n):
+        rng = np.random.default_rng(0)
+        out = np.empty((3, n), dtype=np.float32)
+        return lambda: generate(n, rng=rng, out=out)
+    return setup
+
+
+def _setup_decorations(n):
+    # 和应用一样从 n 个树粒子里挑 400 个装饰球，耗时应该不随 n 变化
+    tree = generate_tree(n, rng=np.random.default_rng(0))
+    rng = np.random.default_rng(0)
+    return lambda: generate_decorations(tree, min(400, n), rng=rng)
+
+
+def _setup_tree_colors(n):
+    z = np.random.default_rng(0).uniform(-0.5, 9.5, n)
+    out = np.empty((n, 4), dtype=np.float32)
+    theme_colors = get_theme_colors("经典绿色")
+    return lambda: create_tree_colors(z, theme_colors, out=out, alpha=0.9)
+
+
+def _setup_build_scene(n):
+    return lambda: _stage_scene(n)
+
+
+def _setup_scatter(n):
+    theme_colors = get_theme_colors("经典绿色")
+    scene = _stage_scene(n)
+
+    def run():
+        _, ax = _stage_axes(theme_colors)
+        draw_scene(ax, scene, theme_colors)
+    return run
+
+
+def _setup_draw(n):
+    fig = _stage_figure(n, get_theme_colors("经典绿色"))
+    return lambda: render_rgba(fig)
+
+
+def _setup_png_encode(n):
+    image = Image.fromarray(render_rgba(_stage_figure(n, get_theme_colors("经典绿色"))))
+    return lambda: image.save(io.BytesIO(), format="PNG")
+
+
+def _setup_savefig(n):
+    theme_colors = get_theme_colors("经典绿色")
+    fig = _stage_figure(n, theme_colors)
+    return lambda: fig.savefig(io.BytesIO(), format="png", facecolor=theme_colors["background"])
+
+
+def _setup_rasterize(n):
+    theme_colors = get_theme_colors("经典绿色")
+    scene = _stage_scene(n)
+    camera = raster.Camera()
+    frame = np.empty((camera.height, camera.width, 3), dtype=np.uint8)
+    return lambda: raster.rasterize(scene, theme_colors, camera, out=frame)
+
+
+# (阶段名, setup, 最大粒子数)
+STAGES = [
+    ("generate_tree", _generator_stage(generate_tree), None),
+    ("generate_decorations", _setup_decorations, None),
+    ("generate_3d_heart", _generator_stage(generate_3d_heart), None),
+    ("create_tree_colors", _setup_tree_colors, None),
+    ("generate_ground", _generator_stage(generate_ground), None),
+    ("generate_snow", _generator_stage(generate_snow), None),
+    ("generate_stars", _generator_stage(generate_stars), None),
+    ("build_scene", _setup_build_scene, None),
+    ("scatter_setup", _setup_scatter, 100_000),
+    ("canvas_draw", _setup_draw, 100_000),
+    ("png_encode", _setup_png_encode, 100_000),
+    ("savefig", _setup_savefig, 100_000),
+    ("rasterize", _setup_rasterize, 1_000_000),
+]
+
+# 对比基线时忽略小于这个差值的变化，避免微秒级阶段的噪声被当成退化
+NOISE_FLOOR_MS = 0.5
+
+
+def profile_stage(fn, repeat=5):
+    """先预热一次，再计时 repeat 次；另外在 tracemalloc 下运行一次得到峰值内存"""
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times = np.array(times) * 1e3
+    return {
+        "median_ms": float(np.median(times)),
+        "p95_ms": float(np.percentile(times, 95)),
+        "peak_mb": peak / 2**20,
+    }
+
+
+def run_stages(max_n, repeat, only=None):
+    """逐个产出 {stage, n, median_ms, p95_ms, peak_mb}"""
+    for name, setup, stage_max in STAGES:
+        if only and name not in only:
+            continue
+        for n in particle_counts(min(max_n, stage_max or max_n)):
+            yield dict(stage=name, n=n, **profile_stage(setup(n), repeat))
+
+
+def compare(result, baseline, threshold):
+    """和基线中同一阶段同一规模的中位数比较，返回 (比值, 是否退化)；基线里没有时返回 (None, False)"""
+    base = baseline.get((result["stage"], result["n"]))
+    if base is None or base["median_ms"] <= 0:
+        return None, False
+    ratio = result["median_ms"] / base["median_ms"]
+    slower = result["median_ms"] - base["median_ms"]
+    return ratio, ratio > threshold and slower > NOISE_FLOOR_MS
+
+
+def bench_stages(max_n, repeat, json_path=None, baseline_path=None, threshold=1.25, only=None):
+    """各阶段的中位数、p95 和峰值内存；有基线时标出变慢超过 threshold 倍的阶段，返回退化数量"""
+    baseline = {}
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = {(r["stage"], r["n"]): r for r in json.load(f)["results"]}
+
+    print(f"{'阶段':<22} {'n':>9} {'中位数(ms)':>11} {'p95(ms)':>10} {'峰值内存(MB)':>13} {'对比基线':>9}")
+    results, regressions = [], 0
+    for r in run_stages(max_n, repeat, only):
+        results.append(r)
+        ratio, regressed = compare(r, baseline, threshold)
+        regressions += regressed
+        note = "" if ratio is None else f"{ratio:.2f}x" + (" ⚠️" if regressed else "")
+        print(f"{r['stage']:<22} {r['n']:>9} {r['median_ms']:>11.2f} {r['p95_ms']:>10.2f} "
+              f"{r['peak_mb']:>13.1f} {note:>9}", flush=True)
+
+    if json_path:
+        meta = {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "matplotlib": matplotlib.__version__,
+            "machine": platform.platform(),
+            "repeat": repeat,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {json_path}")
+    if baseline:
+        print(f"{regressions} 项比基线慢 {threshold:.2f} 倍以上" if regressions else "没有发现退化")
+    return regressions
+
+
+# ==============================
+# 渲染服务吞吐量
+# ==============================
+def bench_service(requests, backend="matplotlib", max_workers=None):
+    """
+    同时有 2 倍进程数的客户端线程提交静态图渲染，测每秒完成的请求数。
+    每个请求的种子不同，工作进程里的场景缓存不起作用；第一轮先让每个进程热身。
+    """
+    print(f"渲染服务吞吐量（{backend}，{requests} 个请求）")
+    print(f"{'进程数':>6} {'请求/秒':>9} {'平均延迟(ms)':>13} {'加速':>6}")
+    base = None
+    for workers in range(1, (max_workers or os.cpu_count() or 1) + 1):
+        service = RenderService(workers=workers, max_pending=requests)
+        params = [dict(n_tree=3000, n_snow=800, n_topper=500, theme="经典绿色", seed=seed,
+                       counts=None, backend=backend, dpi=100) for seed in range(requests)]
+        try:
+            for future in [service.submit(p) for p in params[:workers]]:
+                future.result()
+
+            def timed(p):
+                start = time.perf_counter()
+                service.render(p)
+                return time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(2 * workers) as clients:
+                latencies = list(clients.map(timed, params))
+            elapsed = time.perf_counter() - start
+        finally:
+            service.shutdown()
+        rate = requests / elapsed
+        base = base or rate
+        print(f"{workers:>6} {rate:>9.1f} {np.mean(latencies) * 1e3:>13.0f} {rate / base:>5.1f}x")
+
+
+# ==============================
+# 并行生成场景
+# ==============================
+def bench_build(max_n, repeat, max_workers=None):
+    """
+    SceneGraph 从头生成 max_n 个树粒子（加上一半的地面、四分之一的雪花）的场景，
+    线程数从 1 到 CPU 核数；每种线程数得到的场景必须和单线程完全一样
+    """
+    params = dict(n_tree=max_n, n_ground=max_n // 2, n_snow=max_n // 4, n_topper=800)
+    print(f"并行生成场景（{sum(params.values()):,} 个粒子，{os.cpu_count()} 个 CPU）")
+    print(f"{'线程数':>6} {'耗时(ms)':>10} {'加速':>6} {'一致':>4}")
+    reference = SceneGraph(0).update(**params)
+    base = None
+    for workers in range(1, (max_workers or os.cpu_count() or 1) + 1):
+        t = measure(lambda: SceneGraph(0, workers=workers).update(**params), repeat)
+        scene = SceneGraph(0, workers=workers).update(**params)
+        same = all(np.array_equal(getattr(scene, k), getattr(reference, k))
+                   for k in ("positions", "colors", "sizes", "palette_index"))
+        base = base or t
+        print(f"{workers:>6} {t * 1e3:>10.0f} {base / t:>5.1f}x {'✓' if same else '✗':>4}")
+
+
+# ==============================
+# 遮挡剔除
+# ==============================
+def _png_pixels(png):
+    return np.asarray(Image.open(io.BytesIO(png)).convert("RGB")).astype(np.int16)
+
+
+def bench_occlusion(max_n, repeat, coverages=(0.95, OCCLUSION_COVERAGE, 0.99)):
+    """
+    默认视角的静态图：按视角生成、视锥剔除后再做遮挡剔除，比较两种后端剔除前后的
+    渲染耗时和像素差（最大差、平均差、差超过 8 级的像素比例）
+    """
+    theme_colors = get_theme_colors("经典绿色")
+    camera = view_camera()
+    backends = [("matplotlib", lambda scene: render_png(scene, theme_colors)),
+                ("NumPy 光栅化", lambda scene: raster.render_png(scene, theme_colors, raster.Camera()))]
+    print("遮挡剔除（默认视角，树 / 地面 / 雪花 = n / n/2 / n/8）")
+    print(f"{'粒子数':>10} {'阈值':>5} {'剔除':>7} {'剔除(ms)':>9} {'后端':<12} {'渲染(ms)':>17} "
+          f"{'最大差':>6} {'平均差':>7} {'>8 级':>8}")
+    for n in particle_counts(max_n):
+        scene = SceneGraph(2024, DEFAULT_VIEW).update(n_tree=n, n_ground=n // 2, n_snow=n // 8, n_topper=500)
+        scene, _ = cull_scene(scene, camera)
+        for coverage in coverages:
+            t_occlude = measure(lambda: occlude_scene(scene, camera, coverage), repeat)
+            occluded, _ = occlude_scene(scene, camera, coverage)
+            removed = 1 - len(occluded) / len(scene)
+            for name, render in backends:
+                before, after = measure(lambda: render(scene), repeat), measure(lambda: render(occluded), repeat)
+                diff = np.abs(_png_pixels(render(scene)) - _png_pixels(render(occluded))).max(axis=2)
+                print(f"{len(scene):>10,} {coverage:>5} {removed:>7.1%} {t_occlude * 1e3:>9.1f} {name:<12} "
+                      f"{before * 1e3:>7.0f} → {after * 1e3:>7.0f} {diff.max():>6} {diff.mean():>7.3f} "
+                      f"{(diff > 8).mean():>8.3%}")
+
+
+# ==============================
+# 森林
+# ==============================
+def bench_forest(tree_counts, repeat):
+    """
+    实例化的森林和把每棵树展开存一份的场景：场景内存、光栅化耗时和临时内存峰值
+    （展开的场景生成耗时不算，只算它多占的内存）
+    """
+    theme_colors = get_theme_colors("经典绿色")
+    print("森林（每棵树 3000 个粒子，NumPy 光栅化 1200x1400）")
+    print(f"{'棵数':>4} {'画出粒子':>10} {'场景(MB)':>9} {'展开(MB)':>9} {'实例化(ms)':>11} {'展开(ms)':>9} "
+          f"{'实例化峰值(MB)':>15} {'展开峰值(MB)':>13}")
+    for n in tree_counts:
+        forest = build_forest(n, 2024, theme_colors)
+        camera = forest.camera()
+        flat = forest.materialize()
+        instanced = lambda: raster.rasterize(forest.scene, theme_colors, camera, instances=forest.instances)
+        expanded = lambda: raster.rasterize(flat, theme_colors, camera)
+        times, peaks = [], []
+        for fn in (instanced, expanded):
+            times.append(measure(fn, repeat))
+            tracemalloc.start()
+            fn()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        print(f"{n:>4} {len(forest):>10,} {forest.nbytes / 2**20:>9.1f} {flat.nbytes / 2**20:>9.1f} "
+              f"{times[0] * 1e3:>11.0f} {times[1] * 1e3:>9.0f} {peaks[0] / 2**20:>15.0f} {peaks[1] / 2**20:>13.0f}")
+
+
+# ==============================
+# HTTP 接口
+# ==============================
+def bench_http(requests, clients=8, threads=32):
+    """
+    在本进程里起 server.py 的服务，clients 个客户端线程各自请求同一组图片（第一轮渲染后
+    都在缓存里），测每秒请求数：每个请求新建连接 / keep-alive 复用连接 / 带 If-None-Match 拿 304
+    """
+    images = ImageServer(RenderService(workers=1))
+    server = PooledHTTPServer(("127.0.0.1", 0), images, threads)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    paths = [f"/render?size=small&backend=raster&seed={seed}" for seed in range(8)]
+
+    def fetch(connection, path, etag=None):
+        connection.request("GET", path, headers={"If-None-Match": etag} if etag else {})
+        response = connection.getresponse()
+        response.read()
+        return response.status, response.getheader("ETag")
+
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        etags = {path: fetch(connection, path)[1] for path in paths}
+        connection.close()
+
+        def run(keep_alive, conditional):
+            def client(i):
+                connection = http.client.HTTPConnection("127.0.0.1", port)
+                statuses = []
+                for k in range(i, requests, clients):
+                    path = paths[k % len(paths)]
+                    statuses.append(fetch(connection, path, etags[path] if conditional else None)[0])
+                    if not keep_alive:
+                        connection.close()
+                connection.close()
+                return statuses
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(clients) as pool:
+                statuses = sum(pool.map(client, range(clients)), [])
+            return requests / (time.perf_counter() - start), statuses
+
+        print(f"HTTP 接口（{clients} 个客户端，{requests} 个请求，{len(paths)} 张 300x350 的图都已缓存）")
+        print(f"{'方式':<24} {'请求/秒':>9} {'状态码':>12}")
+        for label, keep_alive, conditional in (("每个请求新建连接", False, False),
+                                               ("keep-alive", True, False),
+                                               ("keep-alive + If-None-Match", True, True)):
+            rate, statuses = run(keep_alive, conditional)
+            counts = ", ".join(f"{status}x{statuses.count(status)}" for status in sorted(set(statuses)))
+            print(f"{label:<24} {rate:>9.0f} {counts:>12}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# ==============================
+# 装饰球采样
+# ==============================
+def _min_distance(points):
+    d = np.sqrt(((points[:, :, None] - points[:, None, :]) ** 2).sum(axis=0))
+    np.fill_diagonal(d, np.inf)
+    return d.min()
+
+
+def bench_decorations(n_tree, n, repeat):
+    """从 n_tree 个树粒子里挑 n 个装饰球：耗时、临时内存和挑出来的装饰球之间的最小距离"""
+    tree = generate_tree(n_tree, rng=np.random.default_rng(0))
+    methods = [
+        ("np.random.choice", lambda: np.random.choice(n_tree, n, replace=False)),
+        ("Generator.choice", lambda: np.random.default_rng(0).choice(n_tree, n, replace=False)),
+        ("sample_spaced(0)", lambda: sample_spaced(tree, n, 0.0, np.random.default_rng(0))),
+        (f"sample_spaced({DECORATION_SPACING})",
+         lambda: sample_spaced(tree, n, DECORATION_SPACING, np.random.default_rng(0))),
+    ]
+    print(f"装饰球采样（{n_tree:,} 个树粒子挑 {n} 个）")
+    print(f"{'方法':<22} {'耗时(ms)':>10} {'临时内存(MB)':>13} {'最小间距':>9}")
+    for name, fn in methods:
+        t = measure(fn, repeat)
+        tracemalloc.start()
+        indices = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        spacing = _min_distance(tree[:, indices].astype(np.float64))
+        print(f"{name:<22} {t * 1e3:>10.2f} {peak / 2**20:>13.2f} {spacing:>9.3f}")
+
+
+# ==============================
+# 冷启动
+# ==============================
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 在新的解释器里运行应用脚本：首屏一次，再换个种子生成一张（图集和缓存都用不上，必须真正渲染）
+_FIRST_VISIT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=300)
+start = time.perf_counter()
+at.run()
+first_paint = time.perf_counter() - start
+matplotlib_loaded = "matplotlib" in sys.modules
+at.sidebar.number_input[0].set_value(7)
+start = time.perf_counter()
+next(b for b in at.button if "生成圣诞树" in b.label).click().run()
+first_render = time.perf_counter() - start
+print(json.dumps(dict(first_paint=first_paint, matplotlib=matplotlib_loaded, first_render=first_render,
+                      errors=[e.value for e in at.error] + [str(e.value) for e in at.exception])))
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _server_ttfb(env, timeout=120):
+    """启动 streamlit run，返回从启动进程到 GET / 收到第一个字节的秒数"""
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "streamlit", "run", "streamlit_app.py",
+                               "--server.headless=true", f"--server.port={port}"],
+                              cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as response:
+                    response.read(1)
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError("streamlit 没有启动")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _import_seconds(module, env):
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    return float(subprocess.check_output([sys.executable, "-c", code], cwd=APP_DIR, env=env))
+
+
+def bench_startup():
+    """
+    冷启动的三段等待：服务器首字节、首屏脚本（第一个访问者看到页面）、第一次真正渲染。
+    "未准备" 用空的 matplotlib 配置目录和空的图集目录，相当于新开的容器没运行过
+    deploy.py --prepare；"已准备" 先运行 deploy.py --prepare
+    """
+    print("冷启动")
+    print(f"{'':>6} {'首字节(s)':>10} {'首屏脚本(s)':>12} {'首屏导入 matplotlib':>20} "
+          f"{'第一次渲染(s)':>14} {'import render(s)':>17}")
+    for label in ("未准备", "已准备"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PYTHONPATH=APP_DIR)
+            if label == "未准备":
+                env.update(MPLCONFIGDIR=os.path.join(tmp, "mpl"), CHRISTMAS_TREE_ATLAS=os.path.join(tmp, "atlas"))
+            else:
+                subprocess.check_call([sys.executable, "deploy.py", "--prepare"], cwd=APP_DIR, env=env,
+                                      stdout=subprocess.DEVNULL)
+            # 字体缓存只在第一次导入时建，先测导入，其余测量用的是同一个配置目录
+            import_time = _import_seconds("render", env)
+            if label == "未准备":
+                # 导入 render 已经建好了字体缓存，后面的测量换一个新的空目录
+                env["MPLCONFIGDIR"] = os.path.join(tmp, "mpl-cold")
+            ttfb = _server_ttfb(env)
+            output = subprocess.check_output([sys.executable, "-c", _FIRST_VISIT.format(
+                app=os.path.join(APP_DIR, "streamlit_app.py"))], cwd=APP_DIR, env=env, stderr=subprocess.DEVNULL)
+            visit = json.loads(output.decode().strip().splitlines()[-1])
+        if visit["errors"]:
+            print(f"{label}: 应用报错 {visit['errors']}")
+        print(f"{label:>6} {ttfb:>10.2f} {visit['first_paint']:>12.2f} {'是' if visit['matplotlib'] else '否':>20} "
+              f"{visit['first_render']:>14.2f} {import_time:>17.2f}")
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--max-n", type=int, default=1_000_000, help="最大粒子数量")
+    common.add_argument("--repeat", type=int, default=5, help="每个规模重复次数")
+    parser = argparse.ArgumentParser(description="粒子生成和渲染基准测试", parents=[common])
+    sub = parser.add_subparsers(dest="command")
+    stages_parser = sub.add_parser("stages", help="分阶段计时（中位数、p95、峰值内存）", parents=[common])
+    stages_parser.add_argument("--json", help="把结果写入 JSON 文件")
+    stages_parser.add_argument("--baseline", help="对比的基线 JSON 文件")
+    stages_parser.add_argument("--threshold", type=float, default=1.25, help="中位数超过基线多少倍算退化")
+    stages_parser.add_argument("--only", nargs="+", choices=[name for name, _, _ in STAGES], help="只测这些阶段")
+    service_parser = sub.add_parser("service", help="渲染进程池的吞吐量")
+    service_parser.add_argument("--requests", type=int, default=32, help="每种进程数提交的请求数")
+    service_parser.add_argument("--backend", choices=["matplotlib", "NumPy 光栅化"], default="matplotlib")
+    service_parser.add_argument("--max-workers", type=int, help="最多测到几个进程（默认 CPU 核数）")
+    decorations_parser = sub.add_parser("decorations", help="装饰球采样", parents=[common])
+    decorations_parser.add_argument("--n-tree", type=int, default=1_000_000, help="树粒子数")
+    decorations_parser.add_argument("--n", type=int, default=400, help="装饰球数")
+    build_parser = sub.add_parser("build", help="并行生成场景", parents=[common])
+    build_parser.add_argument("--max-workers", type=int, help="最多测到几个线程（默认 CPU 核数）")
+    sub.add_parser("occlusion", help="遮挡剔除", parents=[common])
+    forest_parser = sub.add_parser("forest", help="森林：实例化 vs 展开", parents=[common])
+    forest_parser.add_argument("--trees", type=int, nargs="+", default=[12, 24, 48], help="棵数")
+    sub.add_parser("startup", help="冷启动：首字节、首屏脚本、第一次渲染")
+    http_parser = sub.add_parser("http", help="HTTP 接口的吞吐量")
+    http_parser.add_argument("--requests", type=int, default=2000, help="每种方式的请求数")
+    http_parser.add_argument("--clients", type=int, default=8, help="客户端线程数")
+    args = parser.parse_args()
+
+    if args.command == "stages":
+        regressions = bench_stages(args.max_n, args.repeat, args.json, args.baseline, args.threshold, args.only)
+        sys.exit(1 if regressions else 0)
+    if args.command == "service":
+        bench_service(args.requests, args.backend, args.max_workers)
+        return
+    if args.command == "startup":
+        bench_startup()
+        return
+    if args.command == "build":
+        bench_build(args.max_n, args.repeat, args.max_workers)
+        return
+    if args.command == "occlusion":
+        bench_occlusion(args.max_n, args.repeat)
+        return
+    if args.command == "forest":
+        bench_forest(args.trees, args.repeat)
+        return
+    if args.command == "http":
+        bench_http(args.requests, args.clients)
+        return
+    if args.command == "decorations":
+        bench_decorations(args.n_tree, args.n, args.repeat)
+        return
+
+    bench_heart(args.max_n, args.repeat)
+    bench_tree_colors(args.max_n, args.repeat)
+    bench_snow(args.max_n, args.repeat)
+    bench_scene_memory()
+    bench_backends(args.max_n, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+按字节预算淘汰的 LRU 缓存
+Streamlit 的多个会话共用同一个实例，所以所有操作都加锁
+"""
+
+import threading
+from collections import OrderedDict
+
+
+def sizeof(value):
+    """缓存条目占用的字节数：bytes 取长度，数组/ParticleScene 取 nbytes"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    return getattr(value, "nbytes", 0)
+
+
+class LRUCache:
+    def __init__(self, max_bytes=128 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def get(self, key, default=None):
+        """命中时把条目移到最近使用的一端"""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """放入条目并按预算淘汰最久未用的条目；单个条目超过预算时不缓存"""
+        size = sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self.nbytes -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._items[key] = (value, size)
+            self.nbytes += size
+            self._evict()
+
+    def resize(self, max_bytes):
+        """修改字节预算，立即淘汰超出的部分"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes:
+            _, (_, size) = self._items.popitem(last=False)
+            self.nbytes -= size
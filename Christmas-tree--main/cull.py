@@ -0,0 +1,198 @@
+"""
+视锥剔除：渲染前丢掉投影后完全落在画面外、或者在相机后面的粒子
+
+mplot3d 不会按 set_xlim/ylim/zlim 裁掉坐标范围外的点，点投影到画面里就会画出来，
+所以剔除的依据是投影后的位置而不是坐标范围。雪花铺在 [-11, 11]、星空在树后面
+很远的地方，默认视角下约四分之一的雪花和星星落在画面外，画了也会被裁掉。
+
+深度着色按图层里所有点投影后的坐标范围归一化（NumPy 光栅化只看深度范围，
+matplotlib 看投影后 x、y、深度三个范围），所以每个图层在这三个方向上最靠两端的
+点即使在画面外也保留，剔除前后画出来的像素完全一样。
+
+遮挡剔除：把画面分成 OCCLUSION_CELL 像素的格子，按从近到远累积每格被挡住的比例
+（粒子面积 × 不透明度 / 格子面积，当作随机落在格子里），累积到 coverage 的深度
+就是这一格的 "饱和深度"。一个粒子覆盖到的所有格子都已饱和、而且它在饱和深度
+后面时，它最多透出 1 - coverage，直接丢掉。matplotlib 每个图层是一个散点集合，
+集合内部按深度排序，集合之间按各自最近的点排序，所以只有同一图层、或者比它后画
+的图层里的粒子才算挡在它前面（NumPy 光栅化全局按深度合成，这个规则对它同样成立）。
+粒子要多到能填满格子（几十万）才剔得掉东西，应用里的静态图不用它，
+见 benchmark.py occlusion。
+"""
+
+import numpy as np
+
+from raster import Camera, DEFAULT_EDGE_WIDTH, EDGE_WIDTH, _depthshade
+from scene import DEFAULT_VIEW, LAYERS, ParticleScene
+
+# 和 render.render_png / santa1.py 一样的 12x14 英寸画面
+FIGURE_SIZE = (12, 14)
+
+# 判断 "画面外" 时四周多留的像素（dpi=100 时），抵消两种后端投影的细微差别
+MARGIN = 8
+
+# 遮挡剔除的格子大小（dpi=100 时的像素）和默认饱和阈值
+OCCLUSION_CELL = 4
+OCCLUSION_COVERAGE = 0.97
+
+
+def view_camera(view=DEFAULT_VIEW, dpi=100):
+    """整幅画面的相机：view 是 (elev, azim)"""
+    elev, azim = view
+    return Camera(FIGURE_SIZE[0] * dpi, FIGURE_SIZE[1] * dpi, elev, azim, dpi=dpi)
+
+
+def _mask(projected, camera, radius, margin):
+    px, py, depth = projected
+    margin = margin * camera.dpi / 100 + radius
+    return ((depth > 0) & (px + margin >= 0) & (px - margin < camera.width)
+            & (py + margin >= 0) & (py - margin < camera.height))
+
+
+def frustum_mask(positions, camera, radius=0.0, margin=MARGIN):
+    """(3, N) 坐标中投影后（含半径 radius 像素）和画面有交集、且在相机前面的点"""
+    return _mask(camera.project(positions), camera, radius, margin)
+
+
+def visible_region(view=DEFAULT_VIEW):
+    """生成函数用的可见判断：positions -> 布尔数组（不知道点的大小，只留默认边距）"""
+    camera = view_camera(view)
+    return lambda positions: frustum_mask(positions, camera)
+
+
+def _keep_extremes(mask, projected):
+    # 保住投影后的坐标范围，深度着色不变
+    for values in projected:
+        if len(values):
+            mask[[np.argmin(values), np.argmax(values)]] = True
+    return mask
+
+
+def _select(scene, keep):
+    """返回 (只保留 keep 里为 True 的粒子的场景, {图层名: 去掉的粒子数})；一个都没去掉时直接返回原场景"""
+    removed = {name: int(len(mask) - np.count_nonzero(mask)) for name, mask in keep.items()}
+    if not any(removed.values()):
+        return scene, removed
+
+    out = ParticleScene({name: int(np.count_nonzero(mask)) for name, mask in keep.items()})
+    for name in LAYERS:
+        positions, colors, sizes = scene.layer(name)
+        out_positions, out_colors, out_sizes = out.layer(name)
+        mask = keep[name]
+        out_positions[:] = positions[:, mask]
+        out_colors[:] = colors[mask]
+        out_sizes[:] = sizes[mask]
+    out.palette_index[:] = scene.palette_index[keep["decorations"]]
+    return out, removed
+
+
+def cull_scene(scene, camera):
+    """
+    返回 (剔除后的场景, {图层名: 剔除的粒子数})；一个都没剔除时直接返回原场景
+
+    每个图层保留的粒子按原来的顺序排列，装饰球的调色板编号跟着一起筛选。
+    """
+    keep = {}
+    for name in LAYERS:
+        positions, _, sizes = scene.layer(name)
+        radius = camera.point_radius(sizes, EDGE_WIDTH.get(name, DEFAULT_EDGE_WIDTH))
+        projected = camera.project(positions)
+        keep[name] = _keep_extremes(_mask(projected, camera, radius, MARGIN), projected)
+    return _select(scene, keep)
+
+
+def _dilate(grid, k):
+    """每格取周围 (2k+1)×(2k+1) 格里的最大值；画面外当作没有饱和"""
+    if k == 0:
+        return grid
+    rows, cols = grid.shape
+    padded = np.full((rows + 2 * k, cols + 2 * k), np.iinfo(grid.dtype).max, dtype=grid.dtype)
+    padded[k:-k, k:-k] = grid
+    wide = padded[:, :cols].copy()
+    for i in range(1, 2 * k + 1):
+        np.maximum(wide, padded[:, i:i + cols], out=wide)
+    out = wide[:rows].copy()
+    for i in range(1, 2 * k + 1):
+        np.maximum(out, wide[i:i + rows], out=out)
+    return out
+
+
+def _saturation_depth(key, log_transmit, n_cells, span, coverage):
+    """
+    每格从近到远累积透射率降到 1 - coverage 时的深度名次，没有饱和的格子是最大整数；
+    key = 格子编号 × span + 深度名次
+    """
+    order = np.argsort(key)
+    key, log_transmit = key[order], log_transmit[order]
+    cell = key // span
+    # 同一格内的前缀和；跨格累加的数值很大，用 float64
+    total = np.cumsum(log_transmit, dtype=np.float64)
+    first = np.r_[True, cell[1:] != cell[:-1]]
+    starts = np.nonzero(first)[0]
+    total -= (total[starts] - log_transmit[starts])[np.cumsum(first) - 1]
+
+    grid = np.full(n_cells, np.iinfo(np.int64).max, dtype=np.int64)
+    saturated = total <= np.log1p(-coverage)
+    cell, key = cell[saturated], key[saturated]
+    # 每格第一个达到饱和的就是最近的那个
+    first = np.r_[True, cell[1:] != cell[:-1]]
+    grid[cell[first]] = key[first] % span
+    return grid
+
+
+def occlude_scene(scene, camera, coverage=OCCLUSION_COVERAGE, cell=OCCLUSION_CELL):
+    """
+    返回 (去掉被挡住粒子的场景, {图层名: 去掉的粒子数})；一个都没去掉时直接返回原场景
+
+    coverage 越接近 1 越保守：1 - coverage 是被去掉的粒子最多还能透出来的比例。
+    """
+    cell = cell * camera.dpi / 100
+    cols, rows = int(np.ceil(camera.width / cell)), int(np.ceil(camera.height / cell))
+
+    layers = {}
+    for name in LAYERS:
+        positions, colors, sizes = scene.layer(name)
+        if not len(sizes):
+            continue
+        px, py, depth = camera.project(positions)
+        radius = camera.point_radius(sizes, EDGE_WIDTH.get(name, DEFAULT_EDGE_WIDTH))
+        # 深度着色后的不透明度 × 光斑占格子面积的比例
+        alpha = colors[:, 3] * _depthshade(depth)
+        log_transmit = np.log1p(-np.minimum(alpha * np.pi * radius**2 / cell**2, 0.999))
+        inside = (depth > 0) & (px >= 0) & (px < cols * cell) & (py >= 0) & (py < rows * cell)
+        index = np.where(inside, (py // cell).clip(0, rows - 1) * cols + (px // cell).clip(0, cols - 1), -1)
+        layers[name] = [px, py, depth, radius, index.astype(np.int64), log_transmit]
+
+    # 所有图层一起按深度排名次，之后只按整数排序
+    if not layers:
+        return _select(scene, {name: np.ones(0, dtype=bool) for name in LAYERS})
+    depths = [layers[name][2] for name in layers]
+    span = sum(map(len, depths))
+    rank = np.empty(span, dtype=np.int64)
+    rank[np.argsort(np.concatenate(depths), kind="stable")] = np.arange(span)
+    start = 0
+    for name, depth in zip(layers, depths):
+        layers[name][2] = rank[start:start + len(depth)]
+        start += len(depth)
+
+    # matplotlib 按图层最近的点从远到近画；倒过来处理，挡住一个图层的是它自己和之后画的图层。
+    # 只用一部分遮挡粒子算出的饱和格子更少，结果更保守，所以遮挡粒子增加不到一半时沿用上次的格子
+    keep = {name: np.ones(scene.count(name), dtype=bool) for name in LAYERS}
+    occluders, pooled, grid_size, grid = [], 0, 0, None
+    for name in sorted(layers, key=lambda name: layers[name][2].min()):
+        px, py, rank, radius, index, log_transmit = layers[name]
+        inside = index >= 0
+        occluders.append((index[inside] * span + rank[inside], log_transmit[inside]))
+        pooled += np.count_nonzero(inside)
+        if grid is None or pooled >= 1.5 * grid_size:
+            grid = _saturation_depth(*(np.concatenate(columns) for columns in zip(*occluders)),
+                                     rows * cols, span, coverage).reshape(rows, cols)
+            grid_size = pooled
+        # 光斑碰到的每一格都要饱和：按光斑跨过的格数取邻近格子里最远的饱和深度
+        reach = np.ceil(radius / cell).astype(np.int64)
+        hidden = np.zeros(len(rank), dtype=bool)
+        for k in np.unique(reach[inside]):
+            at = inside & (reach == k)
+            hidden[at] = rank[at] > _dilate(grid, int(k)).reshape(-1)[index[at]]
+        # 深度名次和深度的最大、最小在同一个粒子上
+        keep[name] = _keep_extremes(~hidden, (px, py, rank))
+    return _select(scene, keep)
@@ -2,11 +2,19 @@
 """
 圣诞树动画部署助手
 这个脚本帮助你快速部署3D圣诞树动画
+
+python deploy.py --prepare 只做部署准备（编译字节码、建 matplotlib 字体缓存、
+预渲染图集），不需要交互。放在构建阶段运行（Heroku 的 bin/post_compile、Render 的
+构建命令），不要放进启动命令：云平台要求进程启动后很快绑定端口。start.sh 在本地
+启动服务器之前运行它，已经做过的部分立即跳过
 """
 
+import argparse
+import compileall
 import os
 import sys
 import subprocess
+import time
 import webbrowser
 
 def check_requirements():
@@ -39,6 +47,26 @@ def install_dependencies():
         print("❌ 依赖包安装失败")
         return False
 
+def prebuild_font_cache():
+    """matplotlib 第一次导入 font_manager 时要扫描系统字体建缓存，可能要好几秒，部署时先做掉"""
+    start = time.perf_counter()
+    import matplotlib
+    import matplotlib.font_manager  # noqa: F401
+    print(f"✅ matplotlib 字体缓存已就绪: {matplotlib.get_cachedir()}（{time.perf_counter() - start:.1f} 秒）")
+
+def prepare():
+    """启动服务器前的准备工作，让第一个访问者不用等导入、字体缓存和渲染"""
+    print("🔧 正在准备部署...")
+    here = os.path.dirname(os.path.abspath(__file__))
+    # 新检出的代码还没有 .pyc，先编译好
+    compileall.compile_dir(here, maxlevels=0, quiet=1)
+    prebuild_font_cache()
+    # 图集在子进程里生成，和应用用同一套代码；已经是最新的话立即跳过
+    try:
+        subprocess.check_call([sys.executable, os.path.join(here, 'atlas.py')], cwd=here)
+    except subprocess.CalledProcessError:
+        print("⚠️ 图集生成失败，应用启动后会在后台重试")
+
 def run_local():
     """运行本地版本"""
     print("🚀 启动本地服务器...")
@@ -81,11 +109,13 @@ def show_deployment_guide():
    - 连接GitHub账户
    - 创建新的Web Service
    - 选择你的仓库
+   - 构建命令: pip install -r requirements.txt && python deploy.py --prepare
    - 启动命令: streamlit run streamlit_app.py --server.port=$PORT --server.address=0.0.0.0
+   - 环境变量: MPLCONFIGDIR 设为项目目录下的 .matplotlib（构建时建好的字体缓存运行时才找得到）
 
    方案C: Heroku（需要信用卡验证）
    - 安装Heroku CLI
-   - 创建Procfile: echo "web: streamlit run streamlit_app.py --server.port=\\$PORT --server.address=0.0.0.0" > Procfile
+   - 仓库里已有 Procfile；bin/post_compile 在构建阶段运行 python deploy.py --prepare
    - 部署: heroku create your-app-name && git push heroku main
 
 4. 🔗 分享你的链接
@@ -98,6 +128,13 @@ def show_deployment_guide():
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="圣诞树动画部署助手")
+    parser.add_argument("--prepare", action="store_true", help="只做部署准备（字体缓存、图集），不进入菜单")
+    args = parser.parse_args()
+    if args.prepare:
+        prepare()
+        return
+    
     print("🎄 3D圣诞树动画部署助手")
     print("=" * 50)
     
@@ -108,11 +145,13 @@ def main():
     print("1. 🚀 运行本地版本（用于测试）")
     print("2. 📚 查看部署指南")
     print("3. 📦 安装依赖包（仅安装，不运行）")
+    print("4. 🔧 部署准备（字体缓存、预渲染图集）")
     
-    choice = input("\n请输入选择 (1-3): ").strip()
+    choice = input("\n请输入选择 (1-4): ").strip()
     
     if choice == '1':
         install_dependencies()
+        prepare()
         run_local()
     elif choice == '2':
         show_deployment_guide()
@@ -120,6 +159,8 @@ def main():
         install_dependencies()
         print("\n✅ 依赖包安装完成！现在可以运行本地版本了。")
         print("运行命令: streamlit run streamlit_app.py")
+    elif choice == '4':
+        prepare()
     else:
         print("❌ 无效选择")
 
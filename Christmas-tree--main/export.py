@@ -0,0 +1,153 @@
+"""
+动画导出：逐帧渲染、逐帧编码，不在内存里保留所有帧
+GIF 和 WebP 用 Pillow 编码每一帧，动画容器自己写；MP4 通过管道交给本机的 ffmpeg
+"""
+
+import io
+import shutil
+import struct
+import subprocess
+from itertools import chain
+
+from PIL import Image, GifImagePlugin, features
+
+from animation import TreeAnimation
+
+MIME_TYPES = {
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "mp4": "video/mp4",
+}
+
+
+def available_formats():
+    """本机能导出的格式：WebP 动画需要 Pillow 带 libwebp，MP4 需要 ffmpeg"""
+    formats = ["gif"]
+    if features.check("webp"):
+        formats.append("webp")
+    if shutil.which("ffmpeg"):
+        formats.append("mp4")
+    return formats
+
+
+def iter_frames(scene, theme_colors, frames, seed=0, figsize=(6, 7), dpi=80):
+    """逐帧渲染 santa1.py 风格的动画，每渲染完一帧就产出一个 RGB Image"""
+    # 导出时才导入 matplotlib，页面只用到 available_formats 时不用等
+    from render import new_figure, setup_axes, draw_scene, render_rgba
+
+    # 动画会原地移动雪花，不能改动调用方（可能是缓存里）的场景
+    scene = scene.copy()
+
+    fig = new_figure(figsize=figsize, dpi=dpi)
+    ax = fig.add_subplot(111, projection='3d')
+    setup_axes(fig, ax, theme_colors)
+    artists = draw_scene(ax, scene, theme_colors)
+    fig.tight_layout()
+    animation = TreeAnimation(ax, scene, artists, seed)
+
+    for frame in range(frames):
+        animation.update(frame)
+        yield Image.fromarray(render_rgba(fig)).convert("RGB")
+
+# ==============================
+# 编码器：frames 是 Image 迭代器，结果写入二进制文件对象 fp
+# ==============================
+def write_gif(frames, fp, fps=25):
+    """所有帧共用第一帧的自适应调色板，帧头和图像数据逐帧写出"""
+    frames = iter(frames)
+    first = next(frames)
+    palette = first.quantize(256)
+    duration = round(1000 / fps)
+
+    def indexed(im):
+        return im.quantize(palette=palette, dither=Image.Dither.NONE)
+
+    header, _ = GifImagePlugin.getheader(indexed(first), info={"loop": 0, "optimize": False})
+    fp.writelines(header)
+    for im in chain([first], frames):
+        fp.writelines(GifImagePlugin.getdata(indexed(im), duration=duration, disposal=1))
+    fp.write(b";")
+
+
+def _webp_chunks(data):
+    """单帧 WebP 文件里的图像数据块（ALPH / VP8 / VP8L，带块头和补齐字节）"""
+    chunks = []
+    offset = 12  # "RIFF" 大小 "WEBP"
+    while offset < len(data):
+        kind = data[offset:offset + 4]
+        size = struct.unpack("<I", data[offset + 4:offset + 8])[0]
+        end = offset + 8 + size + (size & 1)
+        if kind in (b"ALPH", b"VP8 ", b"VP8L"):
+            chunks.append(data[offset:end])
+        offset = end
+    return b"".join(chunks)
+
+
+def _chunk(kind, data):
+    return kind + struct.pack("<I", len(data)) + data + b"\0" * (len(data) & 1)
+
+
+def _uint24(value):
+    return struct.pack("<I", value)[:3]
+
+
+def write_webp(frames, fp, fps=25, quality=80):
+    """
+    WebP 动画：每帧用 Pillow 编码成单帧 WebP（公开的 save 接口），取出图像数据块包进
+    ANMF 帧块，逐帧写出，只保留当前这一帧。文件头里的 RIFF 大小最后回填，fp 必须可以 seek
+    """
+    frames = iter(frames)
+    first = next(frames)
+    width, height = first.size
+    duration = round(1000 / fps)
+
+    start = fp.tell()
+    fp.write(b"RIFF\0\0\0\0WEBP")
+    # VP8X：只有动画标志；画布宽高减一。ANIM：黑色背景，无限循环
+    fp.write(_chunk(b"VP8X", bytes([0x02, 0, 0, 0]) + _uint24(width - 1) + _uint24(height - 1)))
+    fp.write(_chunk(b"ANIM", struct.pack("<IH", 0xFF000000, 0)))
+    for im in chain([first], frames):
+        encoded = io.BytesIO()
+        im.save(encoded, format="WEBP", quality=quality)
+        # 帧位置 (0, 0)、宽高减一、时长；标志位 0b10：不和上一帧混合（帧都是不透明的），不清除
+        header = _uint24(0) + _uint24(0) + _uint24(width - 1) + _uint24(height - 1) + _uint24(duration)
+        fp.write(_chunk(b"ANMF", header + bytes([0x02]) + _webp_chunks(encoded.getvalue())))
+
+    end = fp.tell()
+    fp.seek(start + 4)
+    fp.write(struct.pack("<I", end - start - 8))
+    fp.seek(end)
+
+
+def write_mp4(frames, fp, fps=25):
+    """原始 RGB 帧通过管道交给 ffmpeg 编码成 H.264；fp 需要是真实文件"""
+    frames = iter(frames)
+    first = next(frames)
+    width, height = first.size
+    ffmpeg = subprocess.Popen([
+        shutil.which("ffmpeg"), "-loglevel", "error", "-y",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+        "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", "libx264", "-pix_fmt", "yuv420p",
+        "-movflags", "frag_keyframe+empty_moov", "-f", "mp4", "-",
+    ], stdin=subprocess.PIPE, stdout=fp)
+    try:
+        for im in chain([first], frames):
+            ffmpeg.stdin.write(im.tobytes())
+    finally:
+        ffmpeg.stdin.close()
+        ffmpeg.wait()
+    if ffmpeg.returncode != 0:
+        raise RuntimeError(f"ffmpeg 编码失败（返回码 {ffmpeg.returncode}）")
+
+
+def export_animation(scene, theme_colors, fmt, fp, frames=100, fps=25, seed=0, figsize=(6, 7), dpi=80):
+    """渲染 frames 帧动画并以 fmt（gif / webp / mp4）格式写入 fp"""
+    images = iter_frames(scene, theme_colors, frames, seed=seed, figsize=figsize, dpi=dpi)
+    if fmt == "gif":
+        write_gif(images, fp, fps)
+    elif fmt == "webp":
+        write_webp(images, fp, fps)
+    elif fmt == "mp4":
+        write_mp4(images, fp, fps)
+    else:
+        raise ValueError(f"不支持的格式: {fmt}")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+森林模式：一份基准树（树、装饰球、五角星）+ 每棵树的变换，渲染时才把变换套上去
+
+    forest = build_forest(36, seed=2024)
+    png = render_service.render_image("NumPy 光栅化", forest.scene, theme_colors, 100, DEFAULT_VIEW,
+                                      forest.instances, forest.limits)
+
+实例变换是一个 (K, 6) float32 数组（见 instancing.py），两种后端都直接接受它，
+场景里只存一棵树，几十棵树的森林内存和一棵树差不多。
+
+地面、雪花和星空不实例化：按森林的范围放大一份。相机的坐标范围跟着放大同样的倍数，
+每棵树在画面里按比例缩小，盒子比例和视角都不变。
+
+用法: python forest.py banner.png --trees 36 [--backend matplotlib] [--theme 冬季蓝]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import raster
+from instancing import INSTANCE_FIELDS, INSTANCED_LAYERS, transform_colors, transform_positions, transform_sizes
+from scene import DEFAULT_VIEW, ParticleScene, get_theme_colors
+from scenegraph import SceneGraph
+
+# 单棵树场景的坐标范围（和 render.LIMITS、raster.Camera 的默认值一致）
+BASE_LIMITS = ((-5, 5), (-5, 5), (-2, 8))
+
+# 相邻两棵树的间距：基准树底部直径约 8
+SPACING = 7.0
+
+
+def scaled_limits(zoom):
+    """单棵树的坐标范围绕原点放大 zoom 倍"""
+    return tuple((lo * zoom, hi * zoom) for lo, hi in BASE_LIMITS)
+
+
+# ==============================
+# 森林
+# ==============================
+def forest_layout(n_trees, rng=None, spacing=SPACING):
+    """
+    横幅用的排布：接近 3:2 的网格，每棵树随机偏移、缩放、旋转和轻微变色。
+    返回 (K, 6) float32 实例数组
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    rows = max(1, int(round(np.sqrt(n_trees / 1.5))))
+    cols = -(-n_trees // rows)
+    index = np.arange(n_trees)
+    instances = np.empty((n_trees, len(INSTANCE_FIELDS)), dtype=np.float32)
+    instances[:, 0] = (index % cols - (cols - 1) / 2) * spacing + rng.uniform(-1, 1, n_trees)
+    instances[:, 1] = (index // cols - (rows - 1) / 2) * spacing + rng.uniform(-1, 1, n_trees)
+    instances[:, 2] = 0
+    instances[:, 3] = rng.uniform(0.7, 1.15, n_trees)
+    instances[:, 4] = rng.uniform(0, 2 * np.pi, n_trees)
+    instances[:, 5] = rng.normal(0, 0.04, n_trees)
+    return instances
+
+
+def forest_zoom(instances, spacing=SPACING):
+    """能装下所有树（再留半个间距）的放大倍数"""
+    extent = np.abs(instances[:, :2]).max() + spacing / 2 if len(instances) else 0
+    return max(1.0, float(extent) / BASE_LIMITS[0][1])
+
+
+class Forest:
+    """
+    scene 是一个 ParticleScene：树、装饰球、五角星是基准树，地面、雪花、星空已经按 zoom
+    放大；instances 是 (K, 6) 实例数组。limits 是放大后的坐标范围，两种后端都用它
+    """
+
+    def __init__(self, scene, instances, zoom):
+        self.scene = scene
+        self.instances = np.asarray(instances, dtype=np.float32)
+        self.zoom = zoom
+
+    @property
+    def limits(self):
+        return scaled_limits(self.zoom)
+
+    @property
+    def nbytes(self):
+        return self.scene.nbytes + self.instances.nbytes
+
+    def __len__(self):
+        """画出来的粒子总数"""
+        shared = sum(self.scene.count(name) for name in self.scene.slices if name not in INSTANCED_LAYERS)
+        return shared + len(self.instances) * sum(self.scene.count(name) for name in INSTANCED_LAYERS)
+
+    def camera(self, width=1200, height=1400, view=DEFAULT_VIEW, dpi=100):
+        elev, azim = view
+        xlim, ylim, zlim = self.limits
+        return raster.Camera(width, height, elev, azim, dpi=dpi, xlim=xlim, ylim=ylim, zlim=zlim)
+
+    def materialize(self):
+        """把所有实例展开成一个普通的 ParticleScene（内存是 K 棵树，只用于对照和导出）"""
+        counts = {name: self.scene.count(name) * (len(self.instances) if name in INSTANCED_LAYERS else 1)
+                  for name in self.scene.slices}
+        scene = ParticleScene(counts)
+        for name in self.scene.slices:
+            positions, colors, sizes = self.scene.layer(name)
+            out_positions, out_colors, out_sizes = scene.layer(name)
+            if name in INSTANCED_LAYERS:
+                positions = transform_positions(positions, self.instances)
+                colors = transform_colors(colors, self.instances)
+                sizes = transform_sizes(sizes, self.instances)
+            out_positions[:], out_colors[:], out_sizes[:] = positions, colors, sizes
+        scene.palette_index[:] = np.tile(self.scene.palette_index, len(self.instances))
+        return scene
+
+
+def build_forest(n_trees=24, seed=None, theme_colors=None, n_tree=3000, n_snow=800, n_decorations=200,
+                 n_topper=500, n_ground=3500, n_stars=80, instances=None):
+    """
+    生成森林：基准树用 SceneGraph（同样的种子和单棵树场景一样），地面、雪花、星空
+    的数量按放大后的面积增加，密度和单棵树场景一样。instances 不给出时用 forest_layout
+    """
+    rng = np.random.default_rng(seed)
+    if instances is None:
+        instances = forest_layout(n_trees, rng)
+    zoom = forest_zoom(instances)
+    area = zoom * zoom
+    base = SceneGraph(seed).update(n_tree=n_tree, n_snow=int(n_snow * area), theme_colors=theme_colors,
+                                   n_decorations=n_decorations, n_topper=n_topper,
+                                   n_ground=int(n_ground * area), n_stars=int(n_stars * area))
+    scene = base.copy()
+    # 地面只在水平方向铺开，雪花和星空整体放大
+    scene.layer("ground")[0][:2] *= zoom
+    scene.layer("snow")[0][:] *= zoom
+    scene.layer("stars")[0][:] *= zoom
+    return Forest(scene, instances, zoom)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="渲染多棵树的森林横幅")
+    parser.add_argument("output", help="输出 PNG")
+    parser.add_argument("--trees", type=int, default=24, help="树的棵数")
+    parser.add_argument("--n-tree", type=int, default=3000, help="每棵树的粒子数")
+    parser.add_argument("--theme", default="经典绿色")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--backend", choices=["matplotlib", "NumPy 光栅化"], default="NumPy 光栅化")
+    parser.add_argument("--dpi", type=int, default=100)
+    args = parser.parse_args()
+
+    from render_service import render_image
+
+    start = time.perf_counter()
+    theme_colors = get_theme_colors(args.theme)
+    forest = build_forest(args.trees, args.seed, theme_colors, n_tree=args.n_tree)
+    png = render_image(args.backend, forest.scene, theme_colors, args.dpi, DEFAULT_VIEW,
+                       forest.instances, forest.limits)
+    with open(args.output, "wb") as f:
+        f.write(png)
+    print(f"🌲 {len(forest.instances)} 棵树，画出 {len(forest):,} 个粒子，场景只占 {forest.nbytes / 2**20:.1f} MB"
+          f" → {args.output}，用时 {time.perf_counter() - start:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
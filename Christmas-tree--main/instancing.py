@@ -0,0 +1,76 @@
+"""
+实例化：一份基准粒子 + 每个实例的变换，渲染时才把变换套上去
+
+实例数组是 (K, 6) float32，每行 x, y, z, 缩放, 绕 z 轴旋转（弧度）, 色相偏移（圈）。
+NumPy 光栅化把每个实例的 4x4 模型矩阵乘进相机矩阵，直接投影基准坐标，不生成
+变换后的坐标；matplotlib 每个图层还是一个散点集合，绘制时用 transform_* 一次性
+批量算出所有实例的坐标、颜色和大小。
+"""
+
+import numpy as np
+
+# 按实例变换绘制的图层，其余图层整片森林共用一份
+INSTANCED_LAYERS = ("tree", "decorations", "topper")
+
+# 实例数组的列
+INSTANCE_FIELDS = ("x", "y", "z", "scale", "rotation", "hue")
+
+
+# ==============================
+# 实例变换
+# ==============================
+def instance_matrices(instances):
+    """(K, 6) 实例数组 → (K, 4, 4) 模型矩阵：先缩放，再绕 z 轴旋转，最后平移"""
+    x, y, z, scale, rotation, _ = np.asarray(instances, dtype=np.float64).T
+    cos, sin = np.cos(rotation) * scale, np.sin(rotation) * scale
+    matrices = np.zeros((len(x), 4, 4))
+    matrices[:, 0, 0], matrices[:, 0, 1] = cos, -sin
+    matrices[:, 1, 0], matrices[:, 1, 1] = sin, cos
+    matrices[:, 2, 2] = scale
+    matrices[:, :3, 3] = np.stack([x, y, z], axis=1)
+    matrices[:, 3, 3] = 1
+    return matrices.astype(np.float32)
+
+
+def hue_matrices(instances):
+    """(K, 6) 实例数组 → (K, 3, 3) 颜色矩阵：RGB 绕灰度轴旋转，亮度基本不变"""
+    angle = 2 * np.pi * np.asarray(instances, dtype=np.float64)[:, 5]
+    cos, sin = np.cos(angle), np.sin(angle)
+    third = (1 - cos) / 3
+    root = np.sqrt(1 / 3) * sin
+    diagonal, plus, minus = cos + third, third + root, third - root
+    return np.stack([np.stack([diagonal, minus, plus], axis=1),
+                     np.stack([plus, diagonal, minus], axis=1),
+                     np.stack([minus, plus, diagonal], axis=1)], axis=1).astype(np.float32)
+
+
+def size_scales(instances):
+    """散点面积按缩放的平方变化，小一点的树粒子也小一点"""
+    return np.square(np.asarray(instances, dtype=np.float32)[:, 3])
+
+
+def instance_transforms(instances):
+    """逐实例的 (模型矩阵, 颜色矩阵, 面积倍数)，光栅化时每个实例投影一次"""
+    return list(zip(instance_matrices(instances), hue_matrices(instances), size_scales(instances)))
+
+
+def transform_positions(positions, instances):
+    """(3, N) 基准坐标 → (3, K*N) 所有实例的坐标（一次 einsum，按实例依次排列）"""
+    matrices = instance_matrices(instances)
+    out = np.einsum("kij,jn->ikn", matrices[:, :3, :3], positions)
+    out += matrices[:, :3, 3].T[:, :, None]
+    return out.reshape(3, -1)
+
+
+def transform_colors(colors, instances):
+    """(N, 4) 基准颜色 → (K*N, 4)：每个实例的 RGB 乘自己的颜色矩阵，alpha 不变"""
+    hues = hue_matrices(instances)
+    out = np.empty((len(hues), len(colors), 4), dtype=np.float32)
+    np.clip(np.einsum("nj,kij->kni", colors[:, :3], hues), 0, 1, out=out[:, :, :3])
+    out[:, :, 3] = colors[:, 3]
+    return out.reshape(-1, 4)
+
+
+def transform_sizes(sizes, instances):
+    """(N,) 基准面积 → (K*N,)"""
+    return (size_scales(instances)[:, None] * sizes).reshape(-1)
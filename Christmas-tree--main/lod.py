@@ -0,0 +1,124 @@
+"""
+细节层次（LOD）：按输出分辨率和每帧耗时预算决定每个图层画多少粒子
+
+所有生成函数都是独立同分布地采样，所以每个图层取前 k 个粒子就是均匀的子样本，
+不需要重新生成。树和地面这种铺满的图层按保留比例放大点的面积，整体覆盖率不变。
+"""
+
+import time
+
+import numpy as np
+
+from scene import LAYERS, ParticleScene
+
+# santa1.py 的画面：12x14 英寸，dpi=100
+REFERENCE_SIZE = (1200, 1400)
+
+# 装饰球和五角星数量少又显眼，始终完整保留
+FIXED_LAYERS = ("decorations", "topper")
+
+# 铺满的图层：粒子变少时放大点的面积
+FILL_LAYERS = ("tree", "ground")
+
+
+def resolution_scale(width, height):
+    """输出分辨率相对参考画面的线性比例（不超过 1）"""
+    ref_w, ref_h = REFERENCE_SIZE
+    return min(1.0, float(np.sqrt(width * height / (ref_w * ref_h))))
+
+
+def subsample(scene, counts):
+    """每个图层取前 counts[name] 个粒子组成新场景（未列出的图层完整保留）；没有缩减时直接返回原场景"""
+    counts = {name: min(counts.get(name, scene.count(name)), scene.count(name)) for name in LAYERS}
+    if all(counts[name] == scene.count(name) for name in LAYERS):
+        return scene
+    sub = ParticleScene(counts)
+    for name in LAYERS:
+        k = counts[name]
+        positions, colors, sizes = scene.layer(name)
+        sub_positions, sub_colors, sub_sizes = sub.layer(name)
+        sub_positions[:] = positions[:, :k]
+        sub_colors[:] = colors[:k]
+        sub_sizes[:] = sizes[:k]
+        if name in FILL_LAYERS and k:
+            sub_sizes *= len(sizes) / k
+    sub.palette_index[:] = scene.palette_index[:counts["decorations"]]
+    return sub
+
+
+class LODPlanner:
+    """
+    按每帧耗时预算挑选各图层的粒子数
+
+    耗时模型：固定开销 + Σ 每粒子耗时 × 粒子数。calibrate() 用 render(scene)
+    实测空场景和各图层单独渲染 sample 个粒子的耗时；之后每次真实渲染用
+    observe() 把实测耗时反馈回来，按比例修正模型，适应机器负载的变化。
+    """
+
+    def __init__(self, render, sample=2000, smoothing=0.3, min_fraction=0.05):
+        self.render = render
+        self.sample = sample
+        self.smoothing = smoothing
+        self.min_fraction = min_fraction
+        self.overhead_ms = None
+        self.cost_ms = {}
+
+    def _time(self, scene, repeat=2):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            self.render(scene)
+            best = min(best, time.perf_counter() - start)
+        return best * 1e3
+
+    def calibrate(self, scene):
+        """实测固定开销和每个图层的每粒子耗时（毫秒）"""
+        empty = {name: 0 for name in LAYERS}
+        self.overhead_ms = self._time(subsample(scene, empty))
+        for name in LAYERS:
+            n = min(scene.count(name), self.sample)
+            if n == 0:
+                self.cost_ms[name] = 0.0
+                continue
+            t = self._time(subsample(scene, dict(empty, **{name: n})))
+            self.cost_ms[name] = max(t - self.overhead_ms, 0.0) / n
+
+    def predict(self, counts):
+        """按当前模型估计渲染 counts 所需的毫秒数"""
+        return self.overhead_ms + sum(self.cost_ms[name] * counts.get(name, 0) for name in LAYERS)
+
+    def plan(self, scene, budget_ms, width=REFERENCE_SIZE[0], height=REFERENCE_SIZE[1]):
+        """
+        返回 {图层名: 粒子数}
+
+        先按分辨率缩减（小图里再多的粒子也挤在一起看不出来），再把可缩减图层
+        按同一比例缩小到预算以内；FIXED_LAYERS 不缩减，比例不低于 min_fraction。
+        budget_ms 为 None 时只按分辨率缩减，不需要实测。
+        """
+        scale = resolution_scale(width, height)
+        caps = {name: scene.count(name) if name in FIXED_LAYERS else round(scene.count(name) * scale)
+                for name in LAYERS}
+        if budget_ms is None:
+            return caps
+        if self.overhead_ms is None:
+            self.calibrate(scene)
+
+        fixed_ms = self.overhead_ms + sum(self.cost_ms[name] * caps[name] for name in FIXED_LAYERS)
+        scalable_ms = sum(self.cost_ms[name] * caps[name] for name in LAYERS if name not in FIXED_LAYERS)
+        fraction = 1.0
+        if scalable_ms > 0:
+            fraction = float(np.clip((budget_ms - fixed_ms) / scalable_ms, self.min_fraction, 1.0))
+
+        return {name: caps[name] if name in FIXED_LAYERS else round(caps[name] * fraction)
+                for name in LAYERS}
+
+    def observe(self, counts, elapsed_ms):
+        """用一次真实渲染的耗时修正模型"""
+        if self.overhead_ms is None:
+            return
+        predicted = self.predict(counts)
+        if predicted <= 0:
+            return
+        factor = 1 + self.smoothing * (elapsed_ms / predicted - 1)
+        self.overhead_ms *= factor
+        self.cost_ms = {name: cost * factor for name, cost in self.cost_ms.items()}
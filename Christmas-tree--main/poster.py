@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+高清海报：把画面切成小块分别渲染，按行带流式写进 PNG / TIFF
+
+每一块用整幅画面的相机平移原点（raster.Camera.tile），投影、深度着色都和一次
+渲染整幅画面一样，拼起来没有接缝。同一行带的各块渲染完就拼成一条写进文件，
+写完即丢，内存只和 块高 × 画面宽 有关，不需要整张画布；可以用多个进程并行
+渲染同一行带的各块。
+
+用法: python poster.py poster.png --width 16000 --height 18000
+      python poster.py poster.tif --scene big.scene --workers 4
+"""
+
+import argparse
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import raster
+from scene import DEFAULT_VIEW, ParticleScene, get_theme_colors
+
+# 默认块大小（像素）
+TILE = 1024
+
+FORMATS = ("png", "tiff")
+
+
+# ==============================
+# 流式图像写入
+# ==============================
+def _sub_filter(rows):
+    """每个字节减去左边同一通道的字节（PNG 的 Sub 过滤 / TIFF 的水平差分预测），背景大块纯色时压缩率高得多"""
+    out = rows.copy()
+    out[:, 3:] -= rows[:, :-3]
+    return out
+
+
+class PNGWriter:
+    """
+    逐行写 RGB PNG：每次 write_rows 压缩一段行，写成一个 IDAT 块。
+    strategy 是 zlib 的压缩策略；过滤后大片是 0，Z_RLE 比默认策略快、文件也不大
+    """
+
+    def __init__(self, file, width, height, compress_level=6, strategy=zlib.Z_DEFAULT_STRATEGY):
+        self.file = file
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._compress = zlib.compressobj(compress_level, zlib.DEFLATED, zlib.MAX_WBITS, 9, strategy)
+        file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    def write_rows(self, rows):
+        """rows: (行数, 宽, 3) uint8"""
+        rows = rows.reshape(len(rows), self.width * 3)
+        # 每行前面一个字节的过滤类型 1（Sub）
+        filtered = np.empty((len(rows), self.width * 3 + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:] = _sub_filter(rows)
+        data = self._compress.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"写入了 {self.rows_written} 行，图像高 {self.height} 行")
+        self._chunk(b"IDAT", self._compress.flush())
+        self._chunk(b"IEND", b"")
+
+
+class TIFFWriter:
+    """
+    逐行写 RGB TIFF：每 rows_per_strip 行一个 deflate 压缩的条带（带水平差分预测），
+    目录（IFD）写在文件末尾，最后回填文件头里的目录偏移量，所以 file 必须可以 seek
+    """
+
+    def __init__(self, file, width, height, rows_per_strip=64, compress_level=6):
+        self.file = file
+        self.width = width
+        self.height = height
+        self.rows_per_strip = rows_per_strip
+        self.compress_level = compress_level
+        self.rows_written = 0
+        self._pending = []
+        self._pending_rows = 0
+        self._offsets = []
+        self._counts = []
+        self._start = file.tell()
+        # 小端文件头，目录偏移量稍后回填
+        file.write(b"II*\0" + struct.pack("<I", 0))
+
+    def _offset(self):
+        return self.file.tell() - self._start
+
+    def _write_strip(self, rows):
+        data = zlib.compress(_sub_filter(rows.reshape(len(rows), self.width * 3)).tobytes(), self.compress_level)
+        self._offsets.append(self._offset())
+        self._counts.append(len(data))
+        self.file.write(data)
+
+    def write_rows(self, rows):
+        """rows: (行数, 宽, 3) uint8；凑满一个条带就压缩写出"""
+        self.rows_written += len(rows)
+        self._pending.append(rows)
+        self._pending_rows += len(rows)
+        while self._pending_rows >= self.rows_per_strip:
+            pending = np.concatenate(self._pending) if len(self._pending) > 1 else self._pending[0]
+            self._write_strip(pending[:self.rows_per_strip])
+            rest = pending[self.rows_per_strip:]
+            self._pending = [rest] if len(rest) else []
+            self._pending_rows = len(rest)
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"写入了 {self.rows_written} 行，图像高 {self.height} 行")
+        if self._pending_rows:
+            self._write_strip(np.concatenate(self._pending))
+
+        # 目录里放不下的数组（多于 4 字节）先写在目录前面
+        if self.file.tell() % 2:
+            self.file.write(b"\0")
+        bits_offset = self._offset()
+        self.file.write(struct.pack("<3H", 8, 8, 8))
+        strips = len(self._offsets)
+        offsets_offset = self._offset()
+        self.file.write(struct.pack(f"<{strips}I", *self._offsets))
+        counts_offset = self._offset()
+        self.file.write(struct.pack(f"<{strips}I", *self._counts))
+
+        SHORT, LONG = 3, 4
+        entries = [
+            (256, LONG, 1, self.width),                         # ImageWidth
+            (257, LONG, 1, self.height),                        # ImageLength
+            (258, SHORT, 3, bits_offset),                       # BitsPerSample 8,8,8
+            (259, SHORT, 1, 8),                                 # Compression: Adobe deflate
+            (262, SHORT, 1, 2),                                 # PhotometricInterpretation: RGB
+            (273, LONG, strips, offsets_offset if strips > 1 else self._offsets[0]),  # StripOffsets
+            (277, SHORT, 1, 3),                                 # SamplesPerPixel
+            (278, LONG, 1, self.rows_per_strip),                # RowsPerStrip
+            (279, LONG, strips, counts_offset if strips > 1 else self._counts[0]),    # StripByteCounts
+            (284, SHORT, 1, 1),                                 # PlanarConfiguration: 交错
+            (317, SHORT, 1, 2),                                 # Predictor: 水平差分
+        ]
+        ifd_offset = self._offset()
+        self.file.write(struct.pack("<H", len(entries)))
+        for tag, kind, count, value in entries:
+            packed = struct.pack("<H", value) + b"\0\0" if kind == SHORT and count == 1 else struct.pack("<I", value)
+            self.file.write(struct.pack("<HHI", tag, kind, count) + packed)
+        self.file.write(struct.pack("<I", 0))
+
+        end = self.file.tell()
+        self.file.seek(self._start + 4)
+        self.file.write(struct.pack("<I", ifd_offset))
+        self.file.seek(end)
+
+
+def open_writer(file, fmt, width, height, tile=TILE):
+    if fmt == "png":
+        return PNGWriter(file, width, height)
+    if fmt == "tiff":
+        return TIFFWriter(file, width, height, rows_per_strip=min(tile, 256))
+    raise ValueError(f"不支持的海报格式: {fmt}")
+
+
+# ==============================
+# 分块渲染
+# ==============================
+def poster_camera(width, height, view=DEFAULT_VIEW):
+    """整幅海报的相机：点的大小按 12x14 英寸的画面换算，放大海报时粒子也一起放大"""
+    elev, azim = view
+    return raster.Camera(width, height, elev, azim, dpi=min(width / 12, height / 14))
+
+
+def tile_grid(width, height, tile=TILE):
+    """按行带列出所有块 (x, y, 宽, 高)：[[第一行带的块...], ...]"""
+    return [[(x, y, min(tile, width - x), min(tile, height - y)) for x in range(0, width, tile)]
+            for y in range(0, height, tile)]
+
+
+def render_tile(scene, theme_colors, camera, x, y, width, height):
+    """渲染一块，返回 (高, 宽, 3) uint8"""
+    tile = camera.tile(x, y, width, height)
+    image = raster.rasterize(scene, theme_colors, tile)
+    return raster.draw_text(image, tile, theme_colors)
+
+
+# 工作进程里打开的场景和相机
+_job = None
+
+def _init_worker(source, theme, width, height, view):
+    global _job
+    _job = (load_scene(source), get_theme_colors(theme), poster_camera(width, height, view))
+
+
+def _render_tile_job(box):
+    scene, theme_colors, camera = _job
+    return render_tile(scene, theme_colors, camera, *box)
+
+
+def load_scene(source):
+    """source 是 ParticleScene、场景文件路径（np.memmap 打开）或 render_service.scene_for 的参数"""
+    if isinstance(source, ParticleScene):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        from scenefile import open_scene
+        return open_scene(source)
+    from render_service import scene_for
+    return scene_for(source)
+
+
+def render_poster(source, theme, output, width, height, fmt="png", tile=TILE, workers=1, view=DEFAULT_VIEW,
+                  progress=None):
+    """
+    把海报写进 output（文件对象）
+
+    workers > 1 时用进程池并行渲染每个行带里的块，同时最多有两个行带在途
+    （source 要能传给子进程，直接传 ParticleScene 时只用单进程）。
+    progress(已写行数, 总行数) 每写完一个行带调用一次。
+    """
+    bands = tile_grid(width, height, tile)
+    writer = open_writer(output, fmt, width, height, tile)
+
+    def write_band(tiles):
+        band = np.empty((tiles[0].shape[0], width, 3), dtype=np.uint8)
+        x = 0
+        for image in tiles:
+            band[:, x:x + image.shape[1]] = image
+            x += image.shape[1]
+        writer.write_rows(band)
+        if progress is not None:
+            progress(writer.rows_written, height)
+
+    if workers <= 1:
+        scene, theme_colors = load_scene(source), get_theme_colors(theme)
+        camera = poster_camera(width, height, view)
+        for boxes in bands:
+            write_band([render_tile(scene, theme_colors, camera, *box) for box in boxes])
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(source, theme, width, height, view)) as pool:
+            pending = [[pool.submit(_render_tile_job, box) for box in boxes] for boxes in bands[:2]]
+            for i in range(len(bands)):
+                futures = pending.pop(0)
+                if i + 2 < len(bands):
+                    pending.append([pool.submit(_render_tile_job, box) for box in bands[i + 2]])
+                write_band([future.result() for future in futures])
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分块渲染高清海报")
+    parser.add_argument("output", help="输出文件（.png / .tif）")
+    parser.add_argument("--width", type=int, default=16000)
+    parser.add_argument("--height", type=int, default=18000)
+    parser.add_argument("--tile", type=int, default=TILE, help="块大小（像素）")
+    parser.add_argument("--workers", type=int, default=1, help="渲染进程数")
+    parser.add_argument("--scene", help="scenefile.py 生成的场景文件；不给出时按下面的参数生成")
+    parser.add_argument("--n-tree", type=int, default=3000)
+    parser.add_argument("--n-snow", type=int, default=800)
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--theme", default="经典绿色", help="颜色主题（场景文件的颜色在生成时已经确定）")
+    args = parser.parse_args()
+
+    fmt = "tiff" if os.path.splitext(args.output)[1].lower() in (".tif", ".tiff") else "png"
+    if args.scene:
+        from scenefile import open_scene
+        source = args.scene
+        args.theme = open_scene(args.scene).meta.get("theme", args.theme)
+    else:
+        source = dict(n_tree=args.n_tree, n_snow=args.n_snow, n_topper=500, theme=args.theme, seed=args.seed)
+
+    start = time.perf_counter()
+    with open(args.output, "wb") as f:
+        render_poster(source, args.theme, f, args.width, args.height, fmt, args.tile, args.workers,
+                      progress=lambda done, total: print(f"\r{done}/{total} 行", end="", flush=True))
+    print(f"\n🖼️ {args.width}x{args.height} → {args.output}（{os.path.getsize(args.output) / 2**20:.1f} MB），"
+          f"用时 {time.perf_counter() - start:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
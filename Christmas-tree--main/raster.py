@@ -0,0 +1,462 @@
+"""
+纯 NumPy 的点精灵光栅化渲染：mplot3d 之外的另一个渲染后端
+
+相机复刻 mplot3d 的透视投影（view_init(25, -30)、同样的坐标范围和盒子比例），
+所有粒子按深度排序后把圆形光斑按 "over" 规则合成进 RGB 帧缓冲，再编码成 PNG。
+粒子数超过 SLAB_PARTICLES 时（例如 scenefile 打开的上千万粒子场景）按深度切成
+若干层，逐层从前到后合成，内存占用只和画面尺寸及每层粒子数有关。
+给出实例数组时（见 instancing.py），树、装饰球和五角星每个实例按自己的模型矩阵投影一次。
+
+速度：单核、1200x1400 下每帧比 mplot3d 快约 4 倍（6k 粒子）到 3 倍（13 万粒子），连 PNG 编码
+约 5 到 3 倍，达不到当初设想的 10 倍。剩下的时间主要是光斑展开和按 (像素, 深度) 排序合成
+每个粒子十几个像素的贡献，都已经是整块的 NumPy 运算；zlib 压缩 1200x1400 的画面也要 20 ms 左右。
+"""
+
+import copy
+import io
+import tempfile
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from instancing import INSTANCED_LAYERS, instance_transforms
+from scene import LAYERS, chunk_slices, hex_to_rgb
+from timing import stage
+
+# mplot3d 默认的盒子比例、相机距离，以及投影后固定的 2D 视图范围
+BOX_ASPECT = np.array([4, 4, 3]) * 25 / 84
+CAMERA_DIST = 10
+VIEW_LIM = (-0.095, 0.09)
+
+# 和 render.LAYER_STYLE 对应：matplotlib 散点默认描 1.5pt 的同色边，树和地面不描边
+EDGE_WIDTH = {"tree": 0, "ground": 0}
+DEFAULT_EDGE_WIDTH = 1.5
+
+# 深度着色：最远的粒子透明度降到 30%（同 mplot3d 的 depthshade）
+DEPTHSHADE_MIN_ALPHA = 0.3
+
+# 一次合成的最多粒子数，超过时按深度分层（1200x1400 下一层 10 万粒子的临时内存约 300 MB）；
+# DEPTH_BINS 是划分深度层用的直方图格数
+SLAB_PARTICLES = 100_000
+DEPTH_BINS = 4096
+
+# 光斑展开时一块最多的 (偏移量 × 粒子) 个数；海报尺寸下光斑半径几十像素，要按偏移量数减小块
+SPLAT_BLOCK = 16_000_000
+
+
+class Camera:
+    """mplot3d 风格的透视相机，project() 把 (3, N) 世界坐标变成像素坐标和深度"""
+
+    def __init__(self, width=1200, height=1400, elev=25, azim=-30, dpi=100,
+                 xlim=(-5, 5), ylim=(-5, 5), zlim=(-2, 8)):
+        self.width = width
+        self.height = height
+        self.elev = elev
+        self.azim = azim
+        self.dpi = dpi
+        self.limits = (xlim, ylim, zlim)
+
+        # 世界坐标 → [0, box_aspect] 的盒子
+        world = np.eye(4)
+        for i, (lo, hi) in enumerate(self.limits):
+            scale = BOX_ASPECT[i] / (hi - lo)
+            world[i, i] = scale
+            world[i, 3] = -lo * scale
+
+        # 相机绕盒子中心旋转
+        elev_rad, azim_rad = np.deg2rad(elev), np.deg2rad(azim)
+        center = 0.5 * BOX_ASPECT
+        eye = center + CAMERA_DIST * np.array([np.cos(elev_rad) * np.cos(azim_rad),
+                                               np.cos(elev_rad) * np.sin(azim_rad),
+                                               np.sin(elev_rad)])
+        w = (eye - center) / np.linalg.norm(eye - center)
+        u = np.cross([0, 0, 1], w)
+        u /= np.linalg.norm(u)
+        v = np.cross(w, u)
+        view = np.eye(4)
+        view[:3, :3] = [u, v, w]
+        view[:3, 3] = -view[:3, :3] @ eye
+
+        # 焦距为 1 的透视投影；深度取齐次坐标 w（离相机越远越大）
+        persp = np.array([[1, 0, 0, 0],
+                          [0, 1, 0, 0],
+                          [0, 0, 0, -CAMERA_DIST],
+                          [0, 0, -1, 0]])
+        self.M = (persp @ view @ world).astype(np.float32)
+
+        # 2D 视图范围映射到画面中央的正方形视口
+        self.side = min(width, height) * 0.975
+        self.x0 = (width - self.side) / 2
+        self.y0 = (height - self.side) / 2
+
+    def tile(self, x, y, width, height):
+        """画面里从 (x, y) 开始 width×height 的一块：投影和整幅画面完全一致，只平移了原点"""
+        tile = copy.copy(self)
+        tile.width, tile.height = width, height
+        tile.x0 = self.x0 - x
+        tile.y0 = self.y0 - y
+        return tile
+
+    def point_radius(self, sizes, edge_width=0.0):
+        """散点面积 s（pt²）→ 光斑半径（像素），包括描边的一半"""
+        return (np.sqrt(sizes) / 2 + edge_width / 2) * self.dpi / 72
+
+    def project(self, positions, model=None):
+        """返回像素坐标 px, py（py 向下）和深度；model 是先作用在坐标上的 4x4 模型矩阵"""
+        M = self.M if model is None else self.M @ model
+        x, y, z = positions
+        depth = M[3, 0] * x + M[3, 1] * y + M[3, 2] * z + M[3, 3]
+        vx = (M[0, 0] * x + M[0, 1] * y + M[0, 2] * z + M[0, 3]) / depth
+        vy = (M[1, 0] * x + M[1, 1] * y + M[1, 2] * z + M[1, 3]) / depth
+
+        lo, hi = VIEW_LIM
+        scale = self.side / (hi - lo)
+        px = self.x0 + (vx - lo) * scale
+        py = self.y0 + (hi - vy) * scale
+        return px, py, depth
+
+
+def _depthshade(depth, depth_range=None):
+    lo, hi = (depth.min(), depth.max()) if depth_range is None else depth_range
+    span = hi - lo
+    if span <= 0:
+        return np.ones_like(depth)
+    return 1 - (depth - lo) / span * (1 - DEPTHSHADE_MIN_ALPHA)
+
+
+def _gather_layer(scene, name, sl, camera, depthshade, depth_range=None, instance=None):
+    """
+    图层 name 中 sl 范围内粒子的像素坐标、半径、深度、RGB、alpha，只保留落在画面内（含半径）的粒子
+
+    深度着色按整个图层的深度范围计算；只取一部分粒子或者有多个实例时用 depth_range 给出。
+    instance 是 instancing.instance_transforms 的一项 (模型矩阵, 颜色矩阵, 面积倍数)。
+    """
+    positions, colors, sizes = scene.layer(name)
+    model, hue, size_scale = (None, None, 1) if instance is None else instance
+    px, py, depth = camera.project(positions[:, sl], model)
+    radius = camera.point_radius(sizes[sl] * size_scale,
+                                 EDGE_WIDTH.get(name, DEFAULT_EDGE_WIDTH)).astype(np.float32)
+    alpha = colors[sl, 3].copy()
+    if depthshade:
+        alpha *= _depthshade(depth, depth_range)
+
+    visible = ((depth > 0) & (px + radius >= 0) & (px - radius < camera.width)
+               & (py + radius >= 0) & (py - radius < camera.height))
+    rgb = colors[sl][visible, :3]
+    if hue is not None:
+        rgb = np.clip(rgb @ hue.T, 0, 1)
+    return px[visible], py[visible], radius[visible], depth[visible], rgb, alpha[visible]
+
+
+def _draws(scene, instances=None, chunk=None):
+    """
+    要投影的 (图层名, 粒子范围, 实例变换) 列表：实例化的图层每个实例各一遍，
+    其余图层（或者没有实例数组时所有图层）一遍，实例变换为 None
+    """
+    transforms = None if instances is None else instance_transforms(instances)
+    draws = []
+    for name in LAYERS:
+        for sl in chunk_slices(scene.count(name), chunk):
+            if sl.stop == sl.start:
+                continue
+            if transforms is not None and name in INSTANCED_LAYERS:
+                draws += [(name, sl, transform) for transform in transforms]
+            else:
+                draws.append((name, sl, None))
+    return draws
+
+
+def _depth_ranges(scene, camera, draws):
+    """每个图层所有粒子（所有实例）的深度范围，深度着色用"""
+    depth_range = {}
+    for name, sl, instance in draws:
+        depth = camera.project(scene.layer(name)[0][:, sl], None if instance is None else instance[0])[2]
+        lo, hi = depth_range.get(name, (np.inf, -np.inf))
+        depth_range[name] = (min(lo, depth.min()), max(hi, depth.max()))
+    return depth_range
+
+
+def _instanced_count(scene, instances=None):
+    """要画的粒子总数：实例化的图层乘以实例数"""
+    if instances is None:
+        return len(scene)
+    return sum(scene.count(name) * (len(instances) if name in INSTANCED_LAYERS else 1) for name in LAYERS)
+
+
+def _gather_particles(scene, camera, depthshade, instances=None):
+    """所有图层（所有实例）的可见粒子，各列拼接在一起"""
+    draws = _draws(scene, instances)
+    # 没有实例时每个图层只投影一遍，深度范围在 _gather_layer 里顺便求出
+    depth_range = {} if instances is None else _depth_ranges(scene, camera, draws)
+    parts = [_gather_layer(scene, name, sl, camera, depthshade, depth_range.get(name), instance)
+             for name, sl, instance in draws]
+    if not parts:
+        empty = np.empty(0, dtype=np.float32)
+        return empty, empty, empty, empty, np.empty((0, 3), dtype=np.float32), empty
+    return tuple(np.concatenate(columns) for columns in zip(*parts))
+
+
+def _splat(px, py, radius, width, height, block=SPLAT_BLOCK):
+    """
+    每个光斑覆盖的像素：按半径分组，每组一次性对所有偏移量向量化（大组分块，
+    每块不超过 block 个 (偏移量, 粒子) 组合）；覆盖率按光斑边缘到像素中心的距离做
+    抗锯齿。返回 (像素编号, 粒子编号, 覆盖率)
+    """
+    cx = np.floor(px)
+    cy = np.floor(py)
+    fx = px - cx - 0.5
+    fy = py - cy - 0.5
+    cx = cx.astype(np.int64)
+    cy = cy.astype(np.int64)
+    base = cy * width + cx
+    reach = np.ceil(radius + 0.5).astype(np.int64)
+    # 光斑完全在画面内的粒子不用逐像素检查边界
+    clipped = (cx < reach) | (cx + reach >= width) | (cy < reach) | (cy + reach >= height)
+
+    pixels, points, coverage = [], [], []
+    for r in np.unique(reach):
+        offsets = np.arange(-r, r + 1)
+        dx = np.tile(offsets, len(offsets))
+        dy = np.repeat(offsets, len(offsets))
+        shift = dy * width + dx
+        dx_f = dx.astype(np.float32)[:, None]
+        dy_f = dy.astype(np.float32)[:, None]
+        members = np.nonzero(reach == r)[0]
+        chunk = max(1, block // len(dx))
+        for start in range(0, len(members), chunk):
+            group = members[start:start + chunk]
+            edge = radius[group] + 0.5
+            # 先用距离平方筛掉光斑外的格子，只对覆盖到的像素开方
+            d2 = np.square(dx_f - fx[group])
+            d2 += np.square(dy_f - fy[group])
+            hit = np.flatnonzero(d2 < np.square(edge))
+            offset, member = np.divmod(hit, len(group))
+            point = group[member]
+            pixel = base[point] + shift[offset]
+            cover = np.minimum(edge[member] - np.sqrt(d2.ravel()[hit]), 1)
+
+            near_border = clipped[point]
+            if near_border.any():
+                x = cx[point] + dx[offset]
+                y = cy[point] + dy[offset]
+                keep = ~near_border | ((x >= 0) & (x < width) & (y >= 0) & (y < height))
+                pixel, point, cover = pixel[keep], point[keep], cover[keep]
+            pixels.append(pixel)
+            points.append(point)
+            coverage.append(cover)
+    return np.concatenate(pixels), np.concatenate(points), np.concatenate(coverage)
+
+
+@lru_cache(maxsize=8)
+def _background(width, height, color):
+    """纯色背景模板，每帧 copyto 到帧缓冲，比逐像素填充快得多"""
+    template = np.empty((height * width, 3), dtype=np.uint8)
+    template[:] = np.round(np.array(hex_to_rgb(color)) * 255)
+    template.flags.writeable = False
+    return template
+
+
+def _composite(px, py, radius, depth, rgb, alpha, width, height):
+    """
+    从前到后合成一批粒子。返回 (被覆盖的像素编号, (3, m) 颜色加权和, 对数透射率)，
+    像素最终颜色 = 颜色加权和 + exp(对数透射率) × 这批粒子后面的颜色
+    """
+    n = len(px)
+
+    # 先按深度从近到远排好，粒子编号就是深度名次
+    near = np.argsort(depth, kind="stable")
+    px, py, radius, alpha = px[near], py[near], radius[near], alpha[near]
+    rgb = rgb[near].T.copy()
+
+    pixels, points, coverage = _splat(px, py, radius, width, height)
+    a = np.minimum(coverage * alpha[points], 0.999)
+
+    # 按 (像素, 深度名次) 排序后，同一像素内的贡献从前到后排列
+    order = np.argsort(pixels * n + points)
+    pixels, points, a = pixels[order], points[order], a[order]
+
+    # 从前到后合成：每个贡献的权重 = a * 它前面所有贡献的透射率之积
+    # 前缀和跨越所有像素，数值会很大，必须用 float64 累加，否则同一像素内相减后精度不够
+    log_t = np.log1p(-a)
+    before = np.cumsum(log_t, dtype=np.float64)
+    before -= log_t
+    first = np.r_[True, pixels[1:] != pixels[:-1]]
+    segment = np.cumsum(first) - 1
+    starts = np.nonzero(first)[0]
+    before -= before[starts][segment]
+    weight = a * np.exp(before)
+
+    m = len(starts)
+    color = [np.bincount(segment, weight * rgb[c][points], minlength=m) for c in range(3)]
+    return pixels[starts], color, np.bincount(segment, log_t, minlength=m)
+
+
+def rasterize(scene, theme_colors, camera=None, depthshade=True, out=None, instances=None):
+    """
+    把场景光栅化成 (高, 宽, 3) uint8 图像；动画逐帧渲染时可传入同尺寸的 out 复用帧缓冲。
+    instances 是 (K, 6) 实例数组，树、装饰球和五角星按每个实例的变换各画一遍
+    """
+    if camera is None:
+        camera = Camera()
+    if _instanced_count(scene, instances) > SLAB_PARTICLES:
+        return rasterize_slabs(scene, theme_colors, camera, depthshade, out, instances=instances)
+    width, height = camera.width, camera.height
+    background = np.array(hex_to_rgb(theme_colors["background"]), dtype=np.float32)
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+    image = out.reshape(height * width, 3)
+    np.copyto(image, _background(width, height, theme_colors["background"]))
+
+    px, py, radius, depth, rgb, alpha = _gather_particles(scene, camera, depthshade, instances)
+    if len(px) == 0:
+        return out
+    target, color, log_transmit = _composite(px, py, radius, depth, rgb, alpha, width, height)
+
+    # 只计算被覆盖的像素：颜色 = Σ 权重 × 粒子颜色 + 剩余透射率 × 背景
+    # 逐通道写进扁平的 uint8 视图，比按行花式索引赋值快得多
+    transmit = np.exp(log_transmit)
+    target *= 3
+    flat = out.reshape(-1)
+    for c in range(3):
+        value = color[c]
+        value += transmit * background[c]
+        value *= 255
+        value += 0.5
+        flat[target + c] = np.minimum(value, 255)
+    return out
+
+
+def rasterize_slabs(scene, theme_colors, camera=None, depthshade=True, out=None, slab=SLAB_PARTICLES,
+                    instances=None):
+    """
+    大场景的光栅化：结果和 rasterize 相同，临时内存不随粒子数增长
+
+    第一遍逐块投影，求每个图层的深度范围（深度着色用）；第二遍统计可见粒子的
+    深度直方图，把深度切成每层不超过 slab 个粒子的若干层；第三遍按层做计数排序，
+    把可见粒子的像素坐标、半径、深度、颜色写进临时文件，每层在文件里连续。
+    最后从近到远逐层读回合成，帧缓冲里累积颜色和对数透射率。
+    np.memmap 打开的场景每一遍都只有正在处理的块在内存里；有实例数组时每个实例的
+    每一块单独投影，同样不会展开成整片森林的坐标。
+    """
+    if camera is None:
+        camera = Camera()
+    width, height = camera.width, camera.height
+    background = np.array(hex_to_rgb(theme_colors["background"]), dtype=np.float32)
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+    image = out.reshape(height * width, 3)
+    np.copyto(image, _background(width, height, theme_colors["background"]))
+    blocks = _draws(scene, instances, slab)
+    if not blocks:
+        return out
+
+    # 第一遍：每个图层的深度范围
+    depth_range = _depth_ranges(scene, camera, blocks)
+
+    # 第二遍：可见粒子的深度直方图 → 每个直方图格属于哪一层
+    lo = min(r[0] for r in depth_range.values())
+    hi = max(r[1] for r in depth_range.values())
+    edges = np.linspace(lo, hi, DEPTH_BINS + 1)
+    edges[-1] = np.nextafter(hi, np.inf)
+    hist = np.zeros(DEPTH_BINS, dtype=np.int64)
+    for name, sl, instance in blocks:
+        hist += np.histogram(_gather_layer(scene, name, sl, camera, False, instance=instance)[3], edges)[0]
+    slab_of_bin = np.empty(DEPTH_BINS, dtype=np.int64)
+    sizes = [0]
+    for i, count in enumerate(hist):
+        if sizes[-1] and sizes[-1] + count > slab:
+            sizes.append(0)
+        sizes[-1] += count
+        slab_of_bin[i] = len(sizes) - 1
+    starts = np.r_[0, np.cumsum(sizes)]
+
+    with tempfile.TemporaryFile() as spill:
+        # 第三遍：计数排序写进临时文件，每行一列：px, py, 半径, 深度, r, g, b, alpha
+        columns = np.memmap(spill, dtype=np.float32, mode="w+", shape=(8, max(starts[-1], 1)))
+        cursor = starts[:-1].copy()
+        for name, sl, instance in blocks:
+            px, py, radius, depth, rgb, alpha = _gather_layer(scene, name, sl, camera, depthshade,
+                                                              depth_range[name], instance)
+            which = slab_of_bin[np.clip(np.searchsorted(edges, depth, side="right") - 1, 0, DEPTH_BINS - 1)]
+            order = np.argsort(which, kind="stable")
+            counts = np.bincount(which, minlength=len(sizes))
+            block = np.vstack([px, py, radius, depth, rgb.T, alpha])[:, order]
+            offset = 0
+            for k in np.flatnonzero(counts):
+                columns[:, cursor[k]:cursor[k] + counts[k]] = block[:, offset:offset + counts[k]]
+                cursor[k] += counts[k]
+                offset += counts[k]
+
+        # 从近到远逐层合成
+        color = np.zeros((3, height * width), dtype=np.float64)
+        log_transmit = np.zeros(height * width, dtype=np.float64)
+        for k in range(len(sizes)):
+            if sizes[k] == 0:
+                continue
+            px, py, radius, depth, r, g, b, alpha = np.array(columns[:, starts[k]:starts[k + 1]])
+            target, slab_color, slab_log_t = _composite(px, py, radius, depth, np.stack([r, g, b], axis=1),
+                                                        alpha, width, height)
+            transmit = np.exp(log_transmit[target])
+            for c in range(3):
+                color[c, target] += transmit * slab_color[c]
+            log_transmit[target] += slab_log_t
+        del columns
+
+    # 只写被覆盖过的像素，其余保持背景
+    covered = np.flatnonzero(log_transmit)
+    transmit = np.exp(log_transmit[covered])
+    for c in range(3):
+        value = color[c, covered] + transmit * background[c]
+        image[covered, c] = np.minimum(value * 255 + 0.5, 255)
+    return out
+
+
+@lru_cache(maxsize=8)
+def _font(size):
+    try:
+        # matplotlib 默认的 DejaVu Sans 粗体；找不到时退回 Pillow 自带字体
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def draw_text(image, camera, theme_colors):
+    """
+    和 render.draw_scene 一样在视口 (0.35, 0.25) 处写 "Merry Christmas"，直接写进
+    (高, 宽, 3) uint8 的 image 并返回它；只有文字所在的一小块经过 Pillow，不用复制整幅画面
+    """
+    text = "Merry Christmas"
+    font = _font(round(28 * camera.dpi / 72))
+    x = camera.x0 + 0.35 * camera.side
+    y = camera.y0 + (1 - 0.25) * camera.side
+    left, top, right, bottom = font.getbbox(text, anchor="ls")
+    x0, y0 = max(int(np.floor(x + left)) - 1, 0), max(int(np.floor(y + top)) - 1, 0)
+    x1 = min(int(np.ceil(x + right)) + 1, image.shape[1])
+    y1 = min(int(np.ceil(y + bottom)) + 1, image.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return image
+    im = Image.fromarray(image[y0:y1, x0:x1])
+    ImageDraw.Draw(im).text((x - x0, y - y0), text, fill=theme_colors["text"], font=font, anchor="ls")
+    image[y0:y1, x0:x1] = np.asarray(im)
+    return image
+
+
+def render_png(scene, theme_colors, camera=None, depthshade=True, instances=None):
+    """光栅化 + 文字 + PNG 编码"""
+    # poster 导入了本模块，只能在这里导入
+    from poster import PNGWriter
+    if camera is None:
+        camera = Camera()
+    with stage("rasterize"):
+        image = rasterize(scene, theme_colors, camera, depthshade, instances=instances)
+    with stage("text"):
+        draw_text(image, camera, theme_colors)
+    buffer = io.BytesIO()
+    with stage("encode"):
+        # 自己写 PNG：只用 Sub 过滤 + 最低压缩级别的 Z_RLE，比 Pillow 逐行挑选过滤方式快三倍，文件大小差不多
+        writer = PNGWriter(buffer, camera.width, camera.height, compress_level=1, strategy=zlib.Z_RLE)
+        writer.write_rows(image)
+        writer.close()
+    return buffer.getvalue()
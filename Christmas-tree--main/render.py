@@ -0,0 +1,109 @@
+"""
+用 matplotlib 绘制 ParticleScene
+santa1.py（动画）和 streamlit_app.py（静态图）共用
+"""
+
+import io
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from instancing import INSTANCED_LAYERS, transform_colors, transform_positions, transform_sizes
+from scene import DEFAULT_VIEW
+from timing import stage
+
+# 每个图层的绘制参数：树和地面不描边
+LAYER_STYLE = {
+    "tree": dict(linewidths=0),
+    "decorations": dict(),
+    "topper": dict(),
+    "ground": dict(linewidths=0),
+    "snow": dict(),
+    "stars": dict(),
+}
+
+# 默认坐标范围 (xlim, ylim, zlim)，森林模式按树的排布放大
+LIMITS = ((-5, 5), (-5, 5), (-2, 8))
+
+
+def new_figure(figsize=(12, 14), dpi=100):
+    """不经过 pyplot 创建带 Agg 画布的 Figure，没有全局状态，子进程/线程里也能安全使用"""
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def setup_axes(fig, ax, theme_colors, view=DEFAULT_VIEW, limits=LIMITS):
+    """背景色、隐藏坐标轴、固定坐标范围 limits=(xlim, ylim, zlim) 和初始视角 view=(elev, azim)"""
+    ax.set_facecolor(theme_colors["background"])
+    fig.patch.set_facecolor(theme_colors["background"])
+    ax.set_axis_off()
+
+    # 扩大坐标范围适应更大的树
+    xlim, ylim, zlim = limits
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+    ax.set_zlim(*zlim)
+
+    # 初始视角
+    ax.view_init(*view)
+
+
+def draw_scene(ax, scene, theme_colors, fontfamily='sans-serif', instances=None):
+    """
+    每个图层画一个散点图，返回 {图层名: artist}，文字在 "text" 下。
+    给出 (K, 6) 实例数组时，树、装饰球和五角星的散点图包含所有实例
+    """
+    artists = {}
+    with stage("artists"):
+        for name, style in LAYER_STYLE.items():
+            positions, colors, sizes = scene.layer(name)
+            if instances is not None and name in INSTANCED_LAYERS:
+                positions = transform_positions(positions, instances)
+                colors = transform_colors(colors, instances)
+                sizes = transform_sizes(sizes, instances)
+            artists[name] = ax.scatter(positions[0], positions[1], positions[2],
+                                       s=sizes, c=colors, **style)
+
+        artists["text"] = ax.text2D(0.35, 0.25, "Merry Christmas", transform=ax.transAxes,
+                                    color=theme_colors["text"], fontsize=28, fontweight='bold',
+                                    fontfamily=fontfamily)
+    return artists
+
+
+def render_rgba(fig):
+    """绘制 Agg 画布，返回 (高, 宽, 4) uint8 数组（画布缓冲区的视图，下次绘制会被覆盖）"""
+    with stage("draw"):
+        fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba())
+
+
+def render_scene(scene, theme_colors, figsize=(12, 14), dpi=100):
+    """一次性画一帧：新建图形、绘制场景、返回 (高, 宽, 4) uint8 数组"""
+    fig = new_figure(figsize=figsize, dpi=dpi)
+    ax = fig.add_subplot(111, projection='3d')
+    setup_axes(fig, ax, theme_colors)
+    draw_scene(ax, scene, theme_colors)
+    return render_rgba(fig)
+
+
+def render_png(scene, theme_colors, dpi=100, view=DEFAULT_VIEW, instances=None, limits=None):
+    """
+    静态 PNG，画布固定为 12x14 英寸（dpi=100 时 1200x1400），取景和动画帧、raster 后端一样
+    （tight_layout）。只用面向对象的 Figure API，多线程/多进程下都安全。
+    森林模式给出实例数组和放大后的坐标范围
+    """
+    with stage("figure"):
+        fig = new_figure(figsize=(12, 14), dpi=dpi)
+        ax = fig.add_subplot(111, projection='3d')
+        setup_axes(fig, ax, theme_colors, view, limits or LIMITS)
+        fig.tight_layout()
+
+    draw_scene(ax, scene, theme_colors, instances=instances)
+
+    # savefig 包括绘制和 PNG 编码
+    buffer = io.BytesIO()
+    with stage("savefig"):
+        fig.savefig(buffer, format='png', facecolor=theme_colors["background"], dpi=dpi, edgecolor='none')
+    return buffer.getvalue()
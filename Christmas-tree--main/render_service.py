@@ -0,0 +1,285 @@
+"""
+后台渲染服务：Streamlit 脚本线程只提交任务、等结果，绘制在工作进程里完成
+
+每个工作进程有自己的 matplotlib，只用 Figure/FigureCanvasAgg，没有 pyplot 全局
+状态，多个会话同时生成时并行渲染。任务只带参数（种子、粒子数、主题……），
+工作进程按参数重建场景，结果和主进程里生成的完全一样。同时在途的任务数有上限，
+满了立即拒绝（背压）；等待结果有超时。
+
+细节层次也在工作进程里决定：任务带 budget_ms 时按图像尺寸和耗时预算挑选各图层
+粒子数，耗时模型的实测和修正都用本进程的渲染耗时（不含排队和进程间传输）。
+高清海报也交给工作进程分块渲染、写进临时文件，进度通过共享字典告诉调用方。
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from cache import LRUCache
+from cull import cull_scene, view_camera
+from forest import build_forest
+from lod import LODPlanner, subsample
+from scene import DEFAULT_VIEW, LAYERS, get_theme_colors
+from scenegraph import SceneGraph
+from timing import RequestTimer, stage
+import raster
+
+
+class ServiceBusy(RuntimeError):
+    """在途任务已满，调用方应稍后重试"""
+
+
+def render_image(backend, scene, theme_colors, dpi=100, view=DEFAULT_VIEW, instances=None, limits=None):
+    """
+    按后端把场景渲染成 PNG 字节；view 是 (elev, azim)。
+    森林模式给出 (K, 6) 实例数组和放大后的坐标范围 (xlim, ylim, zlim)
+    """
+    if backend == "matplotlib":
+        # matplotlib 导入要半秒多，只在第一次用它渲染时导入，Streamlit 主进程启动时不用等
+        import render
+        return render.render_png(scene, theme_colors, dpi, view, instances, limits)
+    elev, azim = view
+    xlim, ylim, zlim = limits or ((-5, 5), (-5, 5), (-2, 8))
+    camera = raster.Camera(12 * dpi, 14 * dpi, elev, azim, dpi=dpi, xlim=xlim, ylim=ylim, zlim=zlim)
+    return raster.render_png(scene, theme_colors, camera, instances=instances)
+
+
+def graph_for(params, graph=None):
+    """种子和视角都和 params 一致时沿用 graph，否则新建一个 SceneGraph"""
+    view = None if params.get("view") is None else tuple(params["view"])
+    if graph is None or graph.seed != params["seed"] or graph.view != view:
+        graph = SceneGraph(params["seed"], view)
+    return graph
+
+
+def scene_for(params, graph=None):
+    """
+    按任务参数生成场景（同样的参数总是得到同样的粒子）。params 里有 view 时地面、
+    雪花和星空只在这个视角的画面里生成（静态图），没有时生成完整场景。给出 SceneGraph
+    时在它上面增量更新，只重做参数变了的图层
+    """
+    return graph_for(params, graph).update(n_tree=params["n_tree"], n_snow=params["n_snow"],
+                                           n_topper=params["n_topper"],
+                                           theme_colors=get_theme_colors(params["theme"]))
+
+
+# ==============================
+# 工作进程
+# ==============================
+# 每个工作进程缓存最近用过的场景，同一棵树换尺寸或后端时不用重建；
+# 缓存没命中时在上一次的场景图上增量更新
+_scenes = None
+_graph = None
+
+# 每种后端和尺寸一个细节层次耗时模型，第一次按预算渲染时在本进程里实测。
+# 工作进程一次只执行一个任务，不需要加锁
+_planners = {}
+
+def _init_worker():
+    global _scenes
+    _scenes = LRUCache(64 * 2**20)
+    # 提前导入 matplotlib 和 mplot3d，第一个任务不用付导入开销
+    import render  # noqa: F401
+    import mpl_toolkits.mplot3d  # noqa: F401
+
+
+def planner_for(backend, dpi):
+    """本进程里 (backend, dpi) 的耗时模型：画面和 render_image 一样，只是不剔除"""
+    planner = _planners.get((backend, dpi))
+    if planner is None:
+        theme_colors = get_theme_colors("经典绿色")
+        planner = _planners[backend, dpi] = LODPlanner(
+            lambda scene: render_image(backend, scene, theme_colors, dpi))
+    return planner
+
+
+def render_job(params):
+    """
+    在工作进程里执行，返回 (PNG 字节, [(阶段名, 毫秒)], {图层名: 视锥剔除的粒子数},
+    {"counts": 各图层粒子数或 None, "render_ms": 绘制毫秒数},
+    {"profile": cProfile 文本, "memory": tracemalloc 文本, "peak_mb": 峰值内存})。
+    params["profile"] / params["trace_memory"] 为真时在本进程里采样这次任务（工作进程一次只执行
+    一个任务，采样不会混进别的请求），没有采样的项是 None。
+    params["counts"] 直接给出各图层粒子数；params["budget_ms"] 给出时由本进程的 LODPlanner
+    按图像尺寸和耗时预算（0 表示只按尺寸）决定，绘制耗时和视锥剔除后的粒子数反馈给它修正模型。
+    params["forest"] 是棵数时渲染森林。
+    不做遮挡剔除：应用里最大的场景（树 8000 个粒子，剔除后约 1.45 万）一个格子都填不满，
+    cull.occlude_scene 一个粒子也去不掉，只多花 7～15 ms
+    """
+    global _graph
+    params = dict(params, view=tuple(params.get("view") or DEFAULT_VIEW))
+    profile, trace_memory = params.pop("profile", False), params.pop("trace_memory", False)
+    counts, planner = params.get("counts"), None
+    with RequestTimer("render_job", profile=profile, trace_memory=trace_memory, **params) as timer:
+        if params.get("forest"):
+            start = time.perf_counter()
+            png, culled = render_forest(params), {}
+        else:
+            key = (params["n_tree"], params["n_snow"], params["n_topper"], params["theme"], params["seed"],
+                   params["view"])
+            scene = _scenes.get(key)
+            if scene is None:
+                _graph = graph_for(params, _graph)
+                with stage("scene"):
+                    scene = scene_for(params, _graph)
+                _scenes.put(key, scene)
+            if not counts and params.get("budget_ms") is not None:
+                planner = planner_for(params["backend"], params["dpi"])
+                with stage("lod"):
+                    counts = planner.plan(scene, params["budget_ms"] or None,
+                                          12 * params["dpi"], 14 * params["dpi"])
+            if counts:
+                scene = subsample(scene, counts)
+            # 场景按视角生成，这里剔除的主要是点半径和边距以外的零头
+            camera = view_camera(params["view"], params["dpi"])
+            with stage("cull"):
+                scene, culled = cull_scene(scene, camera)
+            timer.fields["culled"] = culled
+            # 耗时对应的是剔除后真正画出来的粒子数
+            rendered = {name: scene.count(name) for name in LAYERS}
+            start = time.perf_counter()
+            png = render_image(params["backend"], scene, get_theme_colors(params["theme"]), params["dpi"],
+                               params["view"])
+        render_ms = (time.perf_counter() - start) * 1e3
+        if planner is not None:
+            planner.observe(rendered, render_ms)
+        timer.fields["lod"] = counts
+    report = dict(profile=timer.profile_text() or None, memory=timer.memory_text() or None, peak_mb=timer.peak_mb)
+    return png, timer.stages, culled, dict(counts=counts, render_ms=render_ms), report
+
+
+def render_forest(params):
+    """
+    森林模式：params["forest"] 棵树共用一份基准树，每棵树是一个实例。不做剔除
+    （剔除是按单棵树场景的粒子和坐标范围算的）
+    """
+    theme_colors = get_theme_colors(params["theme"])
+    key = ("forest", params["forest"], params["n_tree"], params["n_snow"], params["n_topper"], params["theme"],
+           params["seed"])
+    forest = _scenes.get(key)
+    if forest is None:
+        with stage("scene"):
+            forest = build_forest(params["forest"], params["seed"], theme_colors, n_tree=params["n_tree"],
+                                  n_snow=params["n_snow"], n_topper=params["n_topper"])
+        _scenes.put(key, forest)
+    return render_image(params["backend"], forest.scene, theme_colors, params["dpi"], params["view"],
+                        forest.instances, forest.limits)
+
+
+def poster_job(params, path, width, height, fmt, progress):
+    """在工作进程里把海报写进 path；progress 是共享字典，每写完一个行带更新 rows（已写行数）"""
+    from poster import render_poster
+    with open(path, "wb") as f:
+        render_poster(params, params["theme"], f, width, height, fmt,
+                      view=tuple(params.get("view") or DEFAULT_VIEW),
+                      progress=lambda done, total: progress.update(rows=done))
+    return path
+
+
+# ==============================
+# 服务
+# ==============================
+# 默认的渲染进程数。每个进程都有自己的 matplotlib（常驻约 80 MB），共享主机上
+# os.cpu_count() 报的是整台机器的核数，按它开进程会超出内存配额；用环境变量 RENDER_WORKERS 调整
+DEFAULT_WORKERS = 2
+
+
+def default_workers():
+    return int(os.environ.get("RENDER_WORKERS") or DEFAULT_WORKERS)
+
+
+class RenderService:
+    """
+    workers 默认为 default_workers()；max_pending 是排队和正在渲染的任务总数上限，
+    默认每个进程 4 个。超时的任务如果还没开始就取消，已经在渲染的会跑完再释放名额。
+    """
+
+    def __init__(self, workers=None, max_pending=None, timeout=60):
+        self.workers = workers or default_workers()
+        self.max_pending = max_pending or 4 * self.workers
+        self.timeout = timeout
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+        self._manager = None
+
+    def _new_pool(self):
+        # spawn：Streamlit 服务器是多线程的，fork 出来的子进程可能继承被占用的锁
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker)
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+            if not future.cancelled():
+                self.completed += 1
+
+    def submit(self, params):
+        """提交渲染任务，返回 Future；在途任务已满时抛出 ServiceBusy"""
+        return self._submit(render_job, params)
+
+    def submit_poster(self, params, path, width, height, fmt):
+        """
+        提交海报任务，返回 (Future, 进度字典)；结果写进 path，进度字典的 rows 是已写行数。
+        海报和普通渲染共用在途名额，已满时抛出 ServiceBusy
+        """
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+            progress = self._manager.dict(rows=0)
+        return self._submit(poster_job, params, path, width, height, fmt, progress), progress
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ServiceBusy(f"渲染队列已满（{self.max_pending} 个任务）")
+            self.pending += 1
+        try:
+            try:
+                future = self._pool.submit(fn, *args)
+            except BrokenProcessPool:
+                # 工作进程意外退出后进程池不可再用，换一个新的
+                self._pool = self._new_pool()
+                future = self._pool.submit(fn, *args)
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def render(self, params, timeout=None):
+        """提交并等待结果，返回 render_job 的结果；超时抛出 concurrent.futures.TimeoutError"""
+        future = self.submit(params)
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_service():
+    """本进程共用的 RenderService：Streamlit 的各个会话、图集预热和图片接口都用它，不会各开一组进程"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RenderService()
+        return _shared
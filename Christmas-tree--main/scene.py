@@ -0,0 +1,577 @@
+import numpy as np
+
+from timing import stage
+
+# 场景中的图层，按绘制顺序排列
+LAYERS = ("tree", "decorations", "topper", "ground", "snow", "stars")
+
+# 初始视角 (elev, azim)；放在这里而不是 render.py，用到它的模块不必导入 matplotlib
+DEFAULT_VIEW = (25, -30)
+
+# 装饰球调色板
+DECORATION_COLORS = ('#FF6B6B', '#FFD93D', '#4ECDC4', '#C7C7C7', '#FF69B4', '#98FB98')
+
+# ==============================
+# 主题颜色配置
+# ==============================
+def get_theme_colors(theme_name):
+    """主题颜色；tree_base/tree_tip 是树从底部到顶部渐变的两端 RGB，decorations 是装饰球调色板"""
+    themes = {
+        "经典绿色": {
+            "background": "#0a0a2a",
+            "ground": "#FFFFFF",
+            "snow": "#FFFFFF",
+            "text": "#FFD93D",
+            "tree_base": (0.2, 0.6, 0.2),
+            "tree_tip": (0.4, 0.8, 0.4),
+            "decorations": DECORATION_COLORS
+        },
+        "冬季蓝": {
+            "background": "#1a1a3a",
+            "ground": "#E0F6FF",
+            "snow": "#E0F6FF",
+            "text": "#87CEEB",
+            "tree_base": (0.3, 0.7, 0.3),
+            "tree_tip": (0.5, 0.9, 0.5),
+            "decorations": DECORATION_COLORS
+        },
+        "温暖橙": {
+            "background": "#2a1a0a",
+            "ground": "#FFF8DC",
+            "snow": "#FFF8DC",
+            "text": "#FFB347",
+            "tree_base": (0.3, 0.7, 0.3),
+            "tree_tip": (0.5, 0.9, 0.5),
+            "decorations": DECORATION_COLORS
+        },
+        "神秘紫": {
+            "background": "#2a0a2a",
+            "ground": "#F0E6FF",
+            "snow": "#F0E6FF",
+            "text": "#DDA0DD",
+            "tree_base": (0.3, 0.7, 0.3),
+            "tree_tip": (0.5, 0.9, 0.5),
+            "decorations": DECORATION_COLORS
+        }
+    }
+    return themes.get(theme_name, themes["经典绿色"])
+
+# ==============================
+# 五角星轮廓（树顶）
+# ==============================
+def star_outline(R=1.0):
+    """五角星的 2D 外轮廓：外→内→外→内… 共 10 个顶点"""
+    # 内圈半径（黄金比例五角星）
+    r = R * 0.382
+
+    # 五角的角度
+    outer_angles = np.linspace(0, 2*np.pi, 6)[:-1]
+    inner_angles = outer_angles + np.pi/5
+
+    star_x_2d = np.empty(10)
+    star_z_2d = np.empty(10)
+    star_x_2d[0::2] = R * np.cos(outer_angles)
+    star_x_2d[1::2] = r * np.cos(inner_angles)
+    star_z_2d[0::2] = R * np.sin(outer_angles)
+    star_z_2d[1::2] = r * np.sin(inner_angles)
+
+    return star_x_2d, star_z_2d
+
+# ==============================
+# 生成函数
+# ==============================
+# 所有生成函数返回 (3, n) float32 坐标数组（x, y, z 各占一行，可以直接
+# x, y, z = generate_xxx(...) 解包）；传入 out 时直接写入 out，不再分配。
+
+def chunk_slices(n, chunk=None):
+    """把 range(n) 切成最多 chunk 个一段的 slice；chunk 为 None 时只有一段"""
+    if not chunk or n <= chunk:
+        return [slice(0, n)]
+    return [slice(start, min(start + chunk, n)) for start in range(0, n, chunk)]
+
+
+def _positions_out(n, out):
+    if out is None:
+        out = np.empty((3, n), dtype=np.float32)
+    return out
+
+
+def generate_tree(n=6000, rng=None, out=None):
+    """圆锥形的树"""
+    if rng is None:
+        rng = np.random.default_rng()
+    out = _positions_out(n, out)
+
+    z = rng.uniform(0, 1, n)
+    radius = (1 - z)**1.5 * 3.5 + rng.random(n) * 0.4
+    theta = rng.uniform(0, 2*np.pi, n)
+    jitter = (rng.random((2, n)) - 0.5) * 0.2
+
+    out[0] = radius * np.cos(theta) + jitter[0]
+    out[1] = radius * np.sin(theta) + jitter[1]
+    out[2] = z * 10 - 0.5
+
+    return out
+
+
+# 装饰球之间的最小间距
+DECORATION_SPACING = 0.35
+
+# 网格格子编号 (cx, cy, cz) 压成一个整数 cx * 2^42 + cy * 2^21 + cz
+_CELL_BITS = 21
+_CELL_SHIFTS = np.array([2 * _CELL_BITS, _CELL_BITS, 0], dtype=np.int64)[:, None]
+# 2x2x2 个格子：每个轴上取 0（本格）或 1（靠近的那个相邻格）
+_CORNERS = np.array([[(i >> axis) & 1 for axis in (2, 1, 0)] for i in range(8)], dtype=np.int64)
+# sample_spaced 每批最少的候选数
+_BATCH = 256
+
+
+def _grid_cells(xyz, min_dist):
+    """
+    每个点所在的格子编号 (m,)，和要检查的 2x2x2 个格子 (8, m)：本格和每个轴上
+    靠近它的那一侧相邻格（格子边长 2 * min_dist）
+    """
+    scaled = xyz / (2 * min_dist)
+    cells = np.floor(scaled)
+    # 每个轴上靠近的一侧：-1 或 +1；格子坐标加偏移变成非负数，压缩后的编号互不冲突
+    side = np.where(scaled - cells < 0.5, -1, 1)
+    cells = cells.astype(np.int64) + (1 << _CELL_BITS - 1)
+    home = (cells << _CELL_SHIFTS).sum(axis=0)
+    return home, home + _CORNERS @ (side << _CELL_SHIFTS)
+
+
+def _close_pairs(xyz, near, ref_xyz, ref_cells, min_dist2):
+    """
+    xyz (3, m) 里每个点和 ref_xyz (3, k) 里距离小于 min_dist 的点，返回 (点编号, 参考点编号)。
+    ref_cells 是参考点的格子编号，要求已排序：每个格子里的点是一段连续区间，用二分查找
+    """
+    if not len(ref_cells):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    cells, first, size = np.unique(ref_cells, return_index=True, return_counts=True)
+    found = np.minimum(np.searchsorted(cells, near.ravel()), len(cells) - 1)
+    counts = np.where(cells[found] == near.ravel(), size[found], 0)
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # 每个 (点, 格子) 展开成格子里的每个参考点
+    query = np.repeat(np.tile(np.arange(xyz.shape[1]), len(near)), counts)
+    ref = np.repeat(first[found] - np.cumsum(counts) + counts, counts) + np.arange(total)
+    d2 = np.zeros(total)
+    for axis in range(3):
+        d2 += (xyz[axis, query] - ref_xyz[axis, ref]) ** 2
+    close = d2 < min_dist2
+    return query[close], ref[close]
+
+
+def _first_new(candidates, chosen):
+    """去掉重复和已经选中的编号，保持第一次出现的顺序"""
+    _, first = np.unique(candidates, return_index=True)
+    candidates = candidates[np.sort(first)]
+    return candidates[~np.isin(candidates, chosen)]
+
+
+def sample_spaced(points, n, min_dist=0.0, rng=None, max_attempts=30):
+    """
+    从 points (3, N) 里挑 n 个不重复的编号，两两距离尽量不小于 min_dist
+
+    每次取一批候选编号，整批检查间距：已选中的点按边长 2 * min_dist 的格子排序，
+    距离小于 min_dist 的点只可能在候选点所在格子和每个轴上靠近它的那一侧相邻格里，
+    所以每个候选只二分查找 2x2x2 个格子。同一批里按顺序取舍，和更早入选的候选
+    太近的不要，结果和一个一个扔飞镖一样。N 很大时有放回地抽候选（去掉重复的），
+    只读取候选点的坐标，耗时和 n 有关、和 N 无关，不用像 choice(replace=False)
+    那样打乱全部编号；N 不超过 max_attempts * n 时按一个随机排列每个点只试一次。
+    试了 max_attempts * n 个候选还不够时（树太小或间距太大），剩下的名额不再
+    检查间距；n 超过 N 时编号会重复。min_dist 为 0 时只去重。
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    total = points.shape[1]
+    if n and not total:
+        raise ValueError("没有可以挑选的粒子")
+
+    chosen = np.empty(0, dtype=np.int64)
+    chosen_xyz = np.empty((3, 0))
+    chosen_cells = np.empty(0, dtype=np.int64)
+    min_dist2 = min_dist * min_dist
+    limit = max_attempts * n
+    # 粒子不比能试的候选多时，按一个随机排列每个点试一次，不会反复抽到已经淘汰的点
+    permutation = rng.permutation(total) if total <= limit else None
+    tries = limit if permutation is None else total
+    attempts = 0
+    while len(chosen) < n and attempts < tries:
+        # 整批检查的固定开销比多试几个候选贵，每批至少 _BATCH 个
+        batch = min(max(2 * (n - len(chosen)), _BATCH), tries - attempts)
+        if permutation is not None:
+            candidates = permutation[attempts:attempts + batch]
+        else:
+            candidates = _first_new(rng.integers(0, total, batch), chosen)
+        attempts += batch
+        if min_dist > 0 and len(candidates):
+            xyz = np.asarray(points[:, candidates], dtype=np.float64)
+            home, near = _grid_cells(xyz, min_dist)
+            # 先去掉和已选中的点太近的候选，树快填满时大部分候选在这一步就被淘汰
+            free = np.ones(len(candidates), dtype=bool)
+            free[_close_pairs(xyz, near, chosen_xyz, chosen_cells, min_dist2)[0]] = False
+            candidates, xyz, home, near = candidates[free], xyz[:, free], home[free], near[:, free]
+            # 同一批里太近的候选对 (后, 前)
+            order = np.argsort(home, kind="stable")
+            later, earlier = _close_pairs(xyz, near, xyz[:, order], home[order], min_dist2)
+            earlier = order[earlier]
+            later, earlier = later[earlier < later], earlier[earlier < later]
+            # 按顺序取舍：和更早入选的候选太近的不要。前面的定下来后面的才定得下来，迭代到不再变化
+            keep = np.ones(len(candidates), dtype=bool)
+            while True:
+                new_keep = np.ones(len(candidates), dtype=bool)
+                new_keep[later[keep[earlier]]] = False
+                if np.array_equal(new_keep, keep):
+                    break
+                keep = new_keep
+            keep[np.flatnonzero(keep)[n - len(chosen):]] = False
+            candidates = candidates[keep]
+            chosen_xyz = np.concatenate([chosen_xyz, xyz[:, keep]], axis=1)
+            chosen_cells = np.concatenate([chosen_cells, home[keep]])
+            order = np.argsort(chosen_cells, kind="stable")
+            chosen_xyz, chosen_cells = chosen_xyz[:, order], chosen_cells[order]
+        chosen = np.concatenate([chosen, candidates[:n - len(chosen)]])
+
+    rest = n - len(chosen)
+    if rest and total - len(chosen) > rest:
+        # 还有足够多没用过的点：继续抽，只去重
+        while len(chosen) < n:
+            extra = _first_new(rng.integers(0, total, 2 * (n - len(chosen))), chosen)
+            chosen = np.concatenate([chosen, extra[:n - len(chosen)]])
+    elif rest:
+        # 剩下的点不够（这时 N 不超过 n）：全部用上，再有放回地补齐
+        unused = np.setdiff1d(np.arange(total), chosen)
+        chosen = np.concatenate([chosen, rng.permutation(unused), rng.integers(0, total, n - len(chosen) - len(unused))])
+    return chosen.astype(np.int64)
+
+
+def generate_decorations(tree, n=400, rng=None, out=None, min_dist=DECORATION_SPACING):
+    """从树的粒子中挑出 n 个（相互间距至少 min_dist），稍微向外偏移作为装饰球"""
+    if rng is None:
+        rng = np.random.default_rng()
+    out = _positions_out(n, out)
+
+    indices = sample_spaced(tree, n, min_dist, rng)
+    out[0] = tree[0, indices] * 1.1
+    out[1] = tree[1, indices] * 1.1
+    out[2] = tree[2, indices]
+
+    return out
+
+
+def generate_3d_heart(n=1200, scale=0.5, z_top=10.2, rng=None, out=None):
+    """
+    生成真正 3D 立体五角星（用于树顶）
+
+    五角星被拆成 10 个以中心为顶点的三角形，一次性批量抽取所有三角形编号和
+    重心坐标 (a, b)，a + b > 1 的点用掩码整体翻折回三角形内。
+    传入 numpy.random.Generator 可以得到可复现的结果。
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    out = _positions_out(n, out)
+
+    star_x_2d, star_z_2d = star_outline()
+
+    # 五角星厚度
+    thickness = 0.12
+
+    # 随机选三角形：中心 - 顶点 idx - 顶点 idx+1
+    idx = rng.integers(0, 10, n)
+    next_idx = (idx + 1) % 10
+
+    # 三角形内均匀采样：落在另一半的点关于 a + b = 1 翻折
+    ab = rng.random((n, 2))
+    flip = ab.sum(axis=1) > 1
+    ab[flip] = 1 - ab[flip]
+    a = ab[:, 0]
+    b = ab[:, 1]
+
+    pts_x = a * star_x_2d[idx] + b * star_x_2d[next_idx]
+    pts_z = a * star_z_2d[idx] + b * star_z_2d[next_idx]
+
+    # Y 方向厚度（制造立体感）
+    pts_y = rng.uniform(-thickness, thickness, n)
+
+    # 缩放 + 噪声 + 平移到树顶
+    noise = rng.normal(0, 0.01, (3, n))
+    out[0] = pts_x * scale + noise[0]
+    out[1] = pts_y * scale + noise[1]
+    out[2] = pts_z * scale + noise[2]
+
+    # 调整 z 到树顶
+    if n:
+        out[2] -= out[2].min() - z_top
+
+    return out
+
+
+def generate_ground(n=3500, rng=None, out=None):
+    """带波纹的圆形地面"""
+    if rng is None:
+        rng = np.random.default_rng()
+    out = _positions_out(n, out)
+
+    r = np.sqrt(rng.random(n)) * 8
+    theta = rng.random(n) * 2 * np.pi
+
+    wave1 = np.sin(r * 1.2) * 0.2
+    wave2 = np.sin(theta * 3 + r * 1.5) * 0.1
+
+    out[0] = r * np.cos(theta)
+    out[1] = r * np.sin(theta)
+    out[2] = wave1 + wave2 - 1
+
+    return out
+
+
+def generate_snow(n=1500, rng=None, out=None):
+    """场景上空的雪花"""
+    if rng is None:
+        rng = np.random.default_rng()
+    out = _positions_out(n, out)
+
+    out[0] = rng.uniform(-11, 11, n)
+    out[1] = rng.uniform(-11, 11, n)
+    out[2] = rng.uniform(0, 12, n)
+
+    return out
+
+
+def generate_stars(n=80, rng=None, out=None):
+    """高处的星空背景"""
+    if rng is None:
+        rng = np.random.default_rng()
+    out = _positions_out(n, out)
+
+    out[0] = rng.uniform(-10, 10, n)
+    out[1] = rng.uniform(-10, 10, n)
+    out[2] = rng.uniform(8, 12, n)
+
+    return out
+
+
+def sample_visible(generate, n, visible, rng=None, out=None, max_rounds=100):
+    """
+    只在可见区域里生成：反复调用 generate(k, rng=rng)，留下 visible(positions) 为真的点，
+    凑满 n 个为止。分布和 generate 一样，只是去掉了看不见的部分，粒子数全部花在画面里
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    out = _positions_out(n, out)
+
+    filled = 0
+    for _ in range(max_rounds):
+        if filled == n:
+            return out
+        points = generate(max(2 * (n - filled), 64), rng=rng)
+        points = points[:, visible(points)][:, :n - filled]
+        out[:, filled:filled + points.shape[1]] = points
+        filled += points.shape[1]
+    if filled < n:
+        raise ValueError("可见区域里几乎生成不出粒子")
+    return out
+
+# ==============================
+# 树的颜色
+# ==============================
+def create_tree_colors(z, theme_colors, out=None, alpha=None, z_range=None):
+    """
+    按高度在主题的 tree_base → tree_tip 之间线性插值，返回 float32 颜色数组
+
+    默认返回 (N,3)；给出 alpha 时返回 (N,4)。传入预分配的 out（(N,3) 或 (N,4)
+    float32）则直接写入 out，动画逐帧换色时不再分配内存。
+    分块上色时用 z_range=(最低, 最高) 给出整棵树的高度范围。
+    """
+    z = np.asarray(z)
+    if out is None:
+        out = np.empty((len(z), 3 if alpha is None else 4), dtype=np.float32)
+
+    base = np.asarray(theme_colors["tree_base"], dtype=np.float32)
+    delta = np.asarray(theme_colors["tree_tip"], dtype=np.float32) - base
+
+    # 归一化高度 t 先暂存在第 0 列，最后一个通道再原地覆盖它
+    t = out[:, 0]
+    if len(z):
+        z_min, z_max = (z.min(), z.max()) if z_range is None else z_range
+        span = z_max - z_min
+        np.subtract(z, z_min, out=t, casting="unsafe")
+        if span > 0:
+            t *= 1 / span
+        else:
+            t[:] = 0
+
+    for c in (2, 1, 0):
+        np.multiply(t, delta[c], out=out[:, c])
+        out[:, c] += base[c]
+
+    if out.shape[1] == 4 and alpha is not None:
+        out[:, 3] = alpha
+
+    return out
+
+# ==============================
+# 粒子场景（结构数组）
+# ==============================
+def hex_to_rgb(color):
+    """'#RRGGBB' → (r, g, b)，取值 0~1"""
+    color = color.lstrip("#")
+    return tuple(int(color[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+class ParticleScene:
+    """
+    整个场景的粒子数据
+
+    所有图层共用三块连续缓冲区：positions 为 (3, N) float32（x, y, z 各一行），
+    colors 为 (N, 4) float32 RGBA，sizes 为 (N,) float32。slices 记录每个图层
+    在缓冲区中的位置，layer() 返回的都是视图，不复制数据。
+    也可以传入已有的缓冲区（例如 scenefile 打开的 np.memmap），形状必须一致。
+    """
+
+    def __init__(self, counts, positions=None, colors=None, sizes=None, palette_index=None):
+        self.slices = {}
+        start = 0
+        for name in LAYERS:
+            n = counts.get(name, 0)
+            self.slices[name] = slice(start, start + n)
+            start += n
+
+        self.positions = np.zeros((3, start), dtype=np.float32) if positions is None else positions
+        self.colors = np.zeros((start, 4), dtype=np.float32) if colors is None else colors
+        self.sizes = np.zeros(start, dtype=np.float32) if sizes is None else sizes
+        # 每个装饰球在调色板中的编号，换主题时只需重新查表
+        if palette_index is None:
+            palette_index = np.zeros(counts.get("decorations", 0), dtype=np.uint8)
+        self.palette_index = palette_index
+
+    def __len__(self):
+        return self.sizes.shape[0]
+
+    def count(self, name):
+        sl = self.slices[name]
+        return sl.stop - sl.start
+
+    def layer(self, name):
+        """返回图层的 (positions, colors, sizes) 视图"""
+        sl = self.slices[name]
+        return self.positions[:, sl], self.colors[sl], self.sizes[sl]
+
+    def copy(self):
+        """深拷贝（动画会原地修改雪花坐标，缓存里的场景要先复制）"""
+        scene = ParticleScene.__new__(ParticleScene)
+        scene.slices = dict(self.slices)
+        scene.positions = self.positions.copy()
+        scene.colors = self.colors.copy()
+        scene.sizes = self.sizes.copy()
+        scene.palette_index = self.palette_index.copy()
+        return scene
+
+    @property
+    def nbytes(self):
+        return self.positions.nbytes + self.colors.nbytes + self.sizes.nbytes + self.palette_index.nbytes
+
+
+def min_max(values, chunk=None):
+    """分块求 (最小值, 最大值)，空数组返回 None"""
+    if len(values) == 0:
+        return None
+    lows, highs = zip(*((values[sl].min(), values[sl].max()) for sl in chunk_slices(len(values), chunk)))
+    return min(lows), max(highs)
+
+
+# 地面、雪花、星空是纯色：(主题里的颜色名, 透明度)
+FLAT_COLORS = {"ground": ("ground", 0.7), "snow": ("snow", 0.8), "stars": ("snow", 0.6)}
+
+
+def color_layer(name, positions, colors, theme_colors, palette_index=None, chunk=None, z_range=None):
+    """
+    按主题写入一个图层的颜色；装饰球需要 palette_index，树的渐变按整个图层的高度范围计算
+    （只给一段树上色时用 z_range 给出整棵树的范围）
+    """
+    if name == "tree":
+        if z_range is None:
+            z_range = min_max(positions[2], chunk)
+        for sl in chunk_slices(len(colors), chunk):
+            create_tree_colors(positions[2, sl], theme_colors, out=colors[sl], alpha=0.9, z_range=z_range)
+
+    elif name == "decorations":
+        palette = np.array([hex_to_rgb(c) for c in theme_colors["decorations"]], dtype=np.float32)
+        colors[:, :3] = palette[palette_index % len(palette)]
+        colors[:, 3] = 0.9
+
+    elif name == "topper":
+        # 树顶金色，越靠近中心越亮
+        colors[:, :3] = (1.0, 0.84, 0.0)
+        for sl in chunk_slices(len(colors), chunk):
+            x, y, z = positions[:, sl]
+            dist_center = np.sqrt(x**2 + (z - 10.2)**2 + y**2)
+            heart_alpha = 0.8 * np.exp(- (dist_center**2) / (2*(0.5**2))) + 0.3
+            colors[sl, 3] = np.clip(heart_alpha, 0.2, 0.95)
+
+    else:
+        key, alpha = FLAT_COLORS[name]
+        colors[:, :3] = hex_to_rgb(theme_colors[key])
+        colors[:, 3] = alpha
+
+
+def color_scene(scene, theme_colors, chunk=None):
+    """按主题写入所有图层的颜色（不改变坐标和大小）；给出 chunk 时逐块处理，临时内存只和块大小有关"""
+    for name in LAYERS:
+        positions, colors, _ = scene.layer(name)
+        color_layer(name, positions, colors, theme_colors, scene.palette_index, chunk)
+
+
+def build_scene(n_tree=6000, n_snow=1500, theme_colors=None, n_decorations=400, n_topper=800,
+                n_ground=3500, n_stars=80, topper_scale=0.7, topper_z=9.6, rng=None):
+    """生成完整场景：各图层直接写入 ParticleScene 的缓冲区"""
+    if rng is None:
+        rng = np.random.default_rng()
+    if theme_colors is None:
+        theme_colors = get_theme_colors("经典绿色")
+
+    scene = ParticleScene({
+        "tree": n_tree,
+        "decorations": n_decorations,
+        "topper": n_topper,
+        "ground": n_ground,
+        "snow": n_snow,
+        "stars": n_stars,
+    })
+
+    tree, _, tree_sizes = scene.layer("tree")
+    with stage("tree"):
+        generate_tree(n_tree, rng=rng, out=tree)
+        tree_sizes[:] = 4
+
+    deco, _, deco_sizes = scene.layer("decorations")
+    with stage("decorations"):
+        generate_decorations(tree, n_decorations, rng=rng, out=deco)
+        scene.palette_index[:] = rng.integers(0, len(theme_colors["decorations"]), n_decorations)
+        deco_sizes[:] = rng.uniform(10, 18, n_decorations)
+
+    topper, _, topper_sizes = scene.layer("topper")
+    with stage("topper"):
+        generate_3d_heart(n_topper, scale=topper_scale, z_top=topper_z, rng=rng, out=topper)
+        topper_sizes[:] = 4
+
+    ground, _, ground_sizes = scene.layer("ground")
+    with stage("ground"):
+        generate_ground(n_ground, rng=rng, out=ground)
+        ground_sizes[:] = 2
+
+    snow, _, snow_sizes = scene.layer("snow")
+    with stage("snow"):
+        generate_snow(n_snow, rng=rng, out=snow)
+        snow_sizes[:] = rng.uniform(3, 5, n_snow)
+
+    stars, _, star_sizes = scene.layer("stars")
+    with stage("stars"):
+        generate_stars(n_stars, rng=rng, out=stars)
+        star_sizes[:] = rng.uniform(1, 3, n_stars)
+
+    with stage("colors"):
+        color_scene(scene, theme_colors)
+    return scene
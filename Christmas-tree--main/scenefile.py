@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+磁盘上的场景文件：生成一次、渲染多次，粒子数不受内存限制
+
+文件格式（小端）：
+    HEADER        魔数、版本、6 个图层的粒子数、4 个数组的偏移量、元数据长度
+    元数据        UTF-8 JSON（生成参数、主题等）
+    positions     (3, N) float32，x、y、z 各一行
+    colors        (N, 4) float32 RGBA
+    sizes         (N,) float32
+    palette_index (装饰球数,) uint8
+每个数组从 ALIGN 字节对齐的位置开始，布局和 ParticleScene 的缓冲区完全一样，
+所以 open_scene() 用 np.memmap 打开后直接就是一个 ParticleScene，渲染代码不用改。
+
+生成时每个图层分块写入 memmap，临时内存只和块大小、线程数有关；
+同样的种子总是得到同样的文件，和线程数无关，也和 SceneGraph 生成的场景一样。
+
+用法: python scenefile.py generate tree.scene --n-tree 20000000 --n-snow 2000000 [--workers 4]
+      python scenefile.py render tree.scene tree.png [--width 2400 --height 2800]
+"""
+
+import argparse
+import json
+import resource
+import struct
+import time
+import tracemalloc
+
+import numpy as np
+
+from scene import LAYERS, ParticleScene, get_theme_colors
+from scenegraph import BLOCK, BLOCK_LAYERS, block_tasks, color_tasks, fixed_layer, layer_rng, run_tasks
+from timing import stage
+
+MAGIC = b"XMSCENE\0"
+VERSION = 1
+HEADER = struct.Struct("<8sI6Q4QI")
+ALIGN = 64
+
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def layout(counts, meta_bytes=0):
+    """返回 (positions, colors, sizes, palette_index 的偏移量, 文件总字节数)"""
+    n = sum(counts.get(name, 0) for name in LAYERS)
+    offsets = []
+    end = HEADER.size + meta_bytes
+    for nbytes in (3 * n * 4, n * 16, n * 4, counts.get("decorations", 0)):
+        offsets.append(_align(end))
+        end = offsets[-1] + nbytes
+    return offsets, end
+
+
+def _map(path, mode, counts, offsets):
+    n = sum(counts.get(name, 0) for name in LAYERS)
+    shapes = ((3, n), (n, 4), (n,), (counts.get("decorations", 0),))
+    dtypes = (np.float32, np.float32, np.float32, np.uint8)
+    arrays = []
+    for offset, shape, dtype in zip(offsets, shapes, dtypes):
+        if 0 in shape:
+            # np.memmap 不能映射 0 字节
+            arrays.append(np.zeros(shape, dtype=dtype))
+        else:
+            arrays.append(np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=shape))
+    scene = ParticleScene(counts, *arrays)
+    return scene
+
+
+def create_scene_file(path, counts, meta=None):
+    """创建文件并写好文件头，返回可写的 memmap ParticleScene（内容全为 0）"""
+    counts = {name: counts.get(name, 0) for name in LAYERS}
+    meta_bytes = json.dumps(meta or {}, ensure_ascii=False).encode("utf-8")
+    offsets, size = layout(counts, len(meta_bytes))
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, *(counts[name] for name in LAYERS), *offsets, len(meta_bytes)))
+        f.write(meta_bytes)
+        f.truncate(size)
+    scene = _map(path, "r+", counts, offsets)
+    scene.meta = meta or {}
+    return scene
+
+
+def open_scene(path, mode="r"):
+    """用 np.memmap 打开场景文件；mode="r+" 时可以原地修改（例如换主题重新上色）"""
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path} 不是场景文件")
+        magic, version, *rest = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} 不是场景文件")
+        if version != VERSION:
+            raise ValueError(f"不支持的场景文件版本 {version}")
+        counts = dict(zip(LAYERS, rest[:len(LAYERS)]))
+        offsets = rest[len(LAYERS):len(LAYERS) + 4]
+        meta = json.loads(f.read(rest[-1]).decode("utf-8"))
+    scene = _map(path, mode, counts, offsets)
+    scene.meta = meta
+    return scene
+
+
+def write_scene(path, n_tree=6000, n_snow=1500, theme="经典绿色", n_decorations=400, n_topper=800,
+                n_ground=3500, n_stars=80, topper_scale=0.7, topper_z=9.6, seed=None, workers=1):
+    """
+    和 SceneGraph(seed).update(...) 一样的场景，逐块生成直接写进文件，返回打开的 memmap 场景
+
+    树、地面、雪花、星空按 scenegraph.BLOCK 分块，每块一个随机数子流，各块由 workers 个
+    线程并行生成、上色；装饰球要从整棵树里挑选，等树生成完再一次生成。
+    """
+    theme_colors = get_theme_colors(theme)
+    entropy = np.random.SeedSequence(seed).entropy
+    counts = dict(tree=n_tree, decorations=n_decorations, topper=n_topper,
+                  ground=n_ground, snow=n_snow, stars=n_stars)
+    # 记下实际用的熵，seed 为 None 时也能复现
+    meta = dict(theme=theme, seed=seed, entropy=entropy, topper_scale=topper_scale, topper_z=topper_z)
+    scene = create_scene_file(path, counts, meta)
+
+    def fixed(name, params):
+        positions, sizes, palette_index = fixed_layer(name, params, layer_rng(entropy, name),
+                                                      scene.layer("tree")[0])
+        out_positions, _, out_sizes = scene.layer(name)
+        out_positions[:] = positions
+        out_sizes[:] = sizes
+        if palette_index is not None:
+            scene.palette_index[:] = palette_index
+
+    with stage("generate"):
+        tasks = [lambda: fixed("topper", (n_topper, topper_scale, topper_z))]
+        for name in BLOCK_LAYERS:
+            positions, _, sizes = scene.layer(name)
+            tasks += block_tasks(name, entropy, positions, sizes, 0, -(-len(sizes) // BLOCK))
+        run_tasks(tasks, workers)
+        fixed("decorations", (n_decorations, n_tree, len(theme_colors["decorations"])))
+
+    with stage("colors"):
+        tasks = []
+        for name in LAYERS:
+            positions, colors, _ = scene.layer(name)
+            tasks += color_tasks(name, positions, colors, theme_colors, scene.palette_index)
+        run_tasks(tasks, workers)
+    for array in (scene.positions, scene.colors, scene.sizes, scene.palette_index):
+        if isinstance(array, np.memmap):
+            array.flush()
+    return scene
+
+
+def peak_rss_mb():
+    """进程的峰值常驻内存（MB），包括 memmap 读写过的文件页（内存紧张时系统可以直接丢弃）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成和渲染磁盘上的大场景")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gen = sub.add_parser("generate", help="逐块生成场景文件")
+    gen.add_argument("path")
+    gen.add_argument("--n-tree", type=int, default=6000)
+    gen.add_argument("--n-snow", type=int, default=1500)
+    gen.add_argument("--n-ground", type=int, default=3500)
+    gen.add_argument("--n-decorations", type=int, default=400)
+    gen.add_argument("--n-topper", type=int, default=800)
+    gen.add_argument("--theme", default="经典绿色")
+    gen.add_argument("--seed", type=int)
+    gen.add_argument("--workers", type=int, default=1, help="生成线程数")
+    ren = sub.add_parser("render", help="用 NumPy 光栅化渲染场景文件")
+    ren.add_argument("path")
+    ren.add_argument("output")
+    ren.add_argument("--width", type=int, default=1200)
+    ren.add_argument("--height", type=int, default=1400)
+    args = parser.parse_args()
+
+    # tracemalloc 只统计 NumPy 分配的临时数组，不包括映射的文件
+    tracemalloc.start()
+    start = time.perf_counter()
+    if args.command == "generate":
+        scene = write_scene(args.path, args.n_tree, args.n_snow, args.theme, args.n_decorations, args.n_topper,
+                            args.n_ground, seed=args.seed, workers=args.workers)
+        print(f"🎄 {len(scene):,} 个粒子 → {args.path}（{scene.nbytes / 2**20:.0f} MB）")
+    else:
+        import raster
+        scene = open_scene(args.path)
+        theme = scene.meta.get("theme", "经典绿色")
+        # 和静态图一样按 12x14 英寸计算点的大小
+        dpi = min(args.width / 12, args.height / 14)
+        camera = raster.Camera(args.width, args.height, dpi=dpi)
+        with open(args.output, "wb") as f:
+            f.write(raster.render_png(scene, get_theme_colors(theme), camera))
+        print(f"🖼️ {len(scene):,} 个粒子 → {args.output}（{args.width}x{args.height}）")
+    print(f"用时 {time.perf_counter() - start:.1f} 秒，临时内存峰值 {tracemalloc.get_traced_memory()[1] / 2**20:.0f} MB，"
+          f"常驻内存峰值 {peak_rss_mb():.0f} MB（含文件页）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+增量场景图：每个图层记录生成它的参数，参数变化时只重做受影响的图层
+
+    graph = SceneGraph(seed=2024)
+    scene = graph.update(n_tree=3000, n_snow=800, theme_colors=...)   # 第一次：全部生成
+    scene = graph.update(n_tree=3000, n_snow=900, theme_colors=...)   # 只追加 100 片雪花
+
+给出 view=(elev, azim) 时地面、雪花和星空只在这个视角的画面里生成（见 cull.py），
+粒子数全部花在看得见的地方；不给出时生成完整场景（交互式 3D、动画要转动视角）。
+
+随机数流：一个根 SeedSequence，每个图层按图层编号派生一个子流；数量可变的图层
+（树、地面、雪花、星空）再按 BLOCK 个粒子分块，每块一个子流，所以 n 个粒子
+总是 n+k 个粒子的前缀：数量变大只生成新增的块，变小直接截断。装饰球从树里挑选，
+树的数量变了才重新生成；五角星按整体最低点对齐树顶，参数变了整层重新生成。
+换主题只重新上色，不重新采样。
+
+每块的内容只取决于种子和块号，所以各块可以交给线程池并行生成、上色（NumPy
+在大数组运算和随机数填充时释放 GIL），每个任务只写自己的数组区间。同样的种子、
+视角和参数，不管之前经过了哪些更新、用几个线程，得到的场景完全一样。
+scenefile.write_scene 用同样的随机数流，生成的文件和 SceneGraph 的场景一致。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from cull import visible_region
+from scene import (LAYERS, ParticleScene, color_layer, generate_3d_heart, generate_decorations,
+                   generate_ground, generate_snow, generate_stars, generate_tree, get_theme_colors,
+                   min_max, sample_visible)
+from timing import stage
+
+# 可变数量图层每块的粒子数：太小的话每块几次 NumPy 调用的固定开销占比太高
+BLOCK = 4096
+
+# 一个线程任务处理的粒子数
+TASK = 16 * BLOCK
+
+
+def _generate(generate, n, rng, visible):
+    return generate(n, rng=rng) if visible is None else sample_visible(generate, n, visible, rng)
+
+
+def _tree_block(n, rng, visible=None):
+    # 树总是整棵在画面里
+    return generate_tree(n, rng=rng), np.full(n, 4, dtype=np.float32)
+
+
+def _ground_block(n, rng, visible=None):
+    return _generate(generate_ground, n, rng, visible), np.full(n, 2, dtype=np.float32)
+
+
+def _snow_block(n, rng, visible=None):
+    return _generate(generate_snow, n, rng, visible), rng.uniform(3, 5, n).astype(np.float32)
+
+
+def _stars_block(n, rng, visible=None):
+    return _generate(generate_stars, n, rng, visible), rng.uniform(1, 3, n).astype(np.float32)
+
+
+# 按块生成的图层：每块返回 ((3, BLOCK) 坐标, (BLOCK,) 大小)；visible 是可见判断或 None
+BLOCK_LAYERS = {"tree": _tree_block, "ground": _ground_block, "snow": _snow_block, "stars": _stars_block}
+
+
+def layer_rng(entropy, name, block=None):
+    """图层 name（第 block 块）的随机数生成器"""
+    key = (LAYERS.index(name),) if block is None else (LAYERS.index(name), block)
+    return np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=key))
+
+
+def block_tasks(name, entropy, positions, sizes, first_block, stop_block, visible=None):
+    """
+    把第 first_block 到 stop_block 块写进 positions / sizes（整个图层的数组）的任务列表，
+    每个任务 TASK 个粒子。数组长度不是 BLOCK 的整数倍时最后一块只写前面一部分
+    """
+    generate = BLOCK_LAYERS[name]
+
+    def task(start, stop):
+        for block in range(start, stop):
+            sl = slice(block * BLOCK, min((block + 1) * BLOCK, len(sizes)))
+            block_positions, block_sizes = generate(BLOCK, layer_rng(entropy, name, block), visible)
+            positions[:, sl] = block_positions[:, :sl.stop - sl.start]
+            sizes[sl] = block_sizes[:sl.stop - sl.start]
+
+    step = TASK // BLOCK
+    return [lambda start=start: task(start, min(start + step, stop_block))
+            for start in range(first_block, stop_block, step)]
+
+
+def fixed_layer(name, params, rng, tree):
+    """装饰球和五角星整层生成，返回 (坐标, 大小, 调色板编号或 None)；tree 是整棵树的坐标"""
+    if name == "decorations":
+        n, n_tree, palette_size = params
+        positions = generate_decorations(tree[:, :n_tree], n, rng=rng)
+        palette_index = rng.integers(0, palette_size, n).astype(np.uint8)
+        return positions, rng.uniform(10, 18, n).astype(np.float32), palette_index
+    n, scale, z_top = params
+    return generate_3d_heart(n, scale=scale, z_top=z_top, rng=rng), np.full(n, 4, dtype=np.float32), None
+
+
+def color_tasks(name, positions, colors, theme_colors, palette_index=None, z_range=None):
+    """给一个图层（或它的一段）上色的任务列表，每个任务 TASK 个粒子；树要给出整棵树的 z_range"""
+    if name == "tree" and z_range is None:
+        z_range = min_max(positions[2])
+
+    def task(sl):
+        color_layer(name, positions[:, sl], colors[sl], theme_colors,
+                    None if palette_index is None else palette_index[sl], z_range=z_range)
+
+    return [lambda sl=slice(start, start + TASK): task(sl) for start in range(0, len(colors), TASK)]
+
+
+def run_tasks(tasks, workers=1):
+    """执行一组互不依赖、各写各的数组区间的任务；workers > 1 时用线程池，结果和顺序执行一样"""
+    if workers > 1 and len(tasks) > 1:
+        with ThreadPoolExecutor(workers) as pool:
+            # list() 等待全部完成，任务里的异常在这里抛出
+            list(pool.map(lambda task: task(), tasks))
+    else:
+        for task in tasks:
+            task()
+
+
+class LayerState:
+    """一个图层当前的数据和生成它的参数；坐标和大小按块预留容量，追加时不用搬动已有数据"""
+
+    def __init__(self, name):
+        self.name = name
+        self.params = None
+        self.count = 0
+        self.positions = np.empty((3, 0), dtype=np.float32)
+        self.sizes = np.empty(0, dtype=np.float32)
+        self.colors = np.empty((0, 4), dtype=np.float32)
+        self.palette_index = np.empty(0, dtype=np.uint8)
+        # colors 的前 colored_count 个是按主题 colored 上好的色
+        self.colored = None
+        self.colored_count = 0
+
+    @property
+    def blocks(self):
+        return self.positions.shape[1] // BLOCK
+
+    def reserve(self, blocks):
+        """容量扩到 blocks 块，保留已有数据"""
+        if blocks <= self.blocks:
+            return
+        have = self.positions.shape[1]
+        positions = np.empty((3, blocks * BLOCK), dtype=np.float32)
+        sizes = np.empty(blocks * BLOCK, dtype=np.float32)
+        colors = np.empty((blocks * BLOCK, 4), dtype=np.float32)
+        positions[:, :have] = self.positions
+        sizes[:have] = self.sizes
+        colors[:have] = self.colors
+        self.positions, self.sizes, self.colors = positions, sizes, colors
+
+
+class SceneGraph:
+    """
+    update() 返回 ParticleScene；last_work 记录最近一次更新每个图层做了什么
+    （例如 {"snow": "追加 100", "colors": "snow"}），没有变化时直接返回上一次的场景。
+    返回的场景不会再被修改，可以放进共享缓存。workers > 1 时用线程池并行生成。
+    """
+
+    def __init__(self, seed=None, view=None, workers=1):
+        self.seed = seed
+        self.view = None if view is None else tuple(view)
+        self.visible = None if view is None else visible_region(view)
+        self.workers = workers
+        # seed 为 None 时从系统取一次熵，之后所有图层都从它派生
+        self.entropy = np.random.SeedSequence(seed).entropy
+        self.layers = {name: LayerState(name) for name in LAYERS}
+        self.scene = None
+        self.last_work = {}
+
+    def _resize_blocks(self, layer, n, tasks):
+        """
+        可变数量图层：只生成还没有的块（任务追加到 tasks），或者截断；截断后多出来的块
+        留着，之后再变大时直接用（同一块的内容总是一样的）
+        """
+        old = layer.count
+        have = layer.blocks
+        need = -(-n // BLOCK)
+        if need > have:
+            layer.reserve(need)
+            tasks += block_tasks(layer.name, self.entropy, layer.positions, layer.sizes, have, need, self.visible)
+        layer.count = n
+        # 树的颜色渐变取决于整棵树的高度范围，数量变了要整层重新上色
+        if layer.name == "tree":
+            layer.colored_count = 0
+        return f"追加 {n - old}" if n > old else f"截断 {old - n}"
+
+    def _regenerate(self, layer, params):
+        """装饰球和五角星：整层重新生成"""
+        tree = self.layers["tree"].positions
+        positions, sizes, palette_index = fixed_layer(layer.name, params, layer_rng(self.entropy, layer.name), tree)
+        layer.positions, layer.sizes = positions, sizes
+        if palette_index is not None:
+            layer.palette_index = palette_index
+        layer.colors = np.empty((len(sizes), 4), dtype=np.float32)
+        layer.count = len(sizes)
+        layer.colored_count = 0
+        return "重新生成"
+
+    def update(self, n_tree=6000, n_snow=1500, theme_colors=None, n_decorations=400, n_topper=800,
+               n_ground=3500, n_stars=80, topper_scale=0.7, topper_z=9.6):
+        """参数和 build_scene 一样；返回更新后的 ParticleScene"""
+        if theme_colors is None:
+            theme_colors = get_theme_colors("经典绿色")
+        params = {
+            "tree": (n_tree,),
+            "decorations": (n_decorations, n_tree, len(theme_colors["decorations"])),
+            "topper": (n_topper, topper_scale, topper_z),
+            "ground": (n_ground,),
+            "snow": (n_snow,),
+            "stars": (n_stars,),
+        }
+        changed = [name for name in LAYERS if self.layers[name].params != params[name]]
+
+        # 先并行生成按块的图层和五角星，装饰球要从生成好的树里挑，放在后面
+        work = {}
+        with stage("generate"):
+            tasks = []
+            for name in changed:
+                layer = self.layers[name]
+                if name in BLOCK_LAYERS:
+                    work[name] = self._resize_blocks(layer, params[name][0], tasks)
+                elif name == "topper":
+                    tasks.append(lambda layer=layer: self._regenerate(layer, params["topper"]))
+                    work[name] = "重新生成"
+            run_tasks(tasks, self.workers)
+            if "decorations" in changed:
+                work["decorations"] = self._regenerate(self.layers["decorations"], params["decorations"])
+        for name in changed:
+            self.layers[name].params = params[name]
+
+        # 换了主题的图层整层上色；主题没变时只给新增的粒子上色
+        recolored = []
+        with stage("colors"):
+            tasks = []
+            for name in LAYERS:
+                layer = self.layers[name]
+                if layer.colored != theme_colors:
+                    layer.colored_count = 0
+                start, n = layer.colored_count, layer.count
+                if start >= n and layer.colored == theme_colors:
+                    continue
+                palette_index = layer.palette_index[start:n] if name == "decorations" else None
+                tasks += color_tasks(name, layer.positions[:, start:n], layer.colors[start:n], theme_colors,
+                                     palette_index)
+                layer.colored = theme_colors
+                layer.colored_count = n
+                recolored.append(name)
+            run_tasks(tasks, self.workers)
+        if recolored:
+            work["colors"] = ", ".join(recolored)
+
+        self.last_work = work
+        if work or self.scene is None:
+            with stage("pack"):
+                self.scene = self._pack(geometry=bool(set(work) - {"colors"}) or self.scene is None)
+        return self.scene
+
+    def _pack(self, geometry):
+        """
+        把各图层拼成 ParticleScene，每个图层的复制是一个任务。只换了颜色时坐标、大小和
+        调色板编号直接沿用上一次的数组（两个场景共用，都不会再被修改），只复制颜色
+        """
+        counts = {name: self.layers[name].count for name in LAYERS}
+        if geometry:
+            scene = ParticleScene(counts)
+            scene.palette_index[:] = self.layers["decorations"].palette_index
+        else:
+            old = self.scene
+            scene = ParticleScene(counts, old.positions, np.empty_like(old.colors), old.sizes, old.palette_index)
+
+        def copy(name):
+            layer = self.layers[name]
+            positions, colors, sizes = scene.layer(name)
+            colors[:] = layer.colors[:layer.count]
+            if geometry:
+                positions[:] = layer.positions[:, :layer.count]
+                sizes[:] = layer.sizes[:layer.count]
+
+        run_tasks([lambda name=name: copy(name) for name in LAYERS], self.workers)
+        return scene
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+独立的 HTTP 渲染接口：不经过 Streamlit，直接按参数返回圣诞树图片，可以嵌进邮件、网页，前面放 CDN
+
+    GET /render?theme=冬季蓝&seed=7&n_tree=5000&elev=25&azim=60&size=medium&format=jpeg
+    GET /healthz
+
+参数和侧边栏一样（范围也一样），都可以省略：n_tree、n_snow、theme、seed、
+elev / azim（视角）、size（large / medium / small 对应 1200×1400 / 600×700 / 300×350）、
+format（png / jpeg / webp）、backend（matplotlib / raster），另外 forest=棵数 渲染森林。
+
+同样的参数总是得到同样的图片，所以响应带内容摘要做的 ETag 和 Cache-Control，
+客户端或 CDN 带 If-None-Match 再来时返回 304、不传图片。最近的图片放在进程内的
+LRU 缓存里；默认参数直接读预渲染图集。渲染交给 RenderService 进程池，在途任务满了
+返回 503 和 Retry-After。连接用 HTTP/1.1 keep-alive：固定大小的线程池只处理已经有请求
+可读的连接，两次请求之间的空闲连接放在 selector 里等，不占线程；空闲超过
+KEEPALIVE_TIMEOUT 秒或者空闲连接超过上限 MAX_IDLE 时关闭，先关最久没用的。连上以后
+还没发过请求的连接单独算，HEADER_TIMEOUT 秒内不发请求就关掉，不会挤掉 keep-alive 连接。
+
+用法: python server.py [--port 8502] [--workers 2] [--threads 32] [--max-idle 256] [--cache-mb 256]
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from atlas import Atlas, DEFAULT_PARAMS, THEMES, VIEWS
+from cache import LRUCache
+from render_service import RenderService, ServiceBusy, shared_service
+from scene import DEFAULT_VIEW
+from timing import RequestTimer, stage
+
+logger = logging.getLogger("christmas_tree.server")
+
+# 和侧边栏一样的尺寸和范围
+SIZES = {"large": 100, "medium": 50, "small": 25}
+RANGES = {
+    "n_tree": (1000, 8000),
+    "n_snow": (200, 2000),
+    "seed": (0, 2**31 - 1),
+    "forest": (0, 48),
+}
+BACKENDS = {"matplotlib": "matplotlib", "raster": "NumPy 光栅化"}
+FORMATS = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+# 同样的参数总是得到同样的图片；代码更新后图片变了，ETag 也跟着变
+CACHE_CONTROL = "public, max-age=86400"
+
+KEEPALIVE_TIMEOUT = 15
+# 新连接等第一个请求的时间
+HEADER_TIMEOUT = 5
+# 保留的空闲 keep-alive 连接数上限，不占线程，只占文件描述符
+MAX_IDLE = 256
+
+
+class BadRequest(ValueError):
+    """参数不合法，返回 400"""
+
+
+def _number(query, name, default, kind=int):
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        value = kind(values[-1])
+    except ValueError:
+        raise BadRequest(f"{name} 不是数字: {values[-1]!r}") from None
+    lo, hi = RANGES.get(name, (None, None))
+    if lo is not None and not lo <= value <= hi:
+        raise BadRequest(f"{name} 应在 {lo} 到 {hi} 之间")
+    return value
+
+
+def _choice(query, name, choices, default):
+    value = query.get(name, [default])[-1]
+    if value not in choices:
+        raise BadRequest(f"{name} 应为 {' / '.join(choices)} 之一")
+    return value
+
+
+def parse_params(query_string):
+    """查询字符串 → (渲染任务参数, 图片格式)；参数不合法时抛出 BadRequest"""
+    query = parse_qs(query_string)
+    elev = _number(query, "elev", DEFAULT_VIEW[0], float)
+    azim = _number(query, "azim", DEFAULT_VIEW[1], float)
+    if not (-90 <= elev <= 90 and -180 <= azim <= 360):
+        raise BadRequest("elev 应在 -90 到 90 之间，azim 应在 -180 到 360 之间")
+    params = dict(
+        n_tree=_number(query, "n_tree", DEFAULT_PARAMS["n_tree"]),
+        n_snow=_number(query, "n_snow", DEFAULT_PARAMS["n_snow"]),
+        n_topper=DEFAULT_PARAMS["n_topper"],
+        theme=_choice(query, "theme", THEMES, THEMES[0]),
+        seed=_number(query, "seed", DEFAULT_PARAMS["seed"]),
+        view=(elev, azim),
+        backend=BACKENDS[_choice(query, "backend", BACKENDS, "matplotlib")],
+        dpi=SIZES[_choice(query, "size", SIZES, "large")],
+        counts=None,
+    )
+    forest = _number(query, "forest", 0)
+    if forest:
+        params["forest"] = forest
+    return params, _choice(query, "format", FORMATS, "png")
+
+
+def encode(png, fmt):
+    """渲染结果是 PNG，其他格式用 Pillow 转一次"""
+    if fmt == "png":
+        return png
+    from PIL import Image
+    output = io.BytesIO()
+    Image.open(io.BytesIO(png)).convert("RGB").save(output, format=fmt.upper(), quality=85)
+    return output.getvalue()
+
+
+def etag_of(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _etag_matches(header, etag):
+    """If-None-Match 可以是 *、逗号分隔的多个 ETag，也可能带弱校验前缀 W/"""
+    if header is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+class ImageServer:
+    """
+    按参数取图片：图集 → 进程内缓存 → 渲染进程池。返回 (图片字节, ETag)，线程安全。
+    cache_mb 是图片缓存的字节预算；另外记住最近 ETAG_ENTRIES 组参数的 ETag，
+    图片被淘汰以后客户端带 If-None-Match 来也不用重新渲染。
+    service 默认是本进程共用的 shared_service()，关闭时留给其他使用者；传进来的随本对象关闭
+    """
+
+    ETAG_ENTRIES = 100_000
+
+    def __init__(self, service=None, cache_mb=256):
+        self._owns_service = service is not None
+        self.service = service or shared_service()
+        self.images = LRUCache(cache_mb * 2**20)
+        # ETag 存成 bytes，LRUCache 才按长度计算预算
+        self.etags = LRUCache(self.ETAG_ENTRIES * 34)
+        self.atlas = Atlas()
+
+    @staticmethod
+    def key(params, fmt):
+        return (fmt,) + tuple(sorted(params.items()))
+
+    def known_etag(self, params, fmt):
+        """之前返回过的 ETag，没有时返回 None"""
+        etag = self.etags.get(self.key(params, fmt))
+        return None if etag is None else etag.decode()
+
+    def _atlas_image(self, params):
+        # 只有默认参数和图集里的固定视角才能用图集
+        if params.get("forest") or any(params[name] != value for name, value in DEFAULT_PARAMS.items()):
+            return None
+        for name, view in VIEWS.items():
+            if tuple(view) == params["view"]:
+                return self.atlas.get(params["theme"], name)
+        return None
+
+    def get(self, params, fmt):
+        key = self.key(params, fmt)
+        body = self.images.get(key)
+        if body is None:
+            with stage("atlas"):
+                png = self._atlas_image(params)
+            if png is None:
+                with stage("render"):
+                    png = self.service.render(params)[0]
+            with stage("encode"):
+                body = encode(png, fmt)
+            self.images.put(key, body)
+        etag = etag_of(body)
+        self.etags.put(key, etag.encode())
+        return body, etag
+
+    def stats(self):
+        service = self.service
+        return dict(workers=service.workers, pending=service.pending, max_pending=service.max_pending,
+                    completed=service.completed, rejected=service.rejected, timed_out=service.timed_out,
+                    cache_items=len(self.images), cache_mb=round(self.images.nbytes / 2**20, 1),
+                    cache_hits=self.images.hits, cache_misses=self.images.misses,
+                    atlas=f"{len(self.atlas.entries)} / {len(THEMES) * len(VIEWS)}")
+
+    def shutdown(self):
+        if self._owns_service:
+            self.service.shutdown()
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1：默认 keep-alive，每个响应都要带 Content-Length
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    server_version = "ChristmasTree/1.0"
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head=False):
+        url = urlsplit(self.path)
+        if url.path == "/healthz":
+            return self._send(HTTPStatus.OK, json.dumps(self.server.images.stats()).encode(),
+                              "application/json", head=head, headers={"Cache-Control": "no-store"})
+        if url.path != "/render":
+            return self._error(HTTPStatus.NOT_FOUND, "只有 /render 和 /healthz", head)
+        try:
+            params, fmt = parse_params(url.query)
+        except BadRequest as e:
+            return self._error(HTTPStatus.BAD_REQUEST, str(e), head)
+
+        images = self.server.images
+        condition = self.headers.get("If-None-Match")
+        # 之前返回过同样的 ETag：不用取图片，直接 304
+        etag = images.known_etag(params, fmt)
+        if etag is not None and _etag_matches(condition, etag):
+            return self._not_modified(etag)
+
+        with RequestTimer("http_render", format=fmt, **params) as timer:
+            try:
+                body, etag = images.get(params, fmt)
+            except ServiceBusy:
+                timer.fields["status"] = 503
+                return self._error(HTTPStatus.SERVICE_UNAVAILABLE, "渲染队列已满，请稍后重试", head,
+                                   {"Retry-After": "1"})
+            except TimeoutError:
+                timer.fields["status"] = 504
+                return self._error(HTTPStatus.GATEWAY_TIMEOUT, "渲染超时", head)
+            timer.fields["status"] = 200
+        if _etag_matches(condition, etag):
+            return self._not_modified(etag)
+        self._send(HTTPStatus.OK, body, FORMATS[fmt], head=head,
+                   headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+    def _not_modified(self, etag):
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", CACHE_CONTROL)
+        self.end_headers()
+
+    def _error(self, status, message, head=False, headers=None):
+        body = json.dumps(dict(error=message), ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8", head, dict(headers or {}, **{
+            "Cache-Control": "no-store"}))
+
+    def _send(self, status, body, content_type, head=False, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+class KeepAliveConnection(RenderHandler):
+    """
+    PooledHTTPServer 的一个连接：构造时不处理请求，有数据可读时由线程池调用 handle_next()
+    处理一个请求，所以两次请求之间不占线程
+    """
+
+    def __init__(self, request, client_address, server):
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.idle_since = time.monotonic()
+        self.requests = 0
+        self.setup()
+
+    def handle_next(self):
+        """处理一个请求，返回连接是否还能继续用"""
+        self.handle_one_request()
+        self.requests += 1
+        return not self.close_connection
+
+    def buffered(self):
+        """rfile 里是否已经有下一个请求（流水线请求已经读进缓冲区，selector 看不到）"""
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    固定大小的线程池处理请求（ThreadingHTTPServer 每个连接开一个新线程，没有上限）。
+    连接空闲时交给一个后台线程用 selector 等下一个请求，有数据可读才交回线程池，
+    空闲连接再多也不会让新请求排队；keep-alive 空闲连接最多 max_idle 个，超出时先关
+    最久没用的。还没发过请求的新连接不算在内，HEADER_TIMEOUT 秒后关闭。images 是共用的 ImageServer
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, images, threads=32, max_idle=MAX_IDLE):
+        super().__init__(address, RenderHandler)
+        self.images = images
+        self.max_idle = max_idle
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="http")
+        # 空闲的 keep-alive 连接和还没发过请求的新连接 {socket: 连接}，按放进来的先后排列；只在后台线程里改
+        self._idle = {}
+        self._fresh = {}
+        self._parked = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._selector = selectors.DefaultSelector()
+        self._wakeup, self._wakeup_send = socket.socketpair()
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+        self._watcher = threading.Thread(target=self._watch_idle, name="http-idle", daemon=True)
+        self._watcher.start()
+
+    def server_bind(self):
+        # 响应头和正文分两次写，关掉 Nagle 算法，keep-alive 连接上的小响应不用等 40 ms
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        # 新连接也可能迟迟不发请求，先放进 selector 等
+        self._park(KeepAliveConnection(request, client_address, self))
+
+    def _serve(self, conn):
+        # 在线程池里处理已经可读的请求，缓冲区里没有下一个请求时把连接交回 selector
+        try:
+            while conn.handle_next():
+                if not conn.buffered():
+                    self._park(conn)
+                    return
+        except Exception:
+            self.handle_error(conn.request, conn.client_address)
+        self._close(conn)
+
+    def _park(self, conn):
+        conn.idle_since = time.monotonic()
+        with self._lock:
+            self._parked.append(conn)
+        self._wakeup_send.send(b"\0")
+
+    def _close(self, conn):
+        try:
+            conn.finish()
+        except OSError:
+            pass
+        self.shutdown_request(conn.request)
+
+    def _watch_idle(self):
+        while not self._closed:
+            for key, _ in self._selector.select(timeout=1):
+                if key.fileobj is self._wakeup:
+                    self._wakeup.recv(4096)
+                    continue
+                self._selector.unregister(key.fileobj)
+                conn = self._idle.pop(key.fileobj, None) or self._fresh.pop(key.fileobj)
+                self._pool.submit(self._serve, conn)
+            with self._lock:
+                parked, self._parked = self._parked, []
+            for conn in parked:
+                self._selector.register(conn.request, selectors.EVENT_READ, conn)
+                (self._idle if conn.requests else self._fresh)[conn.request] = conn
+            # 空闲连接超过上限时先关最久没用的，空闲太久的也关掉
+            self._expire(self._idle, KEEPALIVE_TIMEOUT, self.max_idle)
+            self._expire(self._fresh, HEADER_TIMEOUT)
+
+    def _expire(self, conns, timeout, limit=None):
+        now = time.monotonic()
+        while conns:
+            sock, conn = next(iter(conns.items()))
+            if (limit is None or len(conns) <= limit) and now - conn.idle_since < timeout:
+                break
+            self._selector.unregister(sock)
+            del conns[sock]
+            self._close(conn)
+
+    def server_close(self):
+        super().server_close()
+        self._closed = True
+        self._wakeup_send.send(b"\0")
+        self._watcher.join()
+        for conn in list(self._idle.values()) + list(self._fresh.values()) + self._parked:
+            self._close(conn)
+        self._selector.close()
+        self._wakeup.close()
+        self._wakeup_send.close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.images.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="圣诞树图片 HTTP 接口")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--workers", type=int, help="渲染进程数（默认环境变量 RENDER_WORKERS，没有时 2 个）")
+    parser.add_argument("--max-pending", type=int, help="排队和正在渲染的任务上限（默认每个进程 4 个）")
+    parser.add_argument("--threads", type=int, default=32, help="处理请求的线程数")
+    parser.add_argument("--max-idle", type=int, default=MAX_IDLE, help="保留的空闲 keep-alive 连接数上限")
+    parser.add_argument("--cache-mb", type=int, default=256, help="图片缓存上限 (MB)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    images = ImageServer(RenderService(args.workers, args.max_pending), args.cache_mb)
+    server = PooledHTTPServer((args.host, args.port), images, args.threads, args.max_idle)
+    logger.info("在 http://%s:%d/render 提供图片（%d 个渲染进程，%d 个请求线程）",
+                args.host, args.port, images.service.workers, args.threads)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,9 @@ set STREAMLIT_SERVER_HEADLESS=true
 set STREAMLIT_SERVER_ENABLE_CORS=false
 set STREAMLIT_SERVER_ENABLE_XSRF_PROTECTION=false
 
+REM 编译字节码、建 matplotlib 字体缓存、预渲染图集，已经做过的话立即跳过
+python deploy.py --prepare
+
 REM 启动Streamlit应用
 echo 正在启动服务器...
 streamlit run streamlit_app.py --server.headless=true --server.port=8501 --server.address=0.0.0.0
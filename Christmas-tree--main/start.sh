@@ -9,6 +9,9 @@ export STREAMLIT_SERVER_HEADLESS=true
 export STREAMLIT_SERVER_ENABLE_CORS=false
 export STREAMLIT_SERVER_ENABLE_XSRF_PROTECTION=false
 
+# 编译字节码、建 matplotlib 字体缓存、预渲染图集，已经做过的话立即跳过
+python deploy.py --prepare
+
 # 启动Streamlit应用
 echo "正在启动服务器..."
 streamlit run streamlit_app.py \
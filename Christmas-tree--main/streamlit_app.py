@@ -1,9 +1,21 @@
+# 启动时只导入轻量的模块：matplotlib 要等第一次真正用它渲染或导出动画时才导入，
+# 冷启动的第一个访问者不用等它（字体缓存由 python deploy.py --prepare 提前建好）
 import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-import random
-import math
-import io
+import streamlit.components.v1 as components
+import logging
+
+from concurrent.futures import TimeoutError, wait
+
+from scene import get_theme_colors
+from cache import LRUCache
+from atlas import Atlas, DEFAULT_PARAMS, THEMES, VIEWS, bundled_image
+from render_service import ServiceBusy, graph_for, scene_for, shared_service
+from timing import RequestTimer, stage
+from webgl import encode_payload, fit_payload, viewer_html, HEADER, BYTES_PER_PARTICLE, PAYLOAD_TARGET
+from export import export_animation, available_formats, MIME_TYPES
+from poster import FORMATS as POSTER_FORMATS
+import tempfile
+import os
 
 # 设置页面配置
 st.set_page_config(
@@ -19,242 +31,183 @@ st.title("🎄 3D圣诞树")
 st.sidebar.header("控制面板")
 N_tree = st.sidebar.slider("树粒子数量", 1000, 8000, 3000, 500)
 N_snow = st.sidebar.slider("雪花数量", 200, 2000, 800, 100)
-theme = st.sidebar.selectbox("颜色主题", ["经典绿色", "冬季蓝", "温暖橙"])
+theme = st.sidebar.selectbox("颜色主题", ["经典绿色", "冬季蓝", "温暖橙", "神秘紫"])
+view_mode = st.sidebar.radio("显示方式", ["静态图像", "交互式 3D"],
+                             help="交互式 3D 把粒子数据发给浏览器用 WebGL 绘制，可以拖动旋转，服务器不再逐帧渲染")
+seed = st.sidebar.number_input("随机种子", min_value=0, max_value=2**31 - 1, value=2024, step=1)
+backend = st.sidebar.selectbox("渲染后端", ["matplotlib", "NumPy 光栅化"],
+                               help="NumPy 光栅化直接把粒子画进帧缓冲，画面和 matplotlib 版本接近；"
+                                    "单核上约快 3～5 倍，粒子越多差距越小")
+image_size = st.sidebar.selectbox("图像尺寸", ["大 1200×1400", "中 600×700", "小 300×350"],
+                                  help="手机和预览选小尺寸，粒子数按分辨率自动减少")
+dpi = {"大 1200×1400": 100, "中 600×700": 50, "小 300×350": 25}[image_size]
+budget_ms = st.sidebar.slider("渲染耗时预算 (ms，0 表示不限制)", 0, 1000, 0, 50)
+cache_mb = st.sidebar.slider("缓存上限 (MB)", 16, 512, 128, 16)
+debug = st.sidebar.checkbox("显示各阶段耗时", help="每次生成的阶段耗时也会以 JSON 写入服务器日志")
+profiler = st.sidebar.selectbox("性能采样", ["关闭", "cProfile", "tracemalloc"], disabled=not debug,
+                                help="在渲染进程里采样下一次静态图渲染（命中缓存时没有），会让这次生成变慢")
 
 # ==============================
-# 主题颜色配置
+# 场景和图像缓存（所有会话共用）
 # ==============================
-def get_theme_colors(theme_name):
-    themes = {
-        "经典绿色": {
-            "background": "#0a0a2a",
-            "ground": "white",
-            "snow": "white",
-            "text": "#FFD93D"
-        },
-        "冬季蓝": {
-            "background": "#1a1a3a",
-            "ground": "#E0F6FF",
-            "snow": "#E0F6FF",
-            "text": "#87CEEB"
-        },
-        "温暖橙": {
-            "background": "#2a1a0a",
-            "ground": "#FFF8DC",
-            "snow": "#FFF8DC",
-            "text": "#FFB347"
-        },
-        "神秘紫": {
-            "background": "#2a0a2a",
-            "ground": "#F0E6FF",
-            "snow": "#F0E6FF",
-            "text": "#DDA0DD"
-        }
-    }
-    return themes.get(theme_name, themes["经典绿色"])
+@st.cache_resource
+def get_render_cache():
+    return LRUCache()
+
+render_cache = get_render_cache()
+render_cache.resize(cache_mb * 2**20)
+
+@st.cache_resource
+def setup_logging():
+    # 每行一条 JSON 计时记录，只配置一次；不再传给根 logger，Streamlit 或平台配置了根 handler 时不会重复输出
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger = logging.getLogger("christmas_tree")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+setup_logging()
 
 # ==============================
-# 生成函数
+# 生成单个稳定的3D图像
 # ==============================
-def generate_tree(n=6000):
-    z = np.random.uniform(0, 1, n)
-    radius = (1 - z)**1.5 * 3.5 + np.random.rand(n) * 0.4
-    theta = np.random.uniform(0, 2*np.pi, n)
-    
-    x = radius * np.cos(theta) + (np.random.rand(n) - 0.5) * 0.2
-    y = radius * np.sin(theta) + (np.random.rand(n) - 0.5) * 0.2
-    z = z * 10 - 0.5
-    
-    return x, y, z
+@st.cache_resource
+def get_render_service():
+    # 所有会话共用本进程的渲染进程池，绘制不占用脚本线程；进程数由 RENDER_WORKERS 决定
+    return shared_service()
 
-def generate_decorations(tree_x, tree_y, tree_z, n=400):
-    indices = np.random.choice(len(tree_x), n, replace=False)
-    deco_x = tree_x[indices] * 1.1
-    deco_y = tree_y[indices] * 1.1
-    deco_z = tree_z[indices]
-    
-    colors = np.random.choice(['#FF6B6B', '#FFD93D', '#4ECDC4', '#C7C7C7', '#FF69B4', '#98FB98'], n)
-    sizes = np.random.uniform(10, 18, n)
-    
-    return deco_x, deco_y, deco_z, colors, sizes
+render_service = get_render_service()
 
-def generate_3d_heart(n=1200, scale=0.5, z_top=10.2):
-    R = 1.0
-    r = R * 0.382
-    outer_angles = np.linspace(0, 2*np.pi, 6)[:-1]
-    inner_angles = outer_angles + np.pi/5
-    
-    outer_x = R * np.cos(outer_angles)
-    outer_z = R * np.sin(outer_angles)
-    inner_x = r * np.cos(inner_angles)
-    inner_z = r * np.sin(inner_angles)
-    
-    star_x_2d = np.empty(10)
-    star_z_2d = np.empty(10)
-    star_x_2d[0::2] = outer_x
-    star_x_2d[1::2] = inner_x
-    star_z_2d[0::2] = outer_z
-    star_z_2d[1::2] = inner_z
-    
-    pts_x = []
-    pts_y = []
-    pts_z = []
-    thickness = 0.12
-    
-    for _ in range(n):
-        idx = np.random.randint(0, 10)
-        next_idx = (idx + 1) % 10
-        cx = 0
-        cz = 0
-        
-        a = np.random.rand()
-        b = np.random.rand()
-        if a + b > 1:
-            a = 1 - a
-            b = 1 - b
-        
-        x = cx + a * star_x_2d[idx] + b * star_x_2d[next_idx]
-        z = cz + a * star_z_2d[idx] + b * star_z_2d[next_idx]
-        y = np.random.uniform(-thickness, thickness)
-        
-        pts_x.append(x)
-        pts_y.append(y)
-        pts_z.append(z)
-    
-    pts_x = np.array(pts_x)
-    pts_y = np.array(pts_y)
-    pts_z = np.array(pts_z)
-    
-    pts_x *= scale
-    pts_y *= scale
-    pts_z *= scale
-    
-    pts_x += np.random.normal(0, 0.01, n)
-    pts_y += np.random.normal(0, 0.01, n)
-    pts_z += np.random.normal(0, 0.01, n)
-    
-    min_z = np.min(pts_z)
-    pts_z = pts_z - min_z + z_top
-    
-    return pts_x, pts_y, pts_z
+@st.cache_resource
+def get_atlas():
+    # 预渲染图集：缺少的图在后台交给渲染进程补齐
+    atlas = Atlas()
+    atlas.start_warmup(lambda params: render_service.render(params)[0])
+    return atlas
 
-def generate_ground(n=3500):
-    r = np.sqrt(np.random.rand(n)) * 8
-    theta = np.random.rand(n) * 2 * np.pi
-    
-    wave1 = np.sin(r * 1.2) * 0.2
-    wave2 = np.sin(theta * 3 + r * 1.5) * 0.1
-    
-    x = r * np.cos(theta)
-    y = r * np.sin(theta)
-    z = wave1 + wave2 - 1
-    
-    return x, y, z
+atlas = get_atlas()
 
-def generate_snow(n=1500):
-    x = np.random.uniform(-11, 11, n)
-    y = np.random.uniform(-11, 11, n)
-    z = np.random.uniform(0, 12, n)
-    sizes = np.random.uniform(3, 5, n)
-    
-    return np.column_stack([x, y, z]), sizes
+def atlas_image(theme_name, view=next(iter(VIEWS))):
+    # 只有默认参数才能用图集里的图
+    params = dict(n_tree=N_tree, n_snow=N_snow, seed=seed, backend=backend, dpi=dpi)
+    if budget_ms or any(DEFAULT_PARAMS[name] != value for name, value in params.items()):
+        return None
+    return atlas.get(theme_name, view)
 
-def create_tree_colors(z, theme_colors):
-    normalized_z = (z - z.min()) / (z.max() - z.min())
-    colors = []
-    
-    # 根据主题调整颜色
-    base_green = [0.2, 0.6, 0.2] if theme_colors["background"] == "#0a0a2a" else [0.3, 0.7, 0.3]
-    light_green = [0.4, 0.8, 0.4] if theme_colors["background"] == "#0a0a2a" else [0.5, 0.9, 0.5]
-    
-    for z_val in z:
-        t = (z_val - z.min()) / (z.max() - z.min())
-        r = base_green[0] * (1 - t) + light_green[0] * t
-        g = base_green[1] * (1 - t) + light_green[1] * t
-        b = base_green[2] * (1 - t) + light_green[2] * t
-        colors.append([r, g, b])
-    return colors
+def scene_params(theme_name):
+    # 生成场景的全部参数（减少数量以提高稳定性）；渲染进程再加上视角，只在画面里生成地面、雪花和星空
+    return dict(n_tree=N_tree, n_snow=N_snow, n_topper=500, theme=theme_name, seed=seed)
+
+def get_scene(theme_name):
+    # 复用缓存的粒子场景；没有时在本会话的场景图上增量更新（换主题只重新上色，改雪花数只追加或截断）
+    key = ("scene", N_tree, N_snow, theme_name, seed)
+    scene = render_cache.get(key)
+    if scene is None:
+        params = scene_params(theme_name)
+        graph = st.session_state["scene_graph"] = graph_for(params, st.session_state.get("scene_graph"))
+        with stage("scene"):
+            scene = scene_for(params, graph)
+        render_cache.put(key, scene)
+    return scene
+
+def get_payload(theme_name):
+    # 浏览器端绘制用的粒子数据，每个场景只序列化一次
+    key = ("webgl", N_tree, N_snow, theme_name, seed)
+    payload = render_cache.get(key)
+    if payload is None:
+        with stage("payload"):
+            payload = encode_payload(fit_payload(get_scene(theme_name)))
+        render_cache.put(key, payload)
+    return payload
+
+def embed_html(html, height):
+    # 新版 Streamlit 用 st.iframe 嵌入页面，旧版只有 components.html
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=height)
+    else:
+        components.html(html, height=height)
+
+def show_viewer(theme_name, height=700):
+    payload = get_payload(theme_name)
+    embed_html(viewer_html(payload, get_theme_colors(theme_name)), height)
+    n = (len(payload) - HEADER.size) // BYTES_PER_PARTICLE
+    st.caption(f"拖动可以旋转。粒子数据 {len(payload) / 1024:.0f} KB（{n} 个粒子 × {BYTES_PER_PARTICLE} 字节，"
+               f"上限 {PAYLOAD_TARGET // 1024} KB）")
+
+def show_timings(timer, report=None):
+    # report 是渲染进程里的采样结果（render_job 返回的最后一项）
+    with st.expander("⏱️ 各阶段耗时", expanded=True):
+        st.table({"阶段": [name for name, _ in timer.stages],
+                  "耗时 (ms)": [f"{ms:.1f}" for _, ms in timer.stages]})
+        hit = "（命中图集）" if timer.fields.get("atlas_hit") else "（命中缓存）" if timer.fields.get("cache_hit") else ""
+        st.caption(f"总耗时 {timer.total_ms:.1f} ms" + hit)
+        lod = timer.fields.get("lod")
+        if lod and lod["counts"]:
+            st.caption(f"细节层次（渲染进程绘制 {lod['render_ms']:.1f} ms）："
+                       + "，".join(f"{name} {n} 个" for name, n in lod["counts"].items()))
+        culled = {name: n for name, n in timer.fields.get("culled", {}).items() if n}
+        if culled:
+            st.caption("视锥剔除：" + "，".join(f"{name} {n} 个" for name, n in culled.items()))
+        if report and report["profile"]:
+            st.code(report["profile"], language=None)
+        if report and report["memory"]:
+            st.caption(f"峰值内存 {report['peak_mb']:.1f} MB")
+            st.code(report["memory"], language=None)
 
-# ==============================
-# 生成单个稳定的3D图像
-# ==============================
 def create_christmas_tree():
+    # 每次生成记录各阶段耗时，结束时写一行 JSON 日志
+    # cProfile / tracemalloc 在渲染进程里采样：脚本线程只是在等结果，而且多个会话同时采样会互相干扰
+    timer = RequestTimer("create_christmas_tree", n_tree=N_tree, n_snow=N_snow, theme=theme, seed=seed,
+                         backend=backend, dpi=dpi)
+    report = None
     try:
-        # 获取主题颜色
-        theme_colors = get_theme_colors(theme)
-        
-        # 生成所有粒子（减少数量以提高稳定性）
-        tree_x, tree_y, tree_z = generate_tree(N_tree)
-        deco_x, deco_y, deco_z, deco_colors, deco_sizes = generate_decorations(tree_x, tree_y, tree_z, N_decorations)
-        heart_x, heart_y, heart_z = generate_3d_heart(n=500, scale=0.7, z_top=9.6)
-        ground_x, ground_y, ground_z = generate_ground(N_ground)
-        snow_positions, snow_sizes = generate_snow(N_snow)
-        
-        # 创建图形
-        fig = plt.figure(figsize=(12, 14))
-        ax = fig.add_subplot(111, projection='3d')
-        ax.set_facecolor(theme_colors["background"])
-        fig.patch.set_facecolor(theme_colors["background"])
-        ax.set_axis_off()
-        
-        # 设置坐标范围
-        ax.set_xlim(-5, 5)
-        ax.set_ylim(-5, 5)
-        ax.set_zlim(-2, 8)
-        
-        # 初始视角
-        ax.view_init(25, -30)
-        
-        # 创建颜色
-        tree_colors = create_tree_colors(tree_z, theme_colors)
-        
-        # 创建散点图
-        tree_scatter = ax.scatter(tree_x, tree_y, tree_z, s=4, c=tree_colors, alpha=0.9, linewidths=0)
-        deco_scatter = ax.scatter(deco_x, deco_y, deco_z, s=deco_sizes, c=deco_colors, alpha=0.9)
-        
-        # 心形
-        heart_colors_array = np.ones((len(heart_x), 4))
-        heart_colors_array[:, 0] = 1.0
-        heart_colors_array[:, 1] = 0.84
-        heart_colors_array[:, 2] = 0.0
-        
-        dist_center = np.sqrt(heart_x**2 + (heart_z - 10.2)**2 + heart_y**2)
-        heart_alpha = 0.8 * np.exp(- (dist_center**2) / (2*(0.5**2))) + 0.3
-        heart_colors_array[:, 3] = np.clip(heart_alpha, 0.2, 0.95)
-        
-        heart_scatter = ax.scatter(heart_x, heart_y, heart_z, s=4, c=heart_colors_array)
-        
-        # 地面和雪花
-        ground_scatter = ax.scatter(ground_x, ground_y, ground_z, s=2, color=theme_colors["ground"], alpha=0.7, linewidths=0)
-        snow_scatter = ax.scatter(snow_positions[:, 0], snow_positions[:, 1], snow_positions[:, 2], 
-                                 s=snow_sizes, color=theme_colors["snow"], alpha=0.8)
-        
-        # 添加文字
-        ax.text2D(0.35, 0.25, "Merry Christmas", transform=ax.transAxes, color=theme_colors["text"], 
-                  fontsize=28, fontweight='bold', fontfamily='sans-serif')
-        
-        # 星星背景
-        star_x = np.random.uniform(-10, 10, 80)
-        star_y = np.random.uniform(-10, 10, 80)  
-        star_z = np.random.uniform(8, 12, 80)
-        ax.scatter(star_x, star_y, star_z, s=np.random.uniform(1, 3, 80), color=theme_colors["snow"], alpha=0.6)
-        
-        # 保存图像
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight', 
-                   facecolor=theme_colors["background"], dpi=100, edgecolor='none')
-        buffer.seek(0)
+        with timer:
+            if view_mode == "交互式 3D":
+                # 浏览器端绘制：服务器只在第一次序列化粒子数据
+                show_viewer(theme)
+                return True
+            
+            key = (N_tree, N_snow, theme, seed, backend, dpi, budget_ms)
+            
+            # 默认参数直接用预渲染图集，其次是缓存的图像，再次复用缓存的粒子场景
+            with stage("atlas"):
+                png = atlas_image(theme)
+            timer.fields["atlas_hit"] = png is not None
+            if png is None:
+                png = render_cache.get(("png",) + key)
+                timer.fields["cache_hit"] = png is not None
+            if png is None:
+                # 交给渲染进程，脚本线程只等待结果；各图层粒子数由渲染进程按图像尺寸和耗时预算决定
+                with stage("service"):
+                    png, worker_stages, culled, lod, report = render_service.render(
+                        dict(scene_params(theme), budget_ms=budget_ms, backend=backend, dpi=dpi,
+                             profile=debug and profiler == "cProfile",
+                             trace_memory=debug and profiler == "tracemalloc"))
+                timer.merge(worker_stages, "service")
+                timer.fields["culled"] = culled
+                timer.fields["lod"] = lod
+                render_cache.put(("png",) + key, png)
         
         # 在Streamlit中显示图像
-        st.image(buffer, caption="🎄 你的专属3D圣诞树", use_column_width=True)
-        
-        plt.close(fig)
+        st.image(png, caption="🎄 你的专属3D圣诞树", use_column_width=True)
         return True
         
+    except ServiceBusy:
+        st.warning("同时生成的人太多了，请稍等几秒再试 🎅")
+        return False
+    
+    except TimeoutError:
+        st.error(f"生成图像超时（超过 {render_service.timeout} 秒），请减少粒子数量后重试")
+        return False
+    
     except Exception as e:
         st.error(f"生成图像时出错: {str(e)}")
-        plt.close('all')
         return False
+    
+    finally:
+        if debug:
+            show_timings(timer, report)
 
 # 主界面
 st.markdown("---")
@@ -266,27 +219,135 @@ with col2:
     if st.button("🎅 生成圣诞树图像", type="primary", use_container_width=True):
         with st.spinner("正在生成圣诞树图像..."):
             create_christmas_tree()
+    else:
+        # 首屏：还没生成时先显示默认参数的图；冷启动时图集还没生成，默认主题用随代码发布的那张
+        first_paint = atlas.get(theme) or (bundled_image() if theme == THEMES[0] else None)
+        if first_paint is not None:
+            st.image(first_paint, caption="🎄 默认参数的效果，调好参数后点击上方按钮生成", use_column_width=True)
+
+# ==============================
+# 导出动画
+# ==============================
+def export_christmas_tree(fmt, frames):
+    try:
+        theme_colors = get_theme_colors(theme)
+        
+        # 逐帧渲染并直接编码进临时文件，渲染过程中内存占用不随帧数增长
+        with tempfile.TemporaryFile() as output:
+            export_animation(get_scene(theme), theme_colors, fmt, output, frames=frames, seed=seed)
+            output.seek(0)
+            data = output.read()
+        
+        st.download_button(f"⬇️ 下载动画（{len(data) / 2**20:.1f} MB）", data=data,
+                           file_name=f"christmas_tree.{fmt}", mime=MIME_TYPES[fmt], use_container_width=True)
+        return True
+        
+    except Exception as e:
+        st.error(f"导出动画时出错: {str(e)}")
+        return False
+
+st.markdown("### 🎬 导出动画")
+export_cols = st.columns([1, 1, 2])
+with export_cols[0]:
+    export_format = st.selectbox("格式", available_formats(), format_func=str.upper)
+with export_cols[1]:
+    export_frames = st.slider("帧数", 25, 300, 100, 25)
+with export_cols[2]:
+    if st.button("🎬 导出动画", use_container_width=True):
+        with st.spinner(f"正在渲染 {export_frames} 帧动画..."):
+            export_christmas_tree(export_format, export_frames)
+
+# ==============================
+# 高清海报
+# ==============================
+POSTER_SIZES = {"2400×2800": (2400, 2800), "4800×5600": (4800, 5600), "9600×11200": (9600, 11200)}
+POSTER_MIME = {"png": "image/png", "tiff": "image/tiff"}
+
+def export_poster(size, fmt):
+    try:
+        width, height = POSTER_SIZES[size]
+        progress = st.progress(0.0, text="正在分块渲染海报...")
+        
+        # 渲染进程分块渲染、逐行写进临时文件，不需要整张画布的内存；脚本线程只轮询进度
+        fd, path = tempfile.mkstemp(suffix="." + fmt)
+        os.close(fd)
+        try:
+            future, rows = render_service.submit_poster(scene_params(theme), path, width, height, fmt)
+            while not wait([future], timeout=0.5).done:
+                done = rows.get("rows", 0)
+                progress.progress(done / height, text=f"已完成 {done}/{height} 行")
+            future.result()
+            with open(path, "rb") as f:
+                data = f.read()
+        finally:
+            os.remove(path)
+        progress.empty()
+        
+        suffix = "tif" if fmt == "tiff" else fmt
+        st.download_button(f"⬇️ 下载海报（{len(data) / 2**20:.1f} MB）", data=data,
+                           file_name=f"christmas_tree_{width}x{height}.{suffix}", mime=POSTER_MIME[fmt],
+                           use_container_width=True)
+        return True
+        
+    except ServiceBusy:
+        st.warning("同时生成的人太多了，请稍等几秒再试 🎅")
+        return False
+    
+    except Exception as e:
+        st.error(f"生成海报时出错: {str(e)}")
+        return False
+
+st.markdown("### 🖨️ 高清海报")
+poster_cols = st.columns([1, 1, 2])
+with poster_cols[0]:
+    poster_size = st.selectbox("尺寸", list(POSTER_SIZES))
+with poster_cols[1]:
+    poster_format = st.selectbox("格式", POSTER_FORMATS, format_func=str.upper, key="poster_format")
+with poster_cols[2]:
+    if st.button("🖨️ 生成海报", use_container_width=True):
+        export_poster(poster_size, poster_format)
+
+# 缓存统计
+st.sidebar.caption(f"缓存命中 {render_cache.hits} 次 / 未命中 {render_cache.misses} 次，"
+                   f"已用 {render_cache.nbytes / 2**20:.1f} / {cache_mb} MB（{len(render_cache)} 项）")
+st.sidebar.caption(f"预渲染图集 {len(atlas.entries)} / {len(atlas.entries) + len(atlas.missing())} 张")
+st.sidebar.caption(f"渲染进程 {render_service.workers} 个，进行中 {render_service.pending} / "
+                   f"{render_service.max_pending}，已完成 {render_service.completed}，繁忙拒绝 {render_service.rejected}")
 
 # 展示不同角度的预览
 st.markdown("---")
 st.markdown("### 🎄 预览效果")
 
-# 生成多个视角的示例
-preview_cols = st.columns(3)
+# 预览图来自预渲染图集；图集还在后台生成时先显示交互式 3D
+def show_preview(theme_name, view):
+    png = atlas.get(theme_name, view)
+    if png is not None:
+        st.image(png, caption=f"{theme_name} · {view}", use_column_width=True)
+    else:
+        st.caption("预览图正在后台生成，先看看交互式 3D 吧")
+        show_viewer(theme_name, height=450)
+
+preview_view = st.radio("视角", list(VIEWS), horizontal=True, key="preview_view")
+preview_cols = st.columns(4)
 with preview_cols[0]:
     if st.button("经典视角", key="classic_view"):
-        with st.spinner("生成经典视角..."):
-            st.info("🎄 经典绿色圣诞树，温馨的传统风格")
+        st.info("🎄 经典绿色圣诞树，温馨的传统风格")
+        show_preview("经典绿色", preview_view)
             
 with preview_cols[1]:
     if st.button("冬季风格", key="winter_view"):
-        with st.spinner("生成冬季风格..."):
-            st.info("❄️ 清冷的冬日蓝调，营造雪花飞舞的氛围")
+        st.info("❄️ 清冷的冬日蓝调，营造雪花飞舞的氛围")
+        show_preview("冬季蓝", preview_view)
             
 with preview_cols[2]:
     if st.button("温暖色调", key="warm_view"):
-        with st.spinner("生成温暖色调..."):
-            st.info("🍊 温暖的橙色调，带来家的温馨感觉")
+        st.info("🍊 温暖的橙色调，带来家的温馨感觉")
+        show_preview("温暖橙", preview_view)
+
+with preview_cols[3]:
+    if st.button("神秘紫调", key="purple_view"):
+        st.info("🔮 梦幻的紫色夜空，神秘又浪漫")
+        show_preview("神秘紫", preview_view)
 
 # 添加信息说明
 st.markdown("""
@@ -0,0 +1,27 @@
+import os
+import shutil
+
+import pytest
+
+import atlas
+
+
+@pytest.fixture
+def sources(tmp_path):
+    here = os.path.dirname(os.path.abspath(atlas.__file__))
+    for name in atlas.SOURCES:
+        shutil.copy(os.path.join(here, name), tmp_path / name)
+    return tmp_path
+
+
+@pytest.mark.parametrize("name", ["scene.py", "scenegraph.py", "cull.py", "raster.py", "lod.py",
+                                  "instancing.py", "render.py", "render_service.py", "atlas.py"])
+def test_editing_a_source_changes_the_version(sources, name):
+    before = atlas.atlas_version(sources)
+    with open(sources / name, "a") as f:
+        f.write("\n# BLOCK = 2048\n")
+    assert atlas.atlas_version(sources) != before
+
+
+def test_version_is_stable(sources):
+    assert atlas.atlas_version(sources) == atlas.atlas_version(sources)
@@ -0,0 +1,77 @@
+from PIL import Image
+
+import render_service
+from lod import LODPlanner, subsample
+from render_service import render_job
+
+
+def test_budget_planned_in_worker(monkeypatch):
+    # 细节层次在工作进程里决定，耗时模型用本进程的绘制耗时和剔除后的粒子数修正，结果带回选中的粒子数
+    observed = []
+    monkeypatch.setattr(render_service, "_planners", {})
+    monkeypatch.setattr(LODPlanner, "observe", lambda self, counts, ms: observed.append((counts, ms)))
+    # 默认视角几乎剔除不掉什么，这里让剔除去掉一半装饰球
+    monkeypatch.setattr(render_service, "cull_scene", lambda scene, camera: (
+        subsample(scene, dict(decorations=scene.count("decorations") // 2)),
+        dict(decorations=scene.count("decorations") - scene.count("decorations") // 2)))
+    render_service._init_worker()
+    params = dict(n_tree=400, n_snow=100, n_topper=100, theme="经典绿色", seed=1, backend="matplotlib", dpi=20,
+                  budget_ms=50)
+    png, stages, culled, lod, report = render_job(params)
+    assert png.startswith(b"\x89PNG")
+    assert lod["counts"] and lod["render_ms"] > 0
+    assert "lod" in dict(stages)
+    assert render_service._planners["matplotlib", 20].overhead_ms is not None
+    assert culled["decorations"] > 0
+    assert observed == [({name: n - culled.get(name, 0) for name, n in lod["counts"].items()}, lod["render_ms"])]
+
+
+def test_explicit_counts_skip_planner(monkeypatch):
+    monkeypatch.setattr(render_service, "_planners", {})
+    render_service._init_worker()
+    params = dict(n_tree=400, n_snow=100, n_topper=100, theme="经典绿色", seed=1, backend="matplotlib", dpi=20,
+                  counts=None)
+    lod = render_job(params)[3]
+    assert lod["counts"] is None and lod["render_ms"] > 0
+    assert render_service._planners == {}
+
+
+def test_poster_rendered_in_worker(tmp_path):
+    # 海报在渲染进程里写进文件，调用方通过进度字典看到已写行数
+    service = render_service.RenderService(workers=1)
+    try:
+        params = dict(n_tree=400, n_snow=100, n_topper=100, theme="经典绿色", seed=1)
+        path = str(tmp_path / "poster.png")
+        future, progress = service.submit_poster(params, path, 200, 240, "png")
+        assert future.result(timeout=60) == path
+        assert progress["rows"] == 240
+    finally:
+        service.shutdown()
+    with Image.open(path) as im:
+        assert im.size == (200, 240)
+
+
+def test_profile_in_worker():
+    # cProfile / tracemalloc 在渲染进程里采样，结果文本随渲染结果带回
+    render_service._init_worker()
+    params = dict(n_tree=400, n_snow=100, n_topper=100, theme="经典绿色", seed=3, backend="NumPy 光栅化", dpi=20,
+                  profile=True, trace_memory=True)
+    report = render_job(params)[4]
+    assert "render_job" in report["profile"] or "render_image" in report["profile"]
+    assert report["memory"] and report["peak_mb"] > 0
+    report = render_job(dict(params, profile=False, trace_memory=False))[4]
+    assert report == dict(profile=None, memory=None, peak_mb=None)
+
+
+def test_workers_from_env(monkeypatch):
+    # 默认进程数不看核数，由 RENDER_WORKERS 决定；本进程的使用者共用一个服务
+    monkeypatch.setenv("RENDER_WORKERS", "3")
+    monkeypatch.setattr(render_service, "_shared", None)
+    service = render_service.shared_service()
+    try:
+        assert service.workers == 3
+        assert render_service.shared_service() is service
+    finally:
+        service.shutdown()
+    monkeypatch.delenv("RENDER_WORKERS")
+    assert render_service.default_workers() == render_service.DEFAULT_WORKERS
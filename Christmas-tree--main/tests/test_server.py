@@ -0,0 +1,101 @@
+import http.client
+import select
+import socket
+import threading
+import time
+
+import pytest
+
+import server as server_module
+from render_service import RenderService
+from server import ImageServer, PooledHTTPServer
+
+THREADS = 4
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def make(**kwargs):
+        server = PooledHTTPServer(("127.0.0.1", 0), ImageServer(RenderService(workers=1)), threads=THREADS, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server()
+
+
+def _closed(socks, expected, deadline=5):
+    """等到至少 expected 个连接被服务器关掉（读到 EOF），返回被关掉的个数"""
+    closed = set()
+    end = time.monotonic() + deadline
+    while len(closed) < expected and time.monotonic() < end:
+        readable, _, _ = select.select([sock for sock in socks if sock not in closed], [], [], 0.1)
+        for sock in readable:
+            if sock.recv(1) == b"":
+                closed.add(sock)
+    return len(closed)
+
+
+def _healthz(conn):
+    conn.request("GET", "/healthz")
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def test_idle_connections_do_not_block_requests(server):
+    # 每个线程都对应一个空闲连接：一半是用过的 keep-alive 连接，一半连上以后一直不发请求
+    host, port = server.server_address
+    used = [http.client.HTTPConnection(host, port, timeout=5) for _ in range(THREADS // 2)]
+    for conn in used:
+        assert _healthz(conn) == 200
+    silent = [socket.create_connection((host, port)) for _ in range(THREADS - len(used))]
+    try:
+        fresh = http.client.HTTPConnection(host, port, timeout=5)
+        start = time.perf_counter()
+        assert _healthz(fresh) == 200
+        assert time.perf_counter() - start < 1
+        # 刚用过的 keep-alive 连接还能接着用
+        assert _healthz(fresh) == 200
+    finally:
+        for sock in silent:
+            sock.close()
+
+
+def test_idle_connections_capped(make_server):
+    # keep-alive 空闲连接超过 max_idle 时关掉多出来的；哪个先放回 selector 取决于线程调度，只看个数
+    server = make_server(max_idle=2)
+    host, port = server.server_address
+    conns = [http.client.HTTPConnection(host, port, timeout=5) for _ in range(THREADS)]
+    for conn in conns:
+        assert _healthz(conn) == 200
+    socks = [conn.sock for conn in conns]
+    assert _closed(socks, THREADS - 2) == THREADS - 2
+    time.sleep(0.2)
+    assert _closed(socks, THREADS, deadline=0.5) == THREADS - 2
+
+
+def test_fresh_connections_not_counted_as_idle(make_server, monkeypatch):
+    # 连上不发请求的连接不会挤掉 keep-alive 连接，HEADER_TIMEOUT 秒后单独关掉
+    monkeypatch.setattr(server_module, "HEADER_TIMEOUT", 0.5)
+    server = make_server(max_idle=1)
+    host, port = server.server_address
+    kept = http.client.HTTPConnection(host, port, timeout=5)
+    assert _healthz(kept) == 200
+    silent = [socket.create_connection((host, port)) for _ in range(2 * THREADS)]
+    try:
+        assert _closed(silent, len(silent)) == len(silent)
+        assert _healthz(kept) == 200
+    finally:
+        for sock in silent:
+            sock.close()
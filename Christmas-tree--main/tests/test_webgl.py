@@ -0,0 +1,36 @@
+import numpy as np
+
+from scene import LAYERS, ParticleScene
+from webgl import HEADER, BYTES_PER_PARTICLE, encode_payload, fit_payload, payload_size
+
+
+def test_fit_payload_only_fixed_layers():
+    # 树、雪花、地面、星空都是 0 个：没有可缩减的图层，载荷超过目标也原样返回
+    scene = ParticleScene({"decorations": 400, "topper": 500})
+    max_bytes = payload_size({"decorations": 100})
+    assert fit_payload(scene, max_bytes) is scene
+
+
+def test_fit_payload_empty_scene():
+    scene = ParticleScene({})
+    assert fit_payload(scene, HEADER.size) is scene
+    assert len(encode_payload(scene)) == HEADER.size
+
+
+def test_fit_payload_shrinks_scalable_layers():
+    counts = {"tree": 20000, "decorations": 400, "topper": 500, "ground": 3500, "snow": 800, "stars": 80}
+    scene = ParticleScene(counts)
+    max_bytes = 64 * 1024
+    fitted = fit_payload(scene, max_bytes)
+    assert len(encode_payload(fitted)) <= max_bytes
+    assert fitted.count("decorations") == 400 and fitted.count("topper") == 500
+    assert all(fitted.count(name) < counts[name] for name in ("tree", "ground", "snow"))
+
+
+def test_payload_layout():
+    scene = ParticleScene({name: 3 for name in LAYERS})
+    scene.positions[:] = np.arange(3 * len(scene)).reshape(3, -1)
+    payload = encode_payload(scene)
+    assert len(payload) == HEADER.size + BYTES_PER_PARTICLE * len(scene)
+    x = np.frombuffer(payload, "<f2", count=len(scene), offset=HEADER.size)
+    assert np.array_equal(x, scene.positions[0])
@@ -0,0 +1,119 @@
+"""
+单次请求的分阶段计时
+
+scene / render / raster 里的各个阶段用 stage("名字") 包起来；只有在
+RequestTimer 里运行时才会记录，平时 stage() 只是一次 ContextVar 查询。
+Streamlit 每个会话在自己的线程里运行，ContextVar 保证不同会话互不干扰。
+结束时输出一行 JSON 日志，也可以顺便用 cProfile / tracemalloc 采样这一次请求。
+"""
+
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger("christmas_tree.timing")
+
+_current = contextvars.ContextVar("request_timer", default=None)
+
+
+@contextmanager
+def stage(name):
+    """记录一个阶段的耗时；嵌套的阶段名用 "/" 连接，例如 scene/tree"""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    timer._stack.append(name)
+    path = "/".join(timer._stack)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.stages.append((path, (time.perf_counter() - start) * 1e3))
+        timer._stack.pop()
+
+
+class RequestTimer:
+    """
+    with RequestTimer("create_christmas_tree", **字段) as timer: ...
+
+    stages 是按完成顺序排列的 (阶段名, 毫秒)。profile=True 时用 cProfile 记录
+    这次请求的函数调用，trace_memory=True 时用 tracemalloc 记录内存分配。两者都是
+    全进程的，只在一次只执行一个任务的地方用（例如渲染进程里的 render_job），
+    多个线程同时采样会互相停掉对方的 tracemalloc，3.12 起第二个 cProfile 还会报错。
+    """
+
+    def __init__(self, name, profile=False, trace_memory=False, **fields):
+        self.name = name
+        self.fields = fields
+        self.stages = []
+        self.total_ms = 0.0
+        self.error = None
+        self.profile = cProfile.Profile() if profile else None
+        self.trace_memory = trace_memory
+        self.memory_snapshot = None
+        self.peak_mb = None
+        self._stack = []
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.profile is not None:
+            self.profile.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.total_ms = (time.perf_counter() - self._start) * 1e3
+        if self.profile is not None:
+            self.profile.disable()
+        if self.trace_memory:
+            self.memory_snapshot = tracemalloc.take_snapshot()
+            self.peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+        _current.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.log()
+        return False
+
+    def merge(self, stages, prefix):
+        """并入在别处（例如工作进程里）记录的阶段，阶段名加上前缀"""
+        self.stages.extend((f"{prefix}/{name}", ms) for name, ms in stages)
+
+    def as_dict(self):
+        record = dict(event=self.name, **self.fields)
+        record["total_ms"] = round(self.total_ms, 2)
+        record["stages"] = {name: round(ms, 2) for name, ms in self.stages}
+        if self.peak_mb is not None:
+            record["peak_mb"] = round(self.peak_mb, 2)
+        if self.error is not None:
+            record["error"] = self.error
+        return record
+
+    def log(self):
+        """一行 JSON，方便在平台日志里检索和汇总"""
+        level = logging.ERROR if self.error else logging.INFO
+        logger.log(level, json.dumps(self.as_dict(), ensure_ascii=False, default=str))
+
+    def profile_text(self, limit=25):
+        """cProfile 结果：按累计耗时排序的前 limit 个函数"""
+        if self.profile is None:
+            return ""
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+    def memory_text(self, limit=15):
+        """tracemalloc 结果：分配最多的前 limit 行代码"""
+        if self.memory_snapshot is None:
+            return ""
+        stats = self.memory_snapshot.statistics("lineno")[:limit]
+        return "\n".join(str(s) for s in stats)
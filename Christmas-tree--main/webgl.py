@@ -0,0 +1,341 @@
+"""
+浏览器端的 WebGL 查看器
+
+场景只序列化一次：小端 float16 坐标（x, y, z 各一段）、uint8 RGBA、float16 点直径，
+每个粒子 12 字节。WebGL2 直接把这块缓冲区当顶点数据用（HALF_FLOAT / 归一化
+UNSIGNED_BYTE），不需要在 JS 里解码。旋转视角、雪花飘落、五角星旋转脉动和闪烁
+都在着色器里按帧号计算，公式同 animation.TreeAnimation（雪花重新出现的位置换成了
+着色器里的整数哈希），页面加载之后服务器不再参与。
+
+载荷里的粒子按图层排列，不按深度排序：视角在浏览器里随时变化，服务器排一次只对
+一个视角有效。半透明混合要从远到近画，所以由浏览器排序：视角每变化几度，按到相机
+的距离分桶计数排序一次，结果作为索引缓冲区交给 drawElements（gl_VertexID 仍是粒子
+在载荷里的编号，着色器按它判断图层）。
+"""
+
+import base64
+import json
+import struct
+
+import numpy as np
+
+from scene import LAYERS, hex_to_rgb
+from lod import FIXED_LAYERS, subsample
+from raster import EDGE_WIDTH, DEFAULT_EDGE_WIDTH
+
+# 文件头：魔数 + 各图层粒子数（uint32，顺序同 LAYERS）
+MAGIC = b"XMS1"
+HEADER = struct.Struct("<4s6I")
+BYTES_PER_PARTICLE = 12
+
+# 载荷大小目标：超过时按比例减少可缩减图层的粒子
+PAYLOAD_TARGET = 256 * 1024
+
+
+def payload_size(counts):
+    return HEADER.size + BYTES_PER_PARTICLE * sum(counts.values())
+
+
+def fit_payload(scene, max_bytes=PAYLOAD_TARGET):
+    """
+    装饰球和五角星完整保留，其余图层按同一比例取子样本，使载荷不超过 max_bytes；
+    没有可缩减的粒子时原样返回
+    """
+    counts = {name: scene.count(name) for name in LAYERS}
+    if payload_size(counts) <= max_bytes:
+        return scene
+    fixed = sum(counts[name] for name in FIXED_LAYERS)
+    scalable = sum(counts.values()) - fixed
+    if scalable == 0:
+        # 只剩装饰球和五角星：它们不缩减，载荷只能超过目标
+        return scene
+    room = (max_bytes - HEADER.size) // BYTES_PER_PARTICLE - fixed
+    fraction = max(room, 0) / scalable
+    return subsample(scene, {name: n if name in FIXED_LAYERS else int(n * fraction)
+                             for name, n in counts.items()})
+
+
+def encode_payload(scene):
+    """场景 → 二进制载荷（小端）"""
+    diameters = np.empty(len(scene), dtype=np.float32)
+    for name in LAYERS:
+        sl = scene.slices[name]
+        # 点直径（pt），包括 matplotlib 描的边
+        diameters[sl] = np.sqrt(scene.sizes[sl]) + EDGE_WIDTH.get(name, DEFAULT_EDGE_WIDTH)
+
+    parts = [
+        HEADER.pack(MAGIC, *(scene.count(name) for name in LAYERS)),
+        scene.positions.astype("<f2").tobytes(),
+        np.round(np.clip(scene.colors, 0, 1) * 255).astype(np.uint8).tobytes(),
+        diameters.astype("<f2").tobytes(),
+    ]
+    return b"".join(parts)
+
+
+def viewer_html(payload, theme_colors):
+    """嵌入载荷的完整 HTML 页面（可用 streamlit.components.v1.html 显示）"""
+    config = {
+        "background": hex_to_rgb(theme_colors["background"]),
+        "text": theme_colors["text"],
+    }
+    return (_TEMPLATE
+            .replace("__PAYLOAD__", base64.b64encode(payload).decode("ascii"))
+            .replace("__CONFIG__", json.dumps(config)))
+
+
+_TEMPLATE = r"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><style>
+html, body { margin: 0; height: 100%; overflow: hidden; }
+#wrap { position: relative; width: 100%; height: 100%; }
+canvas { width: 100%; height: 100%; display: block; touch-action: none; cursor: grab; }
+#label { position: absolute; font: bold 28px sans-serif; pointer-events: none; white-space: nowrap; }
+#msg { position: absolute; top: 8px; left: 8px; color: #ccc; font: 14px sans-serif; }
+</style></head><body><div id="wrap"><canvas id="c"></canvas><div id="label">Merry Christmas</div><div id="msg"></div></div>
+<script>
+const CONFIG = __CONFIG__;
+const PAYLOAD = "__PAYLOAD__";
+
+// ---- 载荷 ----
+const bytes = Uint8Array.from(atob(PAYLOAD), c => c.charCodeAt(0));
+const view = new DataView(bytes.buffer);
+const counts = [];
+for (let i = 0; i < 6; i++) counts.push(view.getUint32(4 + 4 * i, true));
+const n = counts.reduce((a, b) => a + b, 0);
+const ends = [];
+counts.reduce((a, b, i) => (ends[i] = a + b), 0);
+const headerSize = 28;
+const offsets = {x: headerSize, y: headerSize + 2 * n, z: headerSize + 4 * n,
+                 color: headerSize + 6 * n, size: headerSize + 10 * n};
+
+// ---- 深度排序：半透明的点从远到近画，混合结果才和载荷里的顺序无关 ----
+function halfToFloat(h) {
+  const sign = h & 0x8000 ? -1 : 1, exp = (h >> 10) & 0x1f, frac = h & 0x3ff;
+  if (exp === 0) return sign * frac * 2 ** -24;
+  if (exp === 31) return frac ? NaN : sign * Infinity;
+  return sign * (1 + frac / 1024) * 2 ** (exp - 15);
+}
+const px = new Float32Array(n), py = new Float32Array(n), pz = new Float32Array(n);
+for (let i = 0; i < n; i++) {
+  px[i] = halfToFloat(view.getUint16(offsets.x + 2 * i, true));
+  py[i] = halfToFloat(view.getUint16(offsets.y + 2 * i, true));
+  pz[i] = halfToFloat(view.getUint16(offsets.z + 2 * i, true));
+}
+const BUCKETS = 4096;
+const order = new Uint32Array(n), bucket = new Uint16Array(n), bucketStart = new Uint32Array(BUCKETS + 1);
+// 按 W（到相机的距离）分桶计数排序，远的在前，同一桶里保持载荷顺序；
+// 雪花和五角星在着色器里移动，按初始位置排序的误差看不出来
+function sortByDepth(m, range) {
+  bucketStart.fill(0);
+  const scale = (BUCKETS - 1) / (range[1] - range[0]);
+  for (let i = 0; i < n; i++) {
+    const d = m[3] * px[i] + m[7] * py[i] + m[11] * pz[i] + m[15];
+    const b = BUCKETS - 1 - Math.max(0, Math.min(BUCKETS - 1, Math.floor((d - range[0]) * scale)));
+    bucket[i] = b;
+    bucketStart[b + 1]++;
+  }
+  for (let b = 0; b < BUCKETS; b++) bucketStart[b + 1] += bucketStart[b];
+  for (let i = 0; i < n; i++) order[bucketStart[bucket[i]]++] = i;
+  return order;
+}
+
+// ---- 相机：和 raster.Camera 一样复刻 mplot3d ----
+const BOX = [4 * 25 / 84, 4 * 25 / 84, 3 * 25 / 84];
+const LIMITS = [[-5, 5], [-5, 5], [-2, 8]];
+const VIEW_LIM = [-0.095, 0.09];
+function cameraMatrix(elev, azim) {
+  const e = elev * Math.PI / 180, a = azim * Math.PI / 180;
+  const scale = LIMITS.map(([lo, hi], i) => BOX[i] / (hi - lo));
+  const shift = LIMITS.map(([lo], i) => -lo * scale[i]);
+  const center = BOX.map(b => b / 2);
+  const eye = [center[0] + 10 * Math.cos(e) * Math.cos(a),
+               center[1] + 10 * Math.cos(e) * Math.sin(a),
+               center[2] + 10 * Math.sin(e)];
+  const norm = v => { const l = Math.hypot(...v); return v.map(x => x / l); };
+  const cross = (p, q) => [p[1] * q[2] - p[2] * q[1], p[2] * q[0] - p[0] * q[2], p[0] * q[1] - p[1] * q[0]];
+  const w = norm(eye.map((x, i) => x - center[i]));
+  const u = norm(cross([0, 0, 1], w));
+  const v = cross(w, u);
+  // 行：X = u·(S p + o - eye)，Y = v·(...)，W = -w·(...)（W 即深度）
+  const row = (axis, sign) => [0, 1, 2].map(i => sign * axis[i] * scale[i])
+      .concat([sign * [0, 1, 2].reduce((s, i) => s + axis[i] * (shift[i] - eye[i]), 0)]);
+  const rows = [row(u, 1), row(v, 1), [0, 0, 0, 0], row(w, -1)];
+  const m = new Float32Array(16);  // 列主序
+  for (let r = 0; r < 4; r++) for (let c = 0; c < 4; c++) m[c * 4 + r] = rows[r][c];
+  return m;
+}
+function depthRange(m) {
+  let lo = Infinity, hi = -Infinity;
+  for (const x of LIMITS[0]) for (const y of LIMITS[1]) for (const z of LIMITS[2]) {
+    const d = m[3] * x + m[7] * y + m[11] * z + m[15];
+    lo = Math.min(lo, d); hi = Math.max(hi, d);
+  }
+  return [lo, hi];
+}
+
+// ---- 着色器：帧号驱动的动画，公式同 animation.py ----
+const VERT = `#version 300 es
+precision highp float;
+precision highp int;
+layout(location = 0) in float ax;
+layout(location = 1) in float ay;
+layout(location = 2) in float az;
+layout(location = 3) in vec4 acolor;
+layout(location = 4) in float adiameter;
+uniform mat4 uM;
+uniform vec2 uDepth;
+uniform vec2 uScale;
+uniform float uPxPerPt;
+uniform float uFrame;
+uniform int uEnds[6];
+out vec4 vColor;
+
+uint hash(uint h) {
+  h ^= h >> 16; h *= 0x7feb352du; h ^= h >> 15; h *= 0x846ca68bu; h ^= h >> 16;
+  return h;
+}
+
+void main() {
+  int id = gl_VertexID;
+  vec3 p = vec3(ax, ay, az);
+  vec4 color = acolor;
+  float diameter = adiameter;
+  float f = uFrame;
+
+  if (id < uEnds[0]) {                       // 树闪烁
+    color.a = floor((0.85 + 0.1 * sin(f * 0.2)) * 255.0 + 0.5) / 255.0;
+  } else if (id < uEnds[1]) {                // 装饰球闪烁
+    color.a = floor((0.8 + 0.2 * sin(f * 0.25)) * 255.0 + 0.5) / 255.0;
+  } else if (id < uEnds[2]) {                // 五角星旋转、脉动、颜色闪烁
+    float th = radians(f * 0.1);
+    p.xy = mat2(cos(th), sin(th), -sin(th), cos(th)) * p.xy;
+    diameter *= sqrt(0.9 + 0.1 * sin(f * 0.15));
+    color.a = clamp(color.a * (0.7 + 0.3 * sin(f * 0.12)), 0.2, 0.95);
+  } else if (id >= uEnds[3] && id < uEnds[4]) {  // 雪花：每帧下落 0.07，落到 -2 以下回到 12
+    float fallen = 12.0 - p.z + 0.07 * (f + 1.0);
+    float cycle = floor(fallen / 14.0);
+    p.z = 12.0 - (fallen - cycle * 14.0);
+    if (cycle > 0.0) {
+      uint h = hash(uint(id) * 0x9E3779B9u + uint(cycle));
+      p.x = float(h & 0xFFFFu) / 65536.0 * 22.0 - 11.0;
+      p.y = float(hash(h) & 0xFFFFu) / 65536.0 * 22.0 - 11.0;
+    }
+  }
+
+  vec4 c = uM * vec4(p, 1.0);
+  if (c.w <= 0.0) { gl_Position = vec4(2.0, 2.0, 2.0, 1.0); return; }
+  vec2 v = c.xy / c.w;
+  vec2 ndc = ((v - ${VIEW_LIM[0]}) / ${VIEW_LIM[1] - VIEW_LIM[0]} * 2.0 - 1.0) * uScale;
+  gl_Position = vec4(ndc, 0.0, 1.0);
+  gl_PointSize = max(diameter * uPxPerPt, 1.0);
+
+  // 深度着色：最远处透明度降到 30%
+  float t = clamp((c.w - uDepth.x) / (uDepth.y - uDepth.x), 0.0, 1.0);
+  color.a *= 1.0 - 0.7 * t;
+  vColor = color;
+}`;
+
+const FRAG = `#version 300 es
+precision mediump float;
+in vec4 vColor;
+out vec4 outColor;
+void main() {
+  float r = length(gl_PointCoord - 0.5) * 2.0;
+  float edge = fwidth(r);
+  float cover = 1.0 - smoothstep(1.0 - edge, 1.0, r);
+  if (cover <= 0.0) discard;
+  outColor = vec4(vColor.rgb * vColor.a * cover, vColor.a * cover);
+}`;
+
+const canvas = document.getElementById("c");
+const label = document.getElementById("label");
+const gl = canvas.getContext("webgl2", {premultipliedAlpha: true, antialias: false});
+if (!gl) {
+  document.getElementById("msg").textContent = "浏览器不支持 WebGL2";
+} else {
+  start();
+}
+
+function compile(type, src) {
+  const s = gl.createShader(type);
+  gl.shaderSource(s, src);
+  gl.compileShader(s);
+  if (!gl.getShaderParameter(s, gl.COMPILE_STATUS)) throw new Error(gl.getShaderInfoLog(s));
+  return s;
+}
+
+function start() {
+  const prog = gl.createProgram();
+  gl.attachShader(prog, compile(gl.VERTEX_SHADER, VERT));
+  gl.attachShader(prog, compile(gl.FRAGMENT_SHADER, FRAG));
+  gl.linkProgram(prog);
+  gl.useProgram(prog);
+
+  // 整块载荷直接上传，各属性指向各自的偏移
+  const buf = gl.createBuffer();
+  gl.bindBuffer(gl.ARRAY_BUFFER, buf);
+  gl.bufferData(gl.ARRAY_BUFFER, bytes, gl.STATIC_DRAW);
+  [["x", 0], ["y", 1], ["z", 2], ["size", 4]].forEach(([key, loc]) => {
+    gl.enableVertexAttribArray(loc);
+    gl.vertexAttribPointer(loc, 1, gl.HALF_FLOAT, false, 0, offsets[key]);
+  });
+  gl.enableVertexAttribArray(3);
+  gl.vertexAttribPointer(3, 4, gl.UNSIGNED_BYTE, true, 0, offsets.color);
+  gl.bindBuffer(gl.ELEMENT_ARRAY_BUFFER, gl.createBuffer());
+  let sortedView = null;
+
+  const loc = name => gl.getUniformLocation(prog, name);
+  gl.uniform1iv(loc("uEnds"), ends);
+  gl.enable(gl.BLEND);
+  gl.blendFunc(gl.ONE, gl.ONE_MINUS_SRC_ALPHA);
+  const bg = CONFIG.background;
+  label.style.color = CONFIG.text;
+
+  // 拖动改变视角，松开后继续缓慢自转
+  let dragAzim = 0, dragElev = 0, dragging = null;
+  canvas.addEventListener("pointerdown", e => { dragging = [e.clientX, e.clientY]; canvas.setPointerCapture(e.pointerId); });
+  canvas.addEventListener("pointermove", e => {
+    if (!dragging) return;
+    dragAzim -= (e.clientX - dragging[0]) * 0.4;
+    dragElev = Math.max(-85, Math.min(85, dragElev + (e.clientY - dragging[1]) * 0.4));
+    dragging = [e.clientX, e.clientY];
+  });
+  canvas.addEventListener("pointerup", () => { dragging = null; });
+
+  const t0 = performance.now();
+  function frame(now) {
+    const dpr = window.devicePixelRatio || 1;
+    const width = Math.round(canvas.clientWidth * dpr), height = Math.round(canvas.clientHeight * dpr);
+    if (canvas.width !== width || canvas.height !== height) { canvas.width = width; canvas.height = height; }
+    gl.viewport(0, 0, width, height);
+    gl.clearColor(bg[0], bg[1], bg[2], 1);
+    gl.clear(gl.COLOR_BUFFER_BIT);
+
+    // 25 帧/秒，和 santa1.py 的 interval=40 一致
+    const f = (now - t0) / 40;
+    const elev = 25 + 1.5 * Math.sin(f * 0.04) + dragElev, azim = -30 + f * 0.08 + dragAzim;
+    const m = cameraMatrix(elev, azim);
+    const depth = depthRange(m);
+    const side = Math.min(width, height) * 0.975;
+    // 视角变化超过 2 度才重新排序
+    if (!sortedView || Math.abs(elev - sortedView[0]) > 2 || Math.abs(azim - sortedView[1]) > 2) {
+      gl.bufferData(gl.ELEMENT_ARRAY_BUFFER, sortByDepth(m, depth), gl.DYNAMIC_DRAW);
+      sortedView = [elev, azim];
+    }
+    gl.uniformMatrix4fv(loc("uM"), false, m);
+    gl.uniform2fv(loc("uDepth"), depth);
+    gl.uniform2f(loc("uScale"), side / width, side / height);
+    gl.uniform1f(loc("uPxPerPt"), side / (0.975 * 1200) * 100 / 72);
+    gl.uniform1f(loc("uFrame"), f);
+    gl.drawElements(gl.POINTS, n, gl.UNSIGNED_INT, 0);
+
+    const cssSide = side / dpr;
+    label.style.left = ((canvas.clientWidth - cssSide) / 2 + 0.35 * cssSide) + "px";
+    label.style.top = ((canvas.clientHeight - cssSide) / 2 + 0.75 * cssSide) + "px";
+    label.style.transform = "translateY(-100%)";
+    label.style.fontSize = (28 * 100 / 72 * cssSide / (0.975 * 1200)) + "px";
+    requestAnimationFrame(frame);
+  }
+  requestAnimationFrame(frame);
+}
+</script></body></html>
+"""